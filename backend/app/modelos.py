@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Enum, Numeric, Date, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, DateTime, Text, Enum, Numeric, Date, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
@@ -229,6 +229,26 @@ class OpcionRespuesta(Base):
 
     pregunta = relationship("Pregunta", back_populates="opciones")
 
+class ContextoAsignacion(Base):
+    """
+    Diccionario de contextos académicos (materia, docente, departamento, campus...)
+    por id_referencia_contexto y contenido: la misma referencia con otros
+    metadatos (otra encuesta, otro semestre, otra importación) es otra entrada.
+    Se escribe una vez al publicar; asignaciones y transacciones guardan solo
+    id_contexto en lugar de repetir el JSON.
+    """
+    __tablename__ = "contexto_asignacion"
+    __table_args__ = (
+        UniqueConstraint('id_referencia_contexto', 'huella_metadatos', name='uq_contexto_referencia_huella'),
+        {"schema": "encuestas_oltp"}
+    )
+
+    id = Column(Integer, primary_key=True)
+    id_referencia_contexto = Column(String(255), nullable=False)
+    metadatos = Column(JSONB, nullable=False)
+    huella_metadatos = Column(String(32), nullable=False) # md5 del JSON canónico
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+
 class AsignacionUsuario(Base):
     __tablename__ = "asignacion_usuario"
     __table_args__ = (
@@ -249,9 +269,10 @@ class AsignacionUsuario(Base):
     estado = Column(Enum(EstadoAsignacion, schema="encuestas_oltp"), default=EstadoAsignacion.pendiente, index=True)
     fecha_asignacion = Column(DateTime(timezone=True), server_default=func.now())
     fecha_realizacion = Column(DateTime(timezone=True), nullable=True)
-    metadatos_asignacion = Column(JSONB, nullable=True)
+    metadatos_asignacion = Column(JSONB, nullable=True) # solo sin id_contexto (asignaciones previas o sin referencia)
     # Índice agregado para mejorar performance en búsquedas por contexto
     id_referencia_contexto = Column(String(255), nullable=True, index=True)
+    id_contexto = Column(Integer, ForeignKey("encuestas_oltp.contexto_asignacion.id"), nullable=True, index=True)
 
     encuesta = relationship("Encuesta", back_populates="asignaciones")
     borrador = relationship("RespuestaBorrador", back_populates="asignacion", uselist=False, cascade="all, delete-orphan")
@@ -267,6 +288,110 @@ class RespuestaBorrador(Base):
 
     asignacion = relationship("AsignacionUsuario", back_populates="borrador")
 
+class BloqueoPendiente(Base):
+    """
+    Proyección desnormalizada para CU11: una fila por alumno con al menos una encuesta
+    obligatoria pendiente (en curso y activa). Se mantiene desde la publicación, recepción
+    de respuestas y finalización; la consulta sobre asignacion_usuario queda como respaldo.
+    """
+    __tablename__ = "bloqueo_pendiente"
+    __table_args__ = {"schema": "encuestas_oltp"}
+
+    id_usuario = Column(Integer, primary_key=True) # ID externo (Alumno)
+    id_encuesta = Column(Integer, ForeignKey("encuestas_oltp.encuesta.id", ondelete="CASCADE"), nullable=False, index=True)
+    nombre_encuesta = Column(String(100), nullable=False)
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now())
+
+class EnvioRespuestasCola(Base):
+    """
+    Cola durable (staging) de envíos de respuestas recibidos en modo asíncrono.
+    Un trabajador en segundo plano la drena por lotes hacia transaccion_encuesta/respuesta.
+    """
+    __tablename__ = "envio_respuestas_cola"
+    __table_args__ = {"schema": "encuestas_oltp"}
+
+    id = Column(Integer, primary_key=True)
+    id_recibo = Column(String(36), unique=True, nullable=False, index=True)
+    payload = Column(JSONB, nullable=False)
+    estado = Column(String(20), nullable=False, default="pendiente", index=True) # pendiente | procesado | error
+    intentos = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    id_transaccion = Column(Integer, nullable=True)
+    fecha_recepcion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_procesado = Column(DateTime(timezone=True), nullable=True)
+
+class ClaveIdempotencia(Base):
+    """
+    Resultados de operaciones con cabecera Idempotency-Key (envío de respuestas y
+    borradores). Se escribe en la misma transacción que la operación, así los
+    reintentos en cualquier proceso se responden sin volver a escribir.
+    """
+    __tablename__ = "clave_idempotencia"
+    __table_args__ = {"schema": "encuestas_oltp"}
+
+    huella = Column(String(64), primary_key=True) # sha256(operacion + clave)
+    operacion = Column(String(50), nullable=False)
+    huella_payload = Column(String(64), nullable=False)
+    resultado = Column(JSONB, nullable=False)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class TrabajoPublicacion(Base):
+    """
+    Publicación de una encuesta ejecutada en segundo plano. Cada tramo de alumnos
+    se confirma junto con su checkpoint (etapa + ultimo_id_alumno), así el trabajo
+    se reanuda desde el último tramo tras una caída o un reinicio.
+    """
+    __tablename__ = "trabajo_publicacion"
+    __table_args__ = {"schema": "encuestas_oltp"}
+
+    id = Column(Integer, primary_key=True)
+    id_encuesta = Column(Integer, ForeignKey("encuestas_oltp.encuesta.id", ondelete="CASCADE"), nullable=False, index=True)
+    estado = Column(String(20), nullable=False, default="pendiente", index=True) # pendiente | en_curso | completado | error | cancelado
+    etapa = Column(String(30), nullable=True)
+    ultimo_id_alumno = Column(Integer, nullable=True) # checkpoint dentro de la etapa
+    total_estimado = Column(Integer, nullable=True)
+    procesados = Column(Integer, nullable=False, default=0)
+    insertadas = Column(Integer, nullable=False, default=0)
+    cancelacion_solicitada = Column(Boolean, nullable=False, default=False)
+    propietario = Column(String(64), nullable=True) # proceso que lo está ejecutando
+    error = Column(Text, nullable=True)
+    id_usuario = Column(Integer, nullable=False)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_inicio = Column(DateTime(timezone=True), nullable=True)
+    fecha_actualizacion = Column(DateTime(timezone=True), nullable=True) # latido por tramo
+    fecha_fin = Column(DateTime(timezone=True), nullable=True)
+
+class CambioInscripcion(Base):
+    """
+    Registro de altas y modificaciones de sapientia.inscripciones (id_alumno) y
+    de sapientia.oferta_academica (id_alumno NULL: toda la sección). Lo llenan
+    triggers (update_schema_4.sql); id_transaccion es el id de la transacción
+    que escribió la fila y es la marca de agua de la republicación incremental.
+    """
+    __tablename__ = "cambio_inscripcion"
+    __table_args__ = {"schema": "encuestas_oltp"}
+
+    id = Column(Integer, primary_key=True)
+    id_transaccion = Column(BigInteger, nullable=False, index=True)
+    id_alumno = Column(Integer, nullable=True)
+    cod_asignatura = Column(String(100), nullable=True)
+    seccion = Column(String(100), nullable=True)
+    fecha = Column(DateTime(timezone=True), server_default=func.now())
+
+class MarcaRepublicacion(Base):
+    """
+    Hasta dónde se aplicó cambio_inscripcion a cada encuesta: las transacciones
+    con id_transaccion >= id_transaccion_desde faltan. huella_reglas distinta de
+    la actual obliga a recorrer todas las inscripciones.
+    """
+    __tablename__ = "marca_republicacion"
+    __table_args__ = {"schema": "encuestas_oltp"}
+
+    id_encuesta = Column(Integer, ForeignKey("encuestas_oltp.encuesta.id", ondelete="CASCADE"), primary_key=True)
+    id_transaccion_desde = Column(BigInteger, nullable=False)
+    huella_reglas = Column(String(16), nullable=True)
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class TransaccionEncuesta(Base):
     __tablename__ = "transaccion_encuesta"
     __table_args__ = {"schema": "encuestas_oltp"}
@@ -274,7 +399,8 @@ class TransaccionEncuesta(Base):
     id_transaccion = Column(Integer, primary_key=True)
     id_encuesta = Column(Integer, ForeignKey("encuestas_oltp.encuesta.id"), nullable=False)
     fecha_finalizacion = Column(DateTime(timezone=True), server_default=func.now())
-    metadatos_contexto = Column(JSONB, nullable=False)
+    metadatos_contexto = Column(JSONB, nullable=False) # datos del envío; el contexto académico va por id_contexto
+    id_contexto = Column(Integer, ForeignKey("encuestas_oltp.contexto_asignacion.id"), nullable=True, index=True)
     procesado_etl = Column(Boolean, default=False)
 
     respuestas = relationship("Respuesta", back_populates="transaccion", cascade="all, delete-orphan")
@@ -12,6 +12,14 @@ from app.security import CLAVE_SECRETA, ALGORITMO
 from app.services import sapientia_service
 # Importar nuevo servicio de dominio
 from app.servicios.encuesta_servicio import EncuestaServicio
+from app.servicios.cache_estado import cache_estado_bloqueo
+from app.servicios.proyeccion_bloqueo import ProyeccionBloqueo
+from app.servicios.cache_payload_encuesta import cache_payload_encuesta
+from app.servicios.validador_respuestas import cache_validadores
+from app.servicios.cargador_asignaciones import CargadorAsignaciones
+from app.servicios.publicacion_segundo_plano import publicacion_segundo_plano
+from app.servicios.estimador_publicacion import EstimadorPublicacion
+from app.servicios.republicacion_incremental import RepublicacionIncremental
 from datetime import datetime, timezone
 
 # Configurar logger
@@ -275,7 +283,13 @@ def actualizar_encuesta(
     for preg in encuesta_actualizada.preguntas:
         crear_pregunta_con_opciones(bd, encuesta_id, preg)
 
+    bd.flush()
+    ProyeccionBloqueo.recalcular_encuesta(bd, encuesta_id)
     bd.commit()
+    # prioridad/activo/estado pueden haber cambiado: el estado de bloqueo cacheado ya no es confiable
+    cache_estado_bloqueo.invalidar_todo()
+    cache_payload_encuesta.invalidar(encuesta_id)
+    cache_validadores.invalidar(encuesta_id)
 
     # Recargar con relaciones
     encuesta_actualizada_db = (
@@ -314,6 +328,132 @@ def publicar_encuesta(
         batch_size_pub=BATCH_SIZE_PUBLICACION
     )
 
+@router.get("/encuestas/{encuesta_id}/publicar/estimacion", response_model=schemas.EstimacionPublicacion)
+def estimar_publicacion(
+    encuesta_id: int,
+    bd: Session = Depends(obtener_bd),
+    usuario: modelos.UsuarioAdmin = Depends(solo_administradores)
+):
+    """
+    Simulación de la publicación: cuántas asignaciones crearía (y cuántas ya
+    existen) por etapa, y la duración estimada según publicaciones anteriores.
+    """
+    encuesta = bd.query(modelos.Encuesta).filter(modelos.Encuesta.id == encuesta_id).first()
+    if not encuesta:
+        raise HTTPException(status_code=404, detail="Encuesta no encontrada")
+    return EstimadorPublicacion.estimar(bd, encuesta)
+
+@router.post("/encuestas/{encuesta_id}/publicar/segundo-plano", response_model=schemas.TrabajoPublicacionSalida, status_code=202)
+def publicar_encuesta_segundo_plano(
+    encuesta_id: int,
+    bd: Session = Depends(obtener_bd),
+    usuario: modelos.UsuarioAdmin = Depends(solo_administradores)
+):
+    """
+    Publica la encuesta como trabajo en segundo plano. Responde de inmediato con el
+    trabajo; el avance se consulta en GET /admin/publicaciones/{id_trabajo}.
+    """
+    trabajo = publicacion_segundo_plano.crear(bd, encuesta_id, usuario.id_admin)
+    publicacion_segundo_plano.lanzar(trabajo.id)
+    return publicacion_segundo_plano.describir(trabajo)
+
+@router.get("/encuestas/{encuesta_id}/publicaciones", response_model=List[schemas.TrabajoPublicacionSalida])
+def listar_publicaciones(
+    encuesta_id: int,
+    bd: Session = Depends(obtener_bd),
+    usuario: modelos.UsuarioAdmin = Depends(solo_administradores)
+):
+    trabajos = bd.query(modelos.TrabajoPublicacion).filter(
+        modelos.TrabajoPublicacion.id_encuesta == encuesta_id
+    ).order_by(modelos.TrabajoPublicacion.id.desc()).all()
+    return [publicacion_segundo_plano.describir(t) for t in trabajos]
+
+def _obtener_trabajo(bd: Session, id_trabajo: int) -> modelos.TrabajoPublicacion:
+    trabajo = bd.query(modelos.TrabajoPublicacion).filter(modelos.TrabajoPublicacion.id == id_trabajo).first()
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo de publicación no encontrado")
+    return trabajo
+
+@router.get("/publicaciones/{id_trabajo}", response_model=schemas.TrabajoPublicacionSalida)
+def obtener_publicacion(
+    id_trabajo: int,
+    bd: Session = Depends(obtener_bd),
+    usuario: modelos.UsuarioAdmin = Depends(solo_administradores)
+):
+    """Avance del trabajo: alumnos procesados, asignaciones insertadas y ETA."""
+    return publicacion_segundo_plano.describir(_obtener_trabajo(bd, id_trabajo))
+
+@router.post("/publicaciones/{id_trabajo}/cancelar", response_model=schemas.TrabajoPublicacionSalida)
+def cancelar_publicacion(
+    id_trabajo: int,
+    bd: Session = Depends(obtener_bd),
+    usuario: modelos.UsuarioAdmin = Depends(solo_administradores)
+):
+    """El trabajo se detiene al terminar el tramo en curso; la encuesta sigue en BORRADOR."""
+    trabajo = publicacion_segundo_plano.cancelar(bd, _obtener_trabajo(bd, id_trabajo))
+    return publicacion_segundo_plano.describir(trabajo)
+
+@router.post("/publicaciones/{id_trabajo}/reanudar", response_model=schemas.TrabajoPublicacionSalida, status_code=202)
+def reanudar_publicacion(
+    id_trabajo: int,
+    bd: Session = Depends(obtener_bd),
+    usuario: modelos.UsuarioAdmin = Depends(solo_administradores)
+):
+    """Reanuda un trabajo con error o cancelado desde su último checkpoint."""
+    trabajo = publicacion_segundo_plano.preparar_reanudacion(bd, _obtener_trabajo(bd, id_trabajo))
+    publicacion_segundo_plano.lanzar(trabajo.id)
+    return publicacion_segundo_plano.describir(trabajo)
+
+@router.post("/encuestas/{encuesta_id}/republicar-incremental")
+def republicar_incremental(
+    encuesta_id: int,
+    bd: Session = Depends(obtener_bd),
+    usuario: modelos.UsuarioAdmin = Depends(solo_administradores)
+):
+    """
+    Asigna a una encuesta en curso las inscripciones llegadas después de publicarla.
+    Solo reprocesa los alumnos con cambios desde la última corrida (cambio_inscripcion).
+    """
+    encuesta = bd.query(modelos.Encuesta).filter(modelos.Encuesta.id == encuesta_id).first()
+    if not encuesta:
+        raise HTTPException(status_code=404, detail="Encuesta no encontrada")
+    if encuesta.estado != modelos.EstadoEncuesta.en_curso:
+        raise HTTPException(status_code=400, detail="Solo se pueden republicar encuestas EN CURSO")
+    EncuestaServicio.validar_reglas(encuesta)
+    return RepublicacionIncremental.republicar(bd, encuesta, batch_size=BATCH_SIZE_PUBLICACION)
+
+@router.post("/encuestas/{encuesta_id}/asignaciones/importar", response_model=schemas.ResultadoImportacionAsignaciones)
+def importar_asignaciones(
+    encuesta_id: int,
+    asignaciones: List[schemas.AsignacionImportar],
+    bd: Session = Depends(obtener_bd),
+    usuario: modelos.UsuarioAdmin = Depends(solo_administradores)
+):
+    """
+    Carga manual masiva de asignaciones para una encuesta. Las ya existentes
+    (mismo usuario y contexto) se ignoran. Reporta filas por segundo.
+    """
+    encuesta = bd.query(modelos.Encuesta).filter(modelos.Encuesta.id == encuesta_id).first()
+    if not encuesta:
+        raise HTTPException(status_code=404, detail="Encuesta no encontrada")
+    if encuesta.estado == modelos.EstadoEncuesta.finalizado:
+        raise HTTPException(status_code=400, detail="No se pueden agregar asignaciones a una encuesta finalizada")
+
+    filas = (
+        {
+            "id_usuario": a.id_usuario,
+            "id_encuesta": encuesta_id,
+            "id_referencia_contexto": a.id_referencia_contexto,
+            "metadatos_asignacion": a.metadatos_asignacion
+        }
+        for a in asignaciones
+    )
+    metricas = CargadorAsignaciones.cargar(bd, filas, BATCH_SIZE_PUBLICACION)
+    ProyeccionBloqueo.recalcular_encuesta(bd, encuesta_id)
+    bd.commit()
+    cache_estado_bloqueo.invalidar_todo()
+    return metricas
+
 def crear_asignacion_si_no_existe(bd: Session, id_encuesta: int, id_usuario: int, id_contexto: str, metadatos: dict):
     existe = bd.query(modelos.AsignacionUsuario).filter(
         modelos.AsignacionUsuario.id_usuario == id_usuario,
@@ -396,6 +536,9 @@ def finalizar_encuesta(
     # ✅ Registrar quién finalizó
     encuesta.usuario_modificacion = usuario.id_admin
     
+    bd.flush()
+    ProyeccionBloqueo.recalcular_encuesta(bd, encuesta.id)
     bd.commit()
+    cache_estado_bloqueo.invalidar_todo()
     bd.refresh(encuesta)
     return encuesta
\ No newline at end of file
@@ -6,7 +6,18 @@ from sqlalchemy import func, text
 from app.database import obtener_bd
 from app import modelos, schemas
 from app.routers.auth import obtener_usuario_actual
+from app.routers import reportes
 from app.modelos import UsuarioAdmin, RolAdmin, Encuesta, AsignacionUsuario, EstadoAsignacion, TransaccionEncuesta
+from app.servicios.cache_estado import cache_estado_bloqueo
+from app.servicios.proyeccion_bloqueo import ProyeccionBloqueo
+from app.servicios.idempotencia import almacen_idempotencia
+from app.servicios.commit_grupal import commit_grupal
+from app.servicios.buffer_borradores import buffer_borradores
+from app.servicios.retencion_borradores import (
+    RetencionBorradores, BORRADOR_RETENCION_DIAS, BORRADOR_GC_TAMANO_LOTE, BORRADOR_GC_MAX_LOTES
+)
+from app.servicios.catalogo_academico import catalogo_academico
+from app.servicios.republicacion_incremental import RepublicacionIncremental
 import etl
 import random
 import json
@@ -83,10 +94,136 @@ def trigger_etl(
         # Ejecutamos la función del script etl.py
         # Nota: Esto es sincrónico y bloqueará el request. Para MVP está bien.
         etl.ejecutar_etl()
+        reportes.invalidar_catalogos_olap()
         return {"mensaje": "ETL Ejecutado Correctamente"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en ETL: {str(e)}")
 
+@router.get("/cache/verificar-estado")
+def metricas_cache_verificar_estado(
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    """
+    Contadores de aciertos/fallos del cache de estado de bloqueo (CU11) de este proceso.
+    """
+    return cache_estado_bloqueo.metricas()
+
+@router.post("/cache/verificar-estado/invalidar")
+def invalidar_cache_verificar_estado(
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    cache_estado_bloqueo.invalidar_todo()
+    return {"mensaje": "Cache de estado de bloqueo invalidado"}
+
+@router.post("/proyeccion-bloqueo/reconstruir")
+def reconstruir_proyeccion_bloqueo(
+    bd: Session = Depends(obtener_bd),
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    """
+    Reconstruye por completo la tabla bloqueo_pendiente desde asignacion_usuario.
+    """
+    total = ProyeccionBloqueo.reconstruir(bd)
+    bd.commit()
+    cache_estado_bloqueo.invalidar_todo()
+    return {"mensaje": "Proyección de bloqueo reconstruida", "alumnos_bloqueados": total}
+
+@router.get("/proyeccion-bloqueo/consistencia")
+def consistencia_proyeccion_bloqueo(
+    bd: Session = Depends(obtener_bd),
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    """
+    Compara la proyección bloqueo_pendiente contra la consulta original de CU11.
+    """
+    return ProyeccionBloqueo.verificar_consistencia(bd)
+
+@router.post("/idempotencia/purgar")
+def purgar_claves_idempotencia(
+    limite: int = 5000,
+    bd: Session = Depends(obtener_bd),
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    """
+    Borra (en un lote acotado) las Idempotency-Key vencidas.
+    """
+    borradas = almacen_idempotencia.purgar_expiradas(bd, limite)
+    bd.commit()
+    return {"claves_borradas": borradas, "reintentos_atendidos": almacen_idempotencia.reintentos_atendidos}
+
+@router.get("/commit-grupal/metricas")
+def metricas_commit_grupal(
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    """
+    Tamaño promedio de lote y latencia agregada del commit grupal de CU07 (este proceso).
+    """
+    return commit_grupal.metricas()
+
+@router.get("/borradores/buffer")
+def metricas_buffer_borradores(
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    """
+    Estado del buffer write-behind de borradores (RF08) de este proceso.
+    """
+    return buffer_borradores.metricas()
+
+@router.post("/borradores/buffer/vaciar")
+def vaciar_buffer_borradores(
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    return {"filas_escritas": buffer_borradores.vaciar()}
+
+@router.post("/borradores/retencion")
+def ejecutar_retencion_borradores(
+    dry_run: bool = True,
+    retencion_dias: int = BORRADOR_RETENCION_DIAS,
+    tamano_lote: int = BORRADOR_GC_TAMANO_LOTE,
+    max_lotes: int = BORRADOR_GC_MAX_LOTES,
+    bd: Session = Depends(obtener_bd),
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    """
+    Borra por lotes los borradores de asignaciones realizadas/canceladas, de encuestas
+    finalizadas y los que superan la retención. Por defecto solo cuenta (dry_run).
+    """
+    return RetencionBorradores.ejecutar(bd, dry_run, retencion_dias, tamano_lote, max_lotes)
+
+@router.get("/borradores/retencion")
+def ultima_retencion_borradores(
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    return RetencionBorradores.ultima_ejecucion or {"mensaje": "Sin ejecuciones en este proceso"}
+
+@router.get("/catalogo-academico")
+def estado_catalogo_academico(
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    """
+    Versión y fecha de carga del snapshot en memoria de la oferta académica (este proceso).
+    """
+    return catalogo_academico.metricas()
+
+@router.post("/catalogo-academico/refrescar")
+def refrescar_catalogo_academico(
+    bd: Session = Depends(obtener_bd),
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    catalogo_academico.refrescar(bd)
+    return catalogo_academico.metricas()
+
+@router.post("/republicacion-incremental")
+def republicacion_incremental(
+    bd: Session = Depends(obtener_bd),
+    admin: UsuarioAdmin = Depends(solo_admin)
+):
+    """
+    Asigna las inscripciones tardías a todas las encuestas en curso. Solo se
+    reprocesan los alumnos con cambios desde la última corrida de cada encuesta.
+    """
+    return RepublicacionIncremental.republicar_en_curso(bd)
+
 # --- SIMULACIÓN ---
 
 from pydantic import BaseModel
@@ -190,6 +327,8 @@ def simular_encuesta(
         def finalizar_simulado(resps):
             asignacion.estado = EstadoAsignacion.realizada
             asignacion.fecha_realizacion = func.now()
+            bd.flush()
+            ProyeccionBloqueo.recalcular_alumnos(bd, [asignacion.id_usuario])
             
             import hashlib
             hash_user = hashlib.sha256(f"{req.id_usuario}SIM".encode()).hexdigest()
@@ -216,6 +355,7 @@ def simular_encuesta(
                 logs.append("Borrador eliminado tras finalizar.")
 
             bd.commit()
+            cache_estado_bloqueo.invalidar(asignacion.id_usuario)
             logs.append("Encuesta FINALIZADA y guardada en OLTP.")
 
         # --- LÓGICA POR ESCENARIO ---
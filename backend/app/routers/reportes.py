@@ -1,11 +1,18 @@
 from typing import List, Dict, Any
+import json
+import time
+import hashlib
 import logging
-from fastapi import APIRouter, Depends
+import threading
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import text, func
 from app.database import obtener_bd
 from app import modelos, schemas
 from app.routers.admin import obtener_usuario_actual
+from app.servicios.catalogo_academico import CATALOGO_REFRESCO_SEGUNDOS
+from app.servicios.respuesta_condicional import respuesta_catalogo
 
 # Configurar logger
 logger = logging.getLogger(__name__)
@@ -185,27 +192,48 @@ def reporte_tabla_respuestas(
         for row in resultados
     ]
 
-@router.get("/catalogos", response_model=Dict[str, List[str]])
-def obtener_catalogos_reportes(
-    bd: Session = Depends(obtener_bd),
-    usuario: dict = Depends(obtener_usuario_actual)
-):
-    """
-    Retorna listas únicas de facultades, departamentos y DOCENTES para filtros.
-    Consulta las tablas de dimensión OLAP.
-    """
-    try:
+# Catálogo OLAP en memoria: las dimensiones solo cambian cuando corre el ETL
+_catalogos_olap: Dict[str, Any] = {"vence_en": 0.0, "datos": None, "version": None, "fecha": None}
+_lock_catalogos_olap = threading.Lock()
+
+def invalidar_catalogos_olap():
+    _catalogos_olap["vence_en"] = 0.0
+
+def _cargar_catalogos_olap(bd: Session) -> Dict[str, Any]:
+    with _lock_catalogos_olap:
+        if _catalogos_olap["datos"] is not None and time.monotonic() < _catalogos_olap["vence_en"]:
+            return _catalogos_olap
+
         facultades = bd.execute(text("SELECT DISTINCT nombre_facultad FROM encuestas_olap.dim_ubicacion ORDER BY 1")).fetchall()
         departamentos = bd.execute(text("SELECT DISTINCT nombre_carrera FROM encuestas_olap.dim_ubicacion ORDER BY 1")).fetchall()
         docentes = bd.execute(text("SELECT DISTINCT nombre_profesor FROM encuestas_olap.dim_contexto_academico WHERE nombre_profesor != 'Desconocido' ORDER BY 1")).fetchall()
         sedes = bd.execute(text("SELECT DISTINCT nombre_campus FROM encuestas_olap.dim_ubicacion ORDER BY 1")).fetchall()
         
-        return {
+        datos = {
             "facultades": [r[0] for r in facultades if r[0]],
             "departamentos": [r[0] for r in departamentos if r[0]],
             "docentes": [r[0] for r in docentes if r[0]],
             "sedes": [r[0] for r in sedes if r[0]]
         }
+        version = hashlib.sha1(json.dumps(datos, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        if version != _catalogos_olap["version"]:
+            _catalogos_olap.update(datos=datos, version=version, fecha=datetime.now(timezone.utc))
+        _catalogos_olap["vence_en"] = time.monotonic() + CATALOGO_REFRESCO_SEGUNDOS
+        return _catalogos_olap
+
+@router.get("/catalogos", response_model=Dict[str, List[str]])
+def obtener_catalogos_reportes(
+    request: Request,
+    bd: Session = Depends(obtener_bd),
+    usuario: dict = Depends(obtener_usuario_actual)
+):
+    """
+    Retorna listas únicas de facultades, departamentos y DOCENTES para filtros.
+    Consulta las tablas de dimensión OLAP (con cache en memoria, ETag y 304).
+    """
+    try:
+        catalogo = _cargar_catalogos_olap(bd)
+        return respuesta_catalogo(request, catalogo["datos"], catalogo["version"], catalogo["fecha"])
     except Exception as e:
         logger.error(f"Error cargando catalogos OLAP: {e}")
         return {"facultades": [], "departamentos": [], "docentes": [], "sedes": []}
@@ -87,16 +87,26 @@ def get_idd_metrics(
 ):
     # Base query filter builder
     def apply_filters(query, model_class):
+        # Contexto académico: en contexto_asignacion (id_contexto) o, en transacciones
+        # previas al diccionario, copiado en metadatos_contexto
+        Contexto = modelos.ContextoAsignacion
+        query = query.outerjoin(Contexto, Contexto.id == model_class.id_contexto)
+
+        def campo(clave, clave_contexto=None, contexto_primero=False):
+            envio = model_class.metadatos_contexto[clave].astext
+            contexto = Contexto.metadatos[clave_contexto or clave].astext
+            return func.coalesce(contexto, envio) if contexto_primero else func.coalesce(envio, contexto)
+
         if campus and campus != "Todos":
-            query = query.filter(model_class.metadatos_contexto['campus'].astext == campus)
+            query = query.filter(campo('campus') == campus)
         if facultad and facultad != "Todos":
-            query = query.filter(model_class.metadatos_contexto['facultad'].astext == facultad)
+            query = query.filter(campo('facultad') == facultad)
         if departamento and departamento != "Todos":
-            query = query.filter(model_class.metadatos_contexto['departamento'].astext == departamento)
+            query = query.filter(campo('departamento') == departamento)
         if docente and docente != "Todos":
-            query = query.filter(model_class.metadatos_contexto['docente'].astext == docente)
+            query = query.filter(campo('docente') == docente)
         if asignatura and asignatura != "Todos":
-            query = query.filter(model_class.metadatos_contexto['asignatura'].astext == asignatura)
+            query = query.filter(campo('asignatura', 'materia', contexto_primero=True) == asignatura)
         if anho:
             query = query.filter(model_class.metadatos_contexto['anho'].astext == str(anho))
         if semestre:
@@ -1,11 +1,27 @@
+import json
+import base64
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy import text
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text, select, table, column, tuple_, literal
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.database import obtener_bd
 from app.routers.auth import obtener_usuario_actual
 from app import modelos as mod
 from app import schemas as sch
+from app.servicios.cache_estado import cache_estado_bloqueo
+from app.servicios.cache_payload_encuesta import cache_payload_encuesta
+from app.servicios.proyeccion_bloqueo import ProyeccionBloqueo, USAR_PROYECCION_BLOQUEO
+from app.servicios.respuestas_servicio import RespuestasServicio
+from app.servicios import ingesta_respuestas
+from app.servicios.ingesta_respuestas import IngestaRespuestas
+from app.servicios.idempotencia import almacen_idempotencia, ClaveIdempotenciaRepetida
+from app.servicios.commit_grupal import commit_grupal
+from app.servicios.borrador_servicio import BorradorServicio
+from app.servicios.buffer_borradores import buffer_borradores
+from app.servicios.catalogo_academico import catalogo_academico
+from app.servicios.respuesta_condicional import respuesta_catalogo
 
 router = APIRouter(
     prefix="/sapientia",
@@ -17,123 +33,81 @@ router = APIRouter(
 # LOGICA DE NEGOCIO (HELPERS)
 # =============================================================================
 
-def _get_campus(bd: Session) -> List[str]:
-    rows = bd.execute(text("SELECT DISTINCT campus FROM sapientia.oferta_academica ORDER BY campus")).fetchall()
-    return [r[0] for r in rows if r[0]]
-
-def _get_facultades(bd: Session, campus: Optional[str] = None) -> List[str]:
-    sql = "SELECT DISTINCT facultad FROM sapientia.oferta_academica WHERE 1=1"
-    params = {}
-    if campus:
-        sql += " AND campus = :campus"
-        params["campus"] = campus
-    sql += " ORDER BY facultad"
-    
-    rows = bd.execute(text(sql), params).fetchall()
-    return [r[0] for r in rows if r[0]]
-
-def _get_departamentos(bd: Session, campus: Optional[str] = None, facultad: Optional[str] = None) -> List[str]:
-    sql = "SELECT DISTINCT departamento FROM sapientia.oferta_academica WHERE 1=1"
-    params = {}
-    if campus:
-        sql += " AND campus = :campus"
-        params["campus"] = campus
-    if facultad:
-        sql += " AND facultad = :facultad"
-        params["facultad"] = facultad
-    sql += " ORDER BY departamento"
-    
-    rows = bd.execute(text(sql), params).fetchall()
-    return [r[0] for r in rows if r[0]]
+# Los catálogos se responden desde el snapshot en memoria de la oferta académica
+# (ver app/servicios/catalogo_academico.py), no con un SELECT DISTINCT por llamada.
+# ETag/Last-Modified salen de la versión del snapshot: el navegador y el proxy
+# de Sapientia revalidan con 304 mientras la oferta no cambie.
 
-def _get_asignaturas(bd: Session, campus: Optional[str] = None, facultad: Optional[str] = None, departamento: Optional[str] = None, docente: Optional[str] = None) -> List[Dict[str, Any]]:
-    sql = """
-        SELECT DISTINCT cod_asignatura, asignatura, seccion 
-        FROM sapientia.oferta_academica 
-        WHERE 1=1
-    """
-    params = {}
-    if campus:
-        sql += " AND campus = :campus"
-        params["campus"] = campus
-    if facultad:
-        sql += " AND facultad = :facultad"
-        params["facultad"] = facultad
-    if departamento:
-        sql += " AND departamento = :departamento"
-        params["departamento"] = departamento
-    if docente:
-        sql += " AND docente = :docente"
-        params["docente"] = docente
-        
-    sql += " ORDER BY asignatura, seccion"
-    
-    rows = bd.execute(text(sql), params).fetchall()
-    return [
-        {"codigo": r[0], "nombre": r[1], "seccion": r[2]} 
-        for r in rows
-    ]
-
-def _get_docentes(bd: Session, campus: Optional[str] = None, facultad: Optional[str] = None, departamento: Optional[str] = None) -> List[str]:
-    sql = "SELECT DISTINCT docente FROM sapientia.oferta_academica WHERE docente IS NOT NULL"
-    params = {}
-    if campus:
-        sql += " AND campus = :campus"
-        params["campus"] = campus
-    if facultad:
-        sql += " AND facultad = :facultad"
-        params["facultad"] = facultad
-    if departamento:
-        sql += " AND departamento = :departamento"
-        params["departamento"] = departamento
-        
-    sql += " ORDER BY docente"
-    
-    rows = bd.execute(text(sql), params).fetchall()
-    return [r[0] for r in rows if r[0]]
+def _respuesta_catalogo(request: Request, bd: Session, consulta):
+    snapshot = catalogo_academico.obtener(bd)
+    return respuesta_catalogo(request, consulta(snapshot), snapshot.version, snapshot.fecha_carga)
 
 # =============================================================================
 # ENDPOINTS ESPECIFICOS
 # =============================================================================
 
 @router.get("/campus", response_model=List[str])
-def get_campus(bd: Session = Depends(obtener_bd)):
+def get_campus(request: Request, bd: Session = Depends(obtener_bd)):
     """Retorna lista de Campus distintos"""
-    return _get_campus(bd)
+    return _respuesta_catalogo(request, bd, lambda s: s.campus())
 
 @router.get("/facultades", response_model=List[str])
 def get_facultades(
+    request: Request,
     campus: Optional[str] = Query(None),
     bd: Session = Depends(obtener_bd)
 ):
-    return _get_facultades(bd, campus)
+    return _respuesta_catalogo(request, bd, lambda s: s.facultades(campus))
 
 @router.get("/departamentos", response_model=List[str])
 def get_departamentos(
+    request: Request,
     campus: Optional[str] = Query(None),
     facultad: Optional[str] = Query(None),
     bd: Session = Depends(obtener_bd)
 ):
-    return _get_departamentos(bd, campus, facultad)
+    return _respuesta_catalogo(request, bd, lambda s: s.departamentos(campus, facultad))
 
 @router.get("/asignaturas", response_model=List[dict])
 def get_asignaturas(
+    request: Request,
     campus: Optional[str] = Query(None),
     facultad: Optional[str] = Query(None),
     departamento: Optional[str] = Query(None),
     docente: Optional[str] = Query(None),
     bd: Session = Depends(obtener_bd)
 ):
-    return _get_asignaturas(bd, campus, facultad, departamento, docente)
+    return _respuesta_catalogo(request, bd, lambda s: s.asignaturas(campus, facultad, departamento, docente))
 
 @router.get("/docentes", response_model=List[str])
 def get_docentes(
+    request: Request,
     campus: Optional[str] = Query(None),
     facultad: Optional[str] = Query(None),
     departamento: Optional[str] = Query(None),
     bd: Session = Depends(obtener_bd)
 ):
-    return _get_docentes(bd, campus, facultad, departamento)
+    return _respuesta_catalogo(request, bd, lambda s: s.docentes(campus, facultad, departamento))
+
+@router.get("/autocompletar/{tipo}", response_model=List[dict])
+def autocompletar_catalogo(
+    tipo: str,
+    q: str = Query(..., min_length=1),
+    campus: Optional[str] = Query(None),
+    facultad: Optional[str] = Query(None),
+    departamento: Optional[str] = Query(None),
+    limite: int = Query(10, ge=1, le=100),
+    bd: Session = Depends(obtener_bd)
+):
+    """
+    Autocompletado de docentes o asignaturas por prefijo de palabra, sin distinguir
+    mayúsculas ni acentos. Evita descargar los listados completos en el formulario.
+    """
+    tipo = tipo.lower()
+    if tipo not in ("docente", "asignatura"):
+        raise HTTPException(status_code=400, detail="Tipo de autocompletado no soportado (docente | asignatura)")
+    indice = catalogo_academico.obtener(bd).indice(tipo)
+    return indice.buscar(q, limite, campus, facultad, departamento)
 
 @router.get("/alumnos", response_model=List[dict])
 def get_alumnos_contexto(
@@ -157,6 +131,82 @@ def get_alumnos_contexto(
         for r in rows
     ]
 
+MAX_SECCIONES_NOMINA = 500
+MAX_TAMANO_PAGINA_NOMINA = 5000
+
+_inscripciones = table(
+    "inscripciones",
+    column("id_alumno"), column("cod_asignatura"), column("seccion"),
+    schema="sapientia"
+)
+
+def _codificar_token(clave: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(clave)).encode("utf-8")).decode("ascii")
+
+def _decodificar_token(token: str) -> tuple:
+    try:
+        id_alumno, cod_asignatura, seccion = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return int(id_alumno), str(cod_asignatura), str(seccion)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Token de página inválido")
+
+@router.post("/alumnos/nomina")
+def get_nomina_alumnos(
+    request: sch.NominaAlumnosRequest,
+    bd: Session = Depends(obtener_bd)
+):
+    """
+    Nómina de alumnos de muchas (asignatura, sección) en una sola llamada.
+    Paginación por clave (id_alumno, cod_asignatura, seccion): cada página es una
+    consulta indexada con LIMIT, sin OFFSET, que se lee y se emite en streaming como
+    {"alumnos": [...], "siguiente_token": ...}.
+    """
+    if not request.secciones:
+        raise HTTPException(status_code=400, detail="Debe indicar al menos una sección")
+    if len(request.secciones) > MAX_SECCIONES_NOMINA:
+        raise HTTPException(status_code=400, detail=f"Se admiten como máximo {MAX_SECCIONES_NOMINA} secciones por llamada")
+    tamano = max(1, min(request.tamano_pagina, MAX_TAMANO_PAGINA_NOMINA))
+
+    clave = tuple_(_inscripciones.c.id_alumno, _inscripciones.c.cod_asignatura, _inscripciones.c.seccion)
+    consulta = (
+        select(_inscripciones.c.id_alumno, _inscripciones.c.cod_asignatura, _inscripciones.c.seccion)
+        .where(tuple_(_inscripciones.c.cod_asignatura, _inscripciones.c.seccion).in_(
+            list({(s.cod_asignatura, s.seccion) for s in request.secciones})
+        ))
+        .order_by(_inscripciones.c.id_alumno, _inscripciones.c.cod_asignatura, _inscripciones.c.seccion)
+        .limit(tamano + 1)
+    )
+    if request.token:
+        consulta = consulta.where(clave > tuple_(*[literal(v) for v in _decodificar_token(request.token)]))
+
+    def generar():
+        # Las filas se leen en trozos con un cursor del servidor mientras se emiten:
+        # la página nunca está entera en memoria. La fila tamano + 1 solo indica que
+        # hay otra página. La sesión de obtener_bd se cierra al terminar la respuesta.
+        resultado = bd.execute(consulta.execution_options(yield_per=500))
+        emitidas = 0
+        ultima = None
+        siguiente = False
+        yield b'{"alumnos":['
+        for trozo in resultado.partitions():
+            if emitidas + len(trozo) > tamano:
+                siguiente = True
+                trozo = trozo[:tamano - emitidas]
+            if trozo:
+                yield ((',' if emitidas else '') + ",".join(
+                    json.dumps({"id": r[0], "nombre": f"Alumno {r[0]}", "cod_asignatura": r[1], "seccion": r[2]}, ensure_ascii=False)
+                    for r in trozo
+                )).encode("utf-8")
+                emitidas += len(trozo)
+                ultima = tuple(trozo[-1])
+            if siguiente:
+                break
+        resultado.close()
+        token = _codificar_token(ultima) if siguiente else None
+        yield ('],"siguiente_token":' + json.dumps(token) + '}').encode("utf-8")
+
+    return StreamingResponse(generar(), media_type="application/json")
+
 # =============================================================================
 # ENDPOINT GENERICO (Compatibilidad Frontend)
 # =============================================================================
@@ -164,6 +214,7 @@ def get_alumnos_contexto(
 @router.get("/catalogos/{tipo}", response_model=List[str])
 def get_catalogo_generico(
     tipo: str,
+    request: Request,
     bd: Session = Depends(obtener_bd)
 ):
     """
@@ -173,25 +224,21 @@ def get_catalogo_generico(
     tipo = tipo.lower()
 
     if tipo == "campus":
-        return _get_campus(bd)
+        return _respuesta_catalogo(request, bd, lambda s: s.campus())
     
     elif tipo == "facultad":
-        return _get_facultades(bd)
+        return _respuesta_catalogo(request, bd, lambda s: s.facultades())
     
     elif tipo in ["departamento", "carrera"]:
-        return _get_departamentos(bd)
+        return _respuesta_catalogo(request, bd, lambda s: s.departamentos())
     
     elif tipo == "docente":
-        return _get_docentes(bd)
+        return _respuesta_catalogo(request, bd, lambda s: s.docentes())
     
     elif tipo == "asignatura":
         # Para asignaturas strings, formateamos: "Nombre (Codigo)"
-        # Reusamos la logica de get_asignaturas pero formateamos
-        raw_asig = _get_asignaturas(bd) # Retorna dicts
         # Evitar duplicados de nombre si hay multiples secciones
-        # Pero ConstructorReglas espera string. Uniquificamos por string resultante.
-        nombres = {f"{a['nombre']} ({a['codigo']})" for a in raw_asig}
-        return sorted(list(nombres))
+        return _respuesta_catalogo(request, bd, lambda s: s.asignaturas_etiquetas())
 
     else:
         return []
@@ -200,27 +247,15 @@ def get_catalogo_generico(
 # ENDPOINTS DE INTEGRACIÓN (CU11 / CU07)
 # =============================================================================
 
-@router.post("/verificar-estado", response_model=sch.RespuestaVerificacionEstado)
-def verificar_estado_alumno(
-    id_alumno: int,
-    bd: Session = Depends(obtener_bd)
-):
-    """
-    CU11: Sapientia consulta si el alumno tiene encuestas pendientes obligatorias/bloqueantes.
-    """
-    asignacion = bd.query(mod.AsignacionUsuario).join(mod.Encuesta).filter(
-        mod.AsignacionUsuario.id_usuario == id_alumno,
-        mod.AsignacionUsuario.estado == mod.EstadoAsignacion.pendiente,
-        mod.Encuesta.activo == True,
-        mod.Encuesta.estado == mod.EstadoEncuesta.en_curso,
-        mod.Encuesta.prioridad == mod.PrioridadEncuesta.obligatoria
-    ).first()
+# Máximo de alumnos aceptados por llamada al endpoint de lote
+MAX_ALUMNOS_VERIFICACION_LOTE = 5000
 
-    if asignacion:
+def _respuesta_estado(id_encuesta: Optional[int], nombre_encuesta: Optional[str]) -> Dict[str, Any]:
+    if id_encuesta is not None:
         return {
             "estado_bloqueo": True,
-            "mensaje": f"Tienes una encuesta pendiente: {asignacion.encuesta.nombre}",
-            "id_encuesta_pendiente": asignacion.id_encuesta,
+            "mensaje": f"Tienes una encuesta pendiente: {nombre_encuesta}",
+            "id_encuesta_pendiente": id_encuesta,
             "datos_encuesta": None 
         }
     
@@ -230,98 +265,207 @@ def verificar_estado_alumno(
         "id_encuesta_pendiente": None
     }
 
+@router.post("/verificar-estado", response_model=sch.RespuestaVerificacionEstado)
+def verificar_estado_alumno(
+    id_alumno: int,
+    bd: Session = Depends(obtener_bd)
+):
+    """
+    CU11: Sapientia consulta si el alumno tiene encuestas pendientes obligatorias/bloqueantes.
+    Se responde desde el cache en memoria siempre que sea posible.
+    """
+    encontrado, id_encuesta, nombre_encuesta = cache_estado_bloqueo.obtener(id_alumno)
+
+    if not encontrado:
+        generacion = cache_estado_bloqueo.generacion()
+        if USAR_PROYECCION_BLOQUEO:
+            id_encuesta, nombre_encuesta = ProyeccionBloqueo.consultar(bd, id_alumno)
+        else:
+            # Respaldo: consulta original sobre asignaciones
+            asignacion = bd.query(mod.AsignacionUsuario).join(mod.Encuesta).filter(
+                mod.AsignacionUsuario.id_usuario == id_alumno,
+                *ProyeccionBloqueo.condiciones_bloqueo()
+            ).order_by(mod.Encuesta.id).first()
+
+            if asignacion:
+                id_encuesta = asignacion.id_encuesta
+                nombre_encuesta = asignacion.encuesta.nombre
+        cache_estado_bloqueo.guardar(id_alumno, id_encuesta, nombre_encuesta, generacion)
+
+    return _respuesta_estado(id_encuesta, nombre_encuesta)
+
+@router.post("/verificar-estado/lote", response_model=sch.RespuestaVerificacionEstadoLote)
+def verificar_estado_alumnos_lote(
+    solicitud: sch.VerificacionEstadoLoteRequest,
+    bd: Session = Depends(obtener_bd)
+):
+    """
+    CU11 (lote): Verifica el estado de bloqueo de muchos alumnos en una sola llamada.
+    Los alumnos que no están en cache se resuelven con una única consulta por conjunto.
+    """
+    ids_alumnos = list(dict.fromkeys(solicitud.ids_alumnos))
+    if len(ids_alumnos) > MAX_ALUMNOS_VERIFICACION_LOTE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Se admiten como máximo {MAX_ALUMNOS_VERIFICACION_LOTE} alumnos por lote"
+        )
+
+    estados = {}
+    faltantes = []
+    for id_alumno in ids_alumnos:
+        encontrado, id_encuesta, nombre_encuesta = cache_estado_bloqueo.obtener(id_alumno)
+        if encontrado:
+            estados[id_alumno] = (id_encuesta, nombre_encuesta)
+        else:
+            faltantes.append(id_alumno)
+
+    if faltantes:
+        generacion = cache_estado_bloqueo.generacion()
+        if USAR_PROYECCION_BLOQUEO:
+            bloqueos = ProyeccionBloqueo.consultar_lote(bd, faltantes)
+        else:
+            filas = bd.query(
+                mod.AsignacionUsuario.id_usuario,
+                mod.Encuesta.id,
+                mod.Encuesta.nombre
+            ).join(mod.Encuesta).filter(
+                mod.AsignacionUsuario.id_usuario.in_(faltantes),
+                *ProyeccionBloqueo.condiciones_bloqueo()
+            ).order_by(mod.AsignacionUsuario.id_usuario, mod.Encuesta.id).all()
+
+            bloqueos = {}
+            for id_usuario, id_encuesta, nombre_encuesta in filas:
+                # Nos quedamos con la primera encuesta bloqueante de cada alumno
+                bloqueos.setdefault(id_usuario, (id_encuesta, nombre_encuesta))
+
+        for id_alumno in faltantes:
+            id_encuesta, nombre_encuesta = bloqueos.get(id_alumno, (None, None))
+            estados[id_alumno] = (id_encuesta, nombre_encuesta)
+            cache_estado_bloqueo.guardar(id_alumno, id_encuesta, nombre_encuesta, generacion)
+
+    return {
+        "resultados": [
+            {"id_alumno": id_alumno, **_respuesta_estado(*estados[id_alumno])}
+            for id_alumno in ids_alumnos
+        ]
+    }
+
+@router.get("/encuestas/{id_encuesta}/contenido", response_model=sch.EncuestaAlumnoSalida)
+def obtener_contenido_encuesta(
+    id_encuesta: int,
+    request: Request,
+    bd: Session = Depends(obtener_bd)
+):
+    """
+    Contenido de la encuesta (preguntas y opciones) para que el alumno la responda.
+    Se sirve pre-serializado desde memoria con ETag; responde 304 si el cliente ya
+    tiene la versión vigente (If-None-Match).
+    """
+    resultado = cache_payload_encuesta.obtener(bd, id_encuesta)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Encuesta no encontrada")
+
+    etag, payload_json = resultado
+    cabeceras = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag in [e.strip() for e in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=cabeceras)
+
+    return Response(content=payload_json, media_type="application/json", headers=cabeceras)
+
 @router.post("/recepcionar-respuestas", status_code=200)
 def recibir_respuestas(
     envio: sch.EnvioRespuestasAlumno,
-    bd: Session = Depends(obtener_bd)
+    bd: Session = Depends(obtener_bd),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     CU07: Recibe las respuestas desde Sapientia (o Frontend simulado).
+    Con cabecera Idempotency-Key, los reintentos se responden con el resultado
+    original sin volver a escribir.
     """
-    # 1. Verificar Asignación
-    asignacion = bd.query(mod.AsignacionUsuario).filter(
-        mod.AsignacionUsuario.id_usuario == envio.id_usuario,
-        mod.AsignacionUsuario.id_encuesta == envio.id_encuesta,
-    ).first()
+    operacion = "recepcionar-respuestas"
+    payload = envio.model_dump(mode="json")
+    if idempotency_key:
+        previo = almacen_idempotencia.obtener(bd, operacion, idempotency_key, payload)
+        if previo is not None:
+            return previo
+
+    if commit_grupal.activo:
+        return _recibir_respuestas_commit_grupal(envio, bd, operacion, payload, idempotency_key)
+
+    RespuestasServicio.validar_preguntas(bd, envio)
+    RespuestasServicio.persistir_envio(bd, envio)
+    resultado = {"mensaje": "Respuestas recibidas correctamente"}
+
+    if idempotency_key:
+        huellas = almacen_idempotencia.registrar(bd, operacion, idempotency_key, payload, resultado)
+        try:
+            bd.commit()
+        except IntegrityError:
+            # Un reintento concurrente con la misma clave confirmó primero
+            bd.rollback()
+            return almacen_idempotencia.obtener(bd, operacion, idempotency_key, payload) or resultado
+        almacen_idempotencia.confirmar(*huellas, resultado)
+    else:
+        bd.commit()
+
+    cache_estado_bloqueo.invalidar(envio.id_usuario)
+    return resultado
+
+def _recibir_respuestas_commit_grupal(envio, bd, operacion, payload, idempotency_key):
+    """Variante de CU07 que comparte transacción y commit con otros envíos concurrentes."""
+    resultado = {"mensaje": "Respuestas recibidas correctamente"}
+    huellas = []
+
+    def escribir(db_lote: Session):
+        RespuestasServicio.validar_preguntas(db_lote, envio)
+        RespuestasServicio.persistir_envio(db_lote, envio)
+        if idempotency_key:
+            # Asignación (no extend): si falla el commit del lote, la operación se reintenta sola
+            huellas[:] = almacen_idempotencia.registrar(db_lote, operacion, idempotency_key, payload, resultado)
+        return resultado
+
+    try:
+        commit_grupal.ejecutar(escribir)
+    except (IntegrityError, ClaveIdempotenciaRepetida):
+        if not idempotency_key:
+            raise
+        # Un reintento concurrente con la misma clave confirmó primero (o viajó en el mismo lote)
+        return almacen_idempotencia.obtener(bd, operacion, idempotency_key, payload) or resultado
+
+    if huellas:
+        almacen_idempotencia.confirmar(*huellas, resultado)
+    cache_estado_bloqueo.invalidar(envio.id_usuario)
+    return resultado
+
+@router.post("/recepcionar-respuestas/async", status_code=202, response_model=sch.ReciboIngesta)
+def recibir_respuestas_async(
+    envio: sch.EnvioRespuestasAlumno,
+    bd: Session = Depends(obtener_bd)
+):
+    """
+    CU07 (modo ingesta): valida el envío, lo agrega a la cola durable y responde 202
+    con un recibo. Un trabajador en segundo plano lo persiste por lotes.
+    """
+    if not ingesta_respuestas.INGESTA_ASINCRONA_HABILITADA:
+        raise HTTPException(status_code=503, detail="La ingesta asíncrona de respuestas no está habilitada")
 
-    if not asignacion:
-        pass
-
-    # QA Fix: Validación de Integridad de Datos.
-    ids_preguntas_enviadas = {r.id_pregunta for r in envio.respuestas}
-    if ids_preguntas_enviadas:
-        preguntas_validas = bd.query(mod.Pregunta.id).filter(
-            mod.Pregunta.id_encuesta == envio.id_encuesta,
-            mod.Pregunta.id.in_(ids_preguntas_enviadas)
-        ).all()
-        ids_validos = {p[0] for p in preguntas_validas}
-        
-        if len(ids_validos) != len(ids_preguntas_enviadas):
-             invalidas = ids_preguntas_enviadas - ids_validos
-             raise HTTPException(
-                 status_code=400, 
-                 detail=f"Integridad de datos fallida: Las preguntas {invalidas} no pertenecen a la encuesta {envio.id_encuesta}"
-             )
-
-    # 2. Registrar Transacción
-    import hashlib
-    salt = "SAPIENTIA_SECRET_SALT_2025" 
-    hash_usuario = hashlib.sha256(f"{envio.id_usuario}{salt}".encode()).hexdigest()
-
-    # --- DATOS DE CONTEXTO ---
-    # Recuperamos metadatos de la asignación si existen
-    meta_asignacion = asignacion.metadatos_asignacion if (asignacion and asignacion.metadatos_asignacion) else {}
-    
-    # Contexto base del envío (app móvil/frontend)
-    contexto_final = {
-        "origen": "sapientia_api", 
-        "hash_usuario": hash_usuario, 
-        "id_referencia": envio.id_referencia_contexto,
-        **envio.metadatos_contexto
-    }
+    id_recibo = IngestaRespuestas.encolar(bd, envio)
+    return {"id_recibo": id_recibo, "estado": ingesta_respuestas.ESTADO_PENDIENTE}
 
-    # Merge: Metadatos de asignación tienen precedencia o complementan
-    # IMPORTANTE: Mapeo de claves para ETL (etl.py espera 'profesor', 'asignatura')
-    # sapientia_service.py genera 'docente', 'materia'
-    
-    if "docente" in meta_asignacion:
-        contexto_final["profesor"] = meta_asignacion["docente"]
-    
-    if "materia" in meta_asignacion:
-        contexto_final["asignatura"] = meta_asignacion["materia"]
-        
-    # Copiamos el resto de metadatos útiles
-    for k, v in meta_asignacion.items():
-        if k not in contexto_final:
-            contexto_final[k] = v
-
-    new_trans = mod.TransaccionEncuesta(
-        id_encuesta=envio.id_encuesta,
-        metadatos_contexto=contexto_final,
-        procesado_etl=False
-    )
-    bd.add(new_trans)
-    bd.flush()
-    
-    nueva_transaccion = new_trans # Mantener nombre variable para codigo siguiente
-
-    # 3. Guardar Respuestas
-    for r in envio.respuestas:
-        nueva_resp = mod.Respuesta(
-            id_transaccion=nueva_transaccion.id_transaccion,
-            id_pregunta=r.id_pregunta,
-            valor_respuesta=r.valor_respuesta,
-            id_opcion=r.id_opcion
-        )
-        bd.add(nueva_resp)
-
-    # 4. Actualizar Asignación
-    if asignacion:
-        asignacion.estado = mod.EstadoAsignacion.realizada
-        asignacion.fecha_realizacion = text("now()")
-    
-    bd.commit()
-    return {"mensaje": "Respuestas recibidas correctamente"}
+@router.get("/recepcionar-respuestas/recibos/{id_recibo}", response_model=sch.EstadoReciboIngesta)
+def estado_recibo_respuestas(
+    id_recibo: str,
+    bd: Session = Depends(obtener_bd)
+):
+    """
+    Estado de un envío recibido en modo asíncrono (pendiente, procesado o error).
+    """
+    estado = IngestaRespuestas.estado_recibo(bd, id_recibo)
+    if not estado:
+        raise HTTPException(status_code=404, detail="Recibo no encontrado")
+    return estado
 
 # =============================================================================
 # ENDPOINTS PARA BORRADOR (RF08 - Guardar Progreso Parcial)
@@ -330,12 +474,23 @@ def recibir_respuestas(
 @router.post("/guardar-borrador", status_code=200)
 def guardar_borrador(
     request: sch.GuardarBorradorRequest,
-    bd: Session = Depends(obtener_bd)
+    bd: Session = Depends(obtener_bd),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     RF08: Guarda el progreso parcial de una encuesta como borrador.
     El usuario puede continuar más tarde sin perder su trabajo.
     """
+    operacion = "guardar-borrador"
+    payload = request.model_dump(mode="json")
+    if idempotency_key:
+        previo = almacen_idempotencia.obtener(bd, operacion, idempotency_key, payload)
+        if previo is not None:
+            return previo
+
+    if buffer_borradores.habilitado:
+        return _guardar_borrador_buffer(request, bd, operacion, payload, idempotency_key)
+
     # 1. Verificar que la asignación existe
     asignacion = bd.query(mod.AsignacionUsuario).filter(
         mod.AsignacionUsuario.id == request.id_asignacion
@@ -350,14 +505,7 @@ def guardar_borrador(
     ).first()
     
     # Convertir respuestas a formato JSON serializable
-    respuestas_json = [
-        {
-            "id_pregunta": r.id_pregunta,
-            "valor_respuesta": r.valor_respuesta,
-            "id_opcion": r.id_opcion
-        }
-        for r in request.respuestas
-    ]
+    respuestas_json = BorradorServicio.a_json(request.respuestas)
     
     if borrador:
         # Actualizar borrador existente
@@ -371,13 +519,74 @@ def guardar_borrador(
         )
         bd.add(borrador)
     
-    bd.commit()
+    bd.flush()
     bd.refresh(borrador)
-    
-    return {
+    resultado = {
+        "mensaje": "Borrador guardado exitosamente",
+        "id_asignacion": request.id_asignacion,
+        "fecha_actualizacion": borrador.fecha_actualizacion.isoformat() if borrador.fecha_actualizacion else None
+    }
+
+    if idempotency_key:
+        huellas = almacen_idempotencia.registrar(bd, operacion, idempotency_key, payload, resultado)
+        try:
+            bd.commit()
+        except IntegrityError:
+            bd.rollback()
+            return almacen_idempotencia.obtener(bd, operacion, idempotency_key, payload) or resultado
+        almacen_idempotencia.confirmar(*huellas, resultado)
+    else:
+        bd.commit()
+
+    return resultado
+
+def _guardar_borrador_buffer(request, bd, operacion, payload, idempotency_key):
+    """
+    Variante write-behind de RF08: el borrador queda en el buffer del proceso y se
+    persiste en el próximo vaciado. La Idempotency-Key se recuerda solo en memoria.
+    """
+    if not buffer_borradores.contiene(request.id_asignacion):
+        existe = bd.query(mod.AsignacionUsuario.id).filter(
+            mod.AsignacionUsuario.id == request.id_asignacion
+        ).first()
+        if not existe:
+            raise HTTPException(status_code=404, detail="Asignación no encontrada")
+
+    fecha_actualizacion = buffer_borradores.guardar(
+        bd, request.id_asignacion, BorradorServicio.a_json(request.respuestas)
+    )
+    # Solo hay escrituras si el LRU desalojó entradas con cambios pendientes
+    bd.commit()
+
+    resultado = {
         "mensaje": "Borrador guardado exitosamente",
         "id_asignacion": request.id_asignacion,
-        "fecha_actualizacion": borrador.fecha_actualizacion
+        "fecha_actualizacion": fecha_actualizacion.isoformat()
+    }
+    if idempotency_key:
+        almacen_idempotencia.confirmar(*almacen_idempotencia.huellas(operacion, idempotency_key, payload), resultado)
+    return resultado
+
+@router.patch("/borrador/{id_asignacion}", status_code=200)
+def guardar_borrador_delta(
+    id_asignacion: int,
+    delta: sch.GuardarBorradorDeltaRequest,
+    bd: Session = Depends(obtener_bd)
+):
+    """
+    RF08 (autoguardado incremental): recibe solo las respuestas modificadas, indexadas
+    por id_pregunta, y las fusiona en el servidor con un único upsert.
+    """
+    if buffer_borradores.habilitado:
+        fecha_actualizacion = BorradorServicio.aplicar_delta_buffer(bd, id_asignacion, delta)
+    else:
+        fecha_actualizacion = BorradorServicio.aplicar_delta(bd, id_asignacion, delta)
+    bd.commit()
+
+    return {
+        "mensaje": "Borrador actualizado exitosamente",
+        "id_asignacion": id_asignacion,
+        "fecha_actualizacion": fecha_actualizacion.isoformat() if fecha_actualizacion else None
     }
 
 @router.get("/borrador/{id_asignacion}", response_model=sch.BorradorResponse)
@@ -388,12 +597,18 @@ def obtener_borrador(
     """
     RF08: Recupera un borrador guardado previamente para continuar la encuesta.
     """
-    borrador = bd.query(mod.RespuestaBorrador).filter(
-        mod.RespuestaBorrador.id_asignacion == id_asignacion
-    ).first()
-    
-    if not borrador:
-        raise HTTPException(status_code=404, detail="No hay borrador guardado para esta asignación")
+    # El buffer write-behind tiene la versión más reciente
+    en_buffer = buffer_borradores.obtener(id_asignacion) if buffer_borradores.habilitado else None
+    if en_buffer is not None:
+        respuestas_json, fecha_actualizacion = en_buffer
+    else:
+        borrador = bd.query(mod.RespuestaBorrador).filter(
+            mod.RespuestaBorrador.id_asignacion == id_asignacion
+        ).first()
+        
+        if not borrador:
+            raise HTTPException(status_code=404, detail="No hay borrador guardado para esta asignación")
+        respuestas_json, fecha_actualizacion = borrador.respuestas_json, borrador.fecha_actualizacion
     
     # Convertir JSON a objetos Pydantic
     respuestas = [
@@ -402,11 +617,11 @@ def obtener_borrador(
             valor_respuesta=r.get("valor_respuesta"),
             id_opcion=r.get("id_opcion")
         )
-        for r in borrador.respuestas_json
+        for r in respuestas_json
     ]
     
     return sch.BorradorResponse(
         id_asignacion=id_asignacion,
         respuestas=respuestas,
-        fecha_actualizacion=borrador.fecha_actualizacion
+        fecha_actualizacion=fecha_actualizacion
     )
\ No newline at end of file
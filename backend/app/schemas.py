@@ -211,6 +211,16 @@ class EncuestaSalida(EncuestaBase):
     cantidad_preguntas: Optional[int] = 0
     cantidad_respuestas: Optional[int] = 0
 
+# --- Contenido de la encuesta para el alumno (sin reglas ni auditoría) ---
+class EncuestaAlumnoSalida(BaseModel):
+    id: int
+    nombre: str
+    descripcion: Optional[str] = None
+    mensaje_final: Optional[str] = None
+    prioridad: PrioridadEncuesta
+    estado: Optional[EstadoEncuesta] = None
+    preguntas: List[PreguntaSalida] = []
+
 # =============================================================================
 # INTEGRACIÓN CON SAPIENTIA (Operación en Vivo)
 # =============================================================================
@@ -221,6 +231,75 @@ class RespuestaVerificacionEstado(BaseModel):
     id_encuesta_pendiente: Optional[int] = None
     datos_encuesta: Optional[EncuestaSalida] = None # Opcional: Enviar la encuesta ahí mismo
 
+# CU11 (lote): Verificar Estado de muchos alumnos en una sola llamada
+class VerificacionEstadoLoteRequest(BaseModel):
+    ids_alumnos: List[int]
+
+class ResultadoVerificacionAlumno(RespuestaVerificacionEstado):
+    id_alumno: int
+
+class RespuestaVerificacionEstadoLote(BaseModel):
+    resultados: List[ResultadoVerificacionAlumno]
+
+# Importación manual de asignaciones (carga masiva)
+class AsignacionImportar(BaseModel):
+    id_usuario: int
+    id_referencia_contexto: Optional[str] = None
+    metadatos_asignacion: Optional[Dict[str, Any]] = None
+
+class ResultadoImportacionAsignaciones(BaseModel):
+    filas_leidas: int
+    filas_insertadas: int
+    duplicadas: int
+    segundos: float
+    filas_por_segundo: Optional[float] = None
+
+# Publicación en segundo plano
+class TrabajoPublicacionSalida(BaseModel):
+    id: int
+    id_encuesta: int
+    estado: str
+    etapa: Optional[str] = None
+    procesados: int
+    insertadas: int
+    total_estimado: Optional[int] = None
+    porcentaje: Optional[float] = None
+    eta_segundos: Optional[float] = None
+    cancelacion_solicitada: bool
+    error: Optional[str] = None
+    fecha_creacion: Optional[datetime] = None
+    fecha_inicio: Optional[datetime] = None
+    fecha_actualizacion: Optional[datetime] = None
+    fecha_fin: Optional[datetime] = None
+
+# Simulación de publicación (solo conteos)
+class EstimacionEtapaPublicacion(BaseModel):
+    etapa: str
+    usuarios: int
+    contextos: int
+    candidatas: int
+    existentes: int
+    nuevas: int
+
+class EstimacionPublicacion(BaseModel):
+    id_encuesta: int
+    etapas: List[EstimacionEtapaPublicacion]
+    candidatas: int
+    existentes: int
+    nuevas: int
+    filas_por_segundo: Optional[float] = None           # Ritmo de publicaciones anteriores
+    duracion_estimada_segundos: Optional[float] = None
+
+# Nómina de alumnos de varias secciones, paginada por id_alumno
+class SeccionNomina(BaseModel):
+    cod_asignatura: str
+    seccion: str
+
+class NominaAlumnosRequest(BaseModel):
+    secciones: List[SeccionNomina]
+    tamano_pagina: int = 1000
+    token: Optional[str] = None  # siguiente_token de la página anterior
+
 # CU07: Recepción de Respuestas (Desde Sapientia)
 class RespuestaIndividual(BaseModel):
     id_pregunta: int
@@ -234,11 +313,27 @@ class EnvioRespuestasAlumno(BaseModel):
     metadatos_contexto: Dict[str, Any] # JSON para el OLAP (Facultad, Carrera, etc.)
     respuestas: List[RespuestaIndividual]
 
+# CU07 (asíncrono): Recibo de ingesta
+class ReciboIngesta(BaseModel):
+    id_recibo: str
+    estado: str
+
+class EstadoReciboIngesta(ReciboIngesta):
+    intentos: int = 0
+    error: Optional[str] = None
+    fecha_recepcion: Optional[datetime] = None
+    fecha_procesado: Optional[datetime] = None
+
 # Schemas para guardar borrador (RF08)
 class GuardarBorradorRequest(BaseModel):
     id_asignacion: int
     respuestas: List[RespuestaIndividual]
 
+# Guardado incremental de borrador: solo las respuestas modificadas
+class GuardarBorradorDeltaRequest(BaseModel):
+    respuestas: List[RespuestaIndividual] = []   # Reemplazan todas las respuestas de su id_pregunta
+    preguntas_eliminadas: List[int] = []         # id_pregunta cuyas respuestas se quitan del borrador
+
 class BorradorResponse(BaseModel):
     id_asignacion: int
     respuestas: List[RespuestaIndividual]
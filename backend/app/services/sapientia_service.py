@@ -1,27 +1,12 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from app.servicios.catalogo_academico import catalogo_academico
 
-def get_alumnos_cursando(bd: Session, filtros_json: list = None):
+def construir_filtros_alumnos(filtros_json: list = None):
     """
-    Retorna lista de diccionarios con info de alumnos, aplicando filtros JIT.
-    Join: Inscripciones -> Oferta Academica (para filtrar por Campus/Facultad/Departamento)
+    Traduce los filtros JIT de una regla a cláusulas WHERE sobre el alias 'o'
+    (sapientia.oferta_academica). Retorna (where_clauses, params).
     """
-    # Base query: Join Inscripciones con Oferta para obtener datos de contexto
-    # Simulamos nombre e email basándonos en el ID ya que tabla alumnos no existe.
-    sql = """
-        SELECT DISTINCT
-            i.id_alumno as id,
-            'Alumno ' || i.id_alumno as nombre, 
-            'alumno' || i.id_alumno || '@uc.edu.py' as email,
-            o.facultad,
-            o.departamento,
-            o.campus
-        FROM sapientia.inscripciones i
-        JOIN sapientia.oferta_academica o ON 
-            i.cod_asignatura = o.cod_asignatura AND 
-            i.seccion = o.seccion
-    """
-    
     where_clauses = []
     params = {}
     
@@ -56,15 +41,94 @@ def get_alumnos_cursando(bd: Session, filtros_json: list = None):
             elif campo == "asignatura":
                 where_clauses.append(f"LOWER(o.asignatura) IN :{param_name}")
 
+    return where_clauses, params
+
+def filtro_alumnos(rango_alumnos: tuple = None, particion: tuple = None, alumnos: list = None):
+    """
+    Cláusula sobre i.id_alumno para procesar solo parte de las inscripciones:
+    - rango_alumnos (desde, hasta]: tramos de la publicación en segundo plano (checkpoints).
+    - particion (indice, total): id_alumno % total = indice, para publicar en paralelo.
+    - alumnos: lista de id_alumno (republicación incremental).
+    Retorna (clausula | None, params).
+    """
+    clausulas = []
+    params = {}
+    if rango_alumnos:
+        clausulas.append("i.id_alumno > :alumno_desde AND i.id_alumno <= :alumno_hasta")
+        params.update(alumno_desde=rango_alumnos[0], alumno_hasta=rango_alumnos[1])
+    if particion:
+        indice, total = particion
+        clausulas.append("i.id_alumno % :particiones = :particion")
+        params.update(particion=indice, particiones=total)
+    if alumnos is not None:
+        # Ids leídos de la base (enteros): se escriben en la consulta
+        ids = ", ".join(str(int(a)) for a in alumnos) or "NULL"
+        clausulas.append(f"i.id_alumno IN ({ids})")
+    if not clausulas:
+        return None, params
+    return " AND ".join(clausulas), params
+
+def condiciones_alumnos(filtros_json: list = None, rango_alumnos: tuple = None, particion: tuple = None, predicado: tuple = None, alumnos: list = None):
+    """
+    Cláusulas WHERE (lista, params) para consultas inscripciones 'i' x oferta 'o'.
+    `predicado` (where, params) es el de CompiladorReglas y reemplaza a filtros_json.
+    """
+    if predicado is not None:
+        where, params = predicado
+        where_clauses = [where] if where else []
+        params = dict(params)
+    else:
+        where_clauses, params = construir_filtros_alumnos(filtros_json)
+    clausula_rango, params_rango = filtro_alumnos(rango_alumnos, particion, alumnos)
+    if clausula_rango:
+        where_clauses.append(clausula_rango)
+        params.update(params_rango)
+    return where_clauses, params
+
+def get_alumnos_cursando(bd: Session, filtros_json: list = None, rango_alumnos: tuple = None, particion: tuple = None, predicado: tuple = None, uno_por_alumno: bool = False, alumnos: list = None):
+    """
+    Retorna lista de diccionarios con info de alumnos, aplicando filtros JIT.
+    Join: Inscripciones -> Oferta Academica (para filtrar por Campus/Facultad/Departamento)
+    `uno_por_alumno`: un solo registro por alumno (el primer contexto académico),
+    deduplicado en la consulta en lugar de acumular IDs en memoria.
+    """
+    # Base query: Join Inscripciones con Oferta para obtener datos de contexto
+    # Simulamos nombre e email basándonos en el ID ya que tabla alumnos no existe.
+    distinct = "DISTINCT"
+    if uno_por_alumno and bd.bind.dialect.name == "postgresql":
+        distinct = "DISTINCT ON (i.id_alumno)"
+    sql = f"""
+        SELECT {distinct}
+            i.id_alumno as id,
+            'Alumno ' || i.id_alumno as nombre, 
+            'alumno' || i.id_alumno || '@uc.edu.py' as email,
+            o.facultad,
+            o.departamento,
+            o.campus
+        FROM sapientia.inscripciones i
+        JOIN sapientia.oferta_academica o ON 
+            i.cod_asignatura = o.cod_asignatura AND 
+            i.seccion = o.seccion
+    """
+    
+    where_clauses, params = condiciones_alumnos(filtros_json, rango_alumnos, particion, predicado, alumnos)
+
     if where_clauses:
         sql += " WHERE " + " AND ".join(where_clauses)
+    if uno_por_alumno:
+        # Filas ordenadas por alumno: basta comparar con el anterior (otros motores)
+        sql += " ORDER BY i.id_alumno, o.campus, o.facultad, o.departamento"
         
-    query = text(sql)
     query = text(sql)
     result = bd.execute(query, params) # No fetchall, iteramos sobre el cursor
     
     # QA Optimization: Generador
+    anterior = None
     for row in result:
+        if uno_por_alumno:
+            if row.id == anterior:
+                continue
+            anterior = row.id
         yield {
             "id": row.id, 
             "nombre": row.nombre, 
@@ -86,13 +150,14 @@ def get_docentes_activos(bd: Session):
         for row in result
     ]
 
-def get_contexto_evaluacion_docente(bd: Session):
+def get_contexto_evaluacion_docente(bd: Session, rango_alumnos: tuple = None, particion: tuple = None, predicado: tuple = None, alumnos: list = None):
     """
     Retorna todas las asignaciones VALIDAS para evaluación docente.
     Join: Inscripciones -> Oferta Academica
     Retorna tuplas (id_alumno, id_docente, contexto_str, metadata_dict)
     """
-    query = text("""
+    where_clauses, params = condiciones_alumnos(None, rango_alumnos, particion, predicado, alumnos)
+    query = text(f"""
         SELECT 
             i.id_alumno,
             o.id_docente,
@@ -100,27 +165,26 @@ def get_contexto_evaluacion_docente(bd: Session):
             o.asignatura as nombre_materia,
             o.seccion as codigo_seccion,
             o.docente as nombre_docente,
-            o.departamento,
-            'Alumno ' || i.id_alumno as nombre_alumno
+            o.departamento
         FROM sapientia.inscripciones i
         JOIN sapientia.oferta_academica o ON 
             i.cod_asignatura = o.cod_asignatura AND 
             i.seccion = o.seccion
-        WHERE o.id_docente IS NOT NULL
+        WHERE {" AND ".join(["o.id_docente IS NOT NULL"] + where_clauses)}
     """)
     
-    result = bd.execute(query)
+    result = bd.execute(query, params)
     
     # QA Optimization: Usar generador en lugar de cargar todo en lista
     for row in result:
-        # Contexto único: COD_MATERIA-SECCION-ID_DOCENTE
+        # Contexto único: COD_MATERIA-SECCION-ID_DOCENTE. Los metadatos no llevan
+        # datos del alumno: se comparten entre todos los alumnos del contexto
         id_contexto = f"{row.cod_materia}-{row.codigo_seccion}-{row.id_docente}"
         
         meta = {
             "materia": row.nombre_materia,
             "seccion": row.codigo_seccion,
             "docente": row.nombre_docente,
-            "alumno": row.nombre_alumno,
             "departamento": row.departamento
         }
         
@@ -134,12 +198,11 @@ def get_catalogos(bd: Session):
     """
     Retorna listas unicas de Facultades, Departamentos y Campus.
     """
-    facultades = bd.execute(text("SELECT DISTINCT facultad FROM sapientia.oferta_academica ORDER BY facultad")).fetchall()
-    departamentos = bd.execute(text("SELECT DISTINCT departamento FROM sapientia.oferta_academica ORDER BY departamento")).fetchall()
-    sedes = bd.execute(text("SELECT DISTINCT campus FROM sapientia.oferta_academica ORDER BY campus")).fetchall()
+    # Servido desde el snapshot en memoria de la oferta académica
+    snapshot = catalogo_academico.obtener(bd)
     
     return {
-        "facultades": [r[0] for r in facultades if r[0]],
-        "departamentos": [r[0] for r in departamentos if r[0]], 
-        "sedes": [r[0] for r in sedes if r[0]]
+        "facultades": snapshot.facultades(),
+        "departamentos": snapshot.departamentos(), 
+        "sedes": snapshot.campus()
     }
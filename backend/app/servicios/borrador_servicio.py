@@ -0,0 +1,109 @@
+import json
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from fastapi import HTTPException
+from app import modelos, schemas
+from app.servicios.buffer_borradores import buffer_borradores
+
+
+class BorradorServicio:
+    """
+    Servicio de dominio para borradores de respuestas (RF08).
+    """
+
+    @staticmethod
+    def a_json(respuestas: Iterable[schemas.RespuestaIndividual]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id_pregunta": r.id_pregunta,
+                "valor_respuesta": r.valor_respuesta,
+                "id_opcion": r.id_opcion
+            }
+            for r in respuestas
+        ]
+
+    @staticmethod
+    def fusionar(actuales: List[Dict[str, Any]], cambios: List[Dict[str, Any]], preguntas_eliminadas: Iterable[int] = ()) -> List[Dict[str, Any]]:
+        """
+        Reemplaza todas las respuestas de cada id_pregunta presente en `cambios`
+        (una pregunta de opción múltiple puede tener varias filas) y quita las de
+        `preguntas_eliminadas`. Mantiene el orden de las respuestas no tocadas.
+        """
+        tocadas = {c["id_pregunta"] for c in cambios} | set(preguntas_eliminadas)
+        return [r for r in (actuales or []) if r.get("id_pregunta") not in tocadas] + list(cambios)
+
+    @staticmethod
+    def aplicar_delta(db: Session, id_asignacion: int, delta: schemas.GuardarBorradorDeltaRequest) -> Optional[datetime]:
+        """
+        Fusiona en el servidor solo las respuestas modificadas. En PostgreSQL es una
+        única sentencia INSERT ... ON CONFLICT con merge jsonb; en otros motores
+        (SQLite en tests) se hace lectura-modificación-escritura por ORM.
+        No hace commit.
+        """
+        cambios = BorradorServicio.a_json(delta.respuestas)
+        ids_tocados = sorted({c["id_pregunta"] for c in cambios} | set(delta.preguntas_eliminadas))
+
+        if db.bind.dialect.name == "postgresql":
+            return BorradorServicio._aplicar_delta_postgres(db, id_asignacion, cambios, ids_tocados)
+
+        asignacion = db.query(modelos.AsignacionUsuario.id).filter(
+            modelos.AsignacionUsuario.id == id_asignacion
+        ).first()
+        if not asignacion:
+            raise HTTPException(status_code=404, detail="Asignación no encontrada")
+
+        borrador = db.query(modelos.RespuestaBorrador).filter(
+            modelos.RespuestaBorrador.id_asignacion == id_asignacion
+        ).first()
+        if borrador:
+            borrador.respuestas_json = BorradorServicio.fusionar(borrador.respuestas_json, cambios, delta.preguntas_eliminadas)
+        else:
+            borrador = modelos.RespuestaBorrador(id_asignacion=id_asignacion, respuestas_json=cambios)
+            db.add(borrador)
+        db.flush()
+        db.refresh(borrador)
+        return borrador.fecha_actualizacion
+
+    @staticmethod
+    def aplicar_delta_buffer(db: Session, id_asignacion: int, delta: schemas.GuardarBorradorDeltaRequest) -> datetime:
+        """Fusiona el delta sobre la versión del buffer write-behind (o la de la BD si no está)."""
+        en_buffer = buffer_borradores.obtener(id_asignacion)
+        if en_buffer is not None:
+            actuales = en_buffer[0]
+        else:
+            if not db.query(modelos.AsignacionUsuario.id).filter(modelos.AsignacionUsuario.id == id_asignacion).first():
+                raise HTTPException(status_code=404, detail="Asignación no encontrada")
+            actuales = db.query(modelos.RespuestaBorrador.respuestas_json).filter(
+                modelos.RespuestaBorrador.id_asignacion == id_asignacion
+            ).scalar() or []
+
+        fusion = BorradorServicio.fusionar(actuales, BorradorServicio.a_json(delta.respuestas), delta.preguntas_eliminadas)
+        return buffer_borradores.guardar(db, id_asignacion, fusion)
+
+    @staticmethod
+    def _aplicar_delta_postgres(db: Session, id_asignacion: int, cambios: List[Dict[str, Any]], ids_tocados: List[int]) -> Optional[datetime]:
+        # La FK a asignacion_usuario reemplaza la consulta previa de existencia
+        sql = text("""
+            INSERT INTO encuestas_oltp.respuesta_borrador AS b (id_asignacion, respuestas_json, fecha_actualizacion)
+            SELECT :id_asignacion, CAST(:cambios AS jsonb), now()
+            ON CONFLICT (id_asignacion) DO UPDATE SET
+                respuestas_json = COALESCE((
+                    SELECT jsonb_agg(elem ORDER BY ord)
+                    FROM jsonb_array_elements(b.respuestas_json) WITH ORDINALITY AS t(elem, ord)
+                    WHERE NOT ((elem->>'id_pregunta')::int = ANY(CAST(:ids_tocados AS int[])))
+                ), '[]'::jsonb) || EXCLUDED.respuestas_json,
+                fecha_actualizacion = now()
+            RETURNING b.fecha_actualizacion
+        """)
+        try:
+            with db.begin_nested():
+                return db.execute(sql, {
+                    "id_asignacion": id_asignacion,
+                    "cambios": json.dumps(cambios),
+                    "ids_tocados": ids_tocados
+                }).scalar_one()
+        except IntegrityError:
+            raise HTTPException(status_code=404, detail="Asignación no encontrada")
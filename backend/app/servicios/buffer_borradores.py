@@ -0,0 +1,271 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple, Callable
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import modelos
+from app.database import SesionLocal
+
+logger = logging.getLogger(__name__)
+
+BORRADOR_WRITE_BEHIND_HABILITADO = os.getenv("BORRADOR_WRITE_BEHIND_HABILITADO", "false").lower() == "true"
+BORRADOR_FLUSH_SEGUNDOS = float(os.getenv("BORRADOR_FLUSH_SEGUNDOS", "5"))
+BORRADOR_BUFFER_MAX_ENTRADAS = int(os.getenv("BORRADOR_BUFFER_MAX_ENTRADAS", "20000"))
+
+
+class _Entrada:
+    __slots__ = ("respuestas_json", "fecha_actualizacion", "version", "version_persistida")
+
+    def __init__(self, respuestas_json: List[Dict[str, Any]], fecha_actualizacion: datetime):
+        self.respuestas_json = respuestas_json
+        self.fecha_actualizacion = fecha_actualizacion
+        self.version = 1
+        self.version_persistida = 0
+
+    @property
+    def sucia(self) -> bool:
+        return self.version != self.version_persistida
+
+
+def upsert_borradores(db: Session, filas: List[Dict[str, Any]]):
+    """
+    Escribe varios borradores en un único INSERT ... ON CONFLICT (id_asignacion) DO UPDATE.
+    No pisa un borrador más nuevo escrito por otro proceso. No hace commit.
+    """
+    if not filas:
+        return
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    else:
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+
+    tabla = modelos.RespuestaBorrador.__table__
+    sentencia = insert_dialecto(tabla).values(filas)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=[tabla.c.id_asignacion],
+        set_={
+            "respuestas_json": sentencia.excluded.respuestas_json,
+            "fecha_actualizacion": sentencia.excluded.fecha_actualizacion,
+        },
+        where=tabla.c.fecha_actualizacion <= sentencia.excluded.fecha_actualizacion
+    )
+    db.execute(sentencia)
+
+
+class BufferBorradores:
+    """
+    Almacén write-behind de borradores (RF08): LRU en memoria de proceso
+    id_asignacion -> último borrador. Los autoguardados solo tocan memoria y se
+    persisten en respuesta_borrador con upserts por lotes cada N segundos, al
+    desalojar una entrada, al apagar el proceso y al finalizar la asignación (CU07).
+    """
+
+    def __init__(
+        self,
+        fabrica_sesiones: Callable[[], Session] = SesionLocal,
+        habilitado: bool = BORRADOR_WRITE_BEHIND_HABILITADO,
+        intervalo_segundos: float = BORRADOR_FLUSH_SEGUNDOS,
+        max_entradas: int = BORRADOR_BUFFER_MAX_ENTRADAS
+    ):
+        self._fabrica_sesiones = fabrica_sesiones
+        self.habilitado = habilitado
+        self.intervalo_segundos = intervalo_segundos
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[int, _Entrada]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        # Métricas
+        self.guardados = 0
+        self.vaciados = 0
+        self.filas_escritas = 0
+        self.desalojos = 0
+        self.descartadas = 0
+
+    def contiene(self, id_asignacion: int) -> bool:
+        with self._lock:
+            return id_asignacion in self._entradas
+
+    def obtener(self, id_asignacion: int) -> Optional[Tuple[List[Dict[str, Any]], datetime]]:
+        with self._lock:
+            entrada = self._entradas.get(id_asignacion)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(id_asignacion)
+            return entrada.respuestas_json, entrada.fecha_actualizacion
+
+    def guardar(self, db: Session, id_asignacion: int, respuestas_json: List[Dict[str, Any]]) -> datetime:
+        """
+        Reemplaza el borrador en memoria. Si el LRU se llena, las entradas sucias
+        desalojadas se escriben en la sesión `db` (se confirman con el request).
+        """
+        fecha = datetime.now(timezone.utc)
+        with self._lock:
+            entrada = self._entradas.get(id_asignacion)
+            if entrada is None:
+                self._entradas[id_asignacion] = _Entrada(respuestas_json, fecha)
+            else:
+                entrada.respuestas_json = respuestas_json
+                entrada.fecha_actualizacion = fecha
+                entrada.version += 1
+                self._entradas.move_to_end(id_asignacion)
+            self.guardados += 1
+            desalojadas = self._desalojar()
+        if desalojadas:
+            upsert_borradores(db, desalojadas)
+        return fecha
+
+    def finalizar(self, db: Session, id_asignacion: int):
+        """
+        La asignación se completó: si el borrador tenía cambios sin persistir se
+        escribe en la misma transacción del envío. La entrada sale del buffer
+        recién cuando esa transacción confirma; si se revierte (o el SAVEPOINT
+        del envío), el buffer sigue siendo la copia vigente.
+        """
+        with self._lock:
+            entrada = self._entradas.get(id_asignacion)
+            fila = self._fila(id_asignacion, entrada) if entrada is not None and entrada.sucia else None
+        if fila is not None:
+            upsert_borradores(db, [fila])
+        self._quitar_al_confirmar(db, id_asignacion)
+
+    def vaciar(self) -> int:
+        """
+        Persiste todas las entradas sucias en un único upsert. Si el lote falla
+        se reintenta fila por fila: la que sigue fallando (p. ej. su asignación
+        ya no existe) se descarta del buffer para no trabar los vaciados
+        siguientes. Retorna las filas escritas.
+        """
+        with self._lock:
+            pendientes = [
+                (self._fila(id_asignacion, entrada), entrada.version)
+                for id_asignacion, entrada in self._entradas.items()
+                if entrada.sucia
+            ]
+        if not pendientes:
+            return 0
+
+        fallidas = []
+        db = self._fabrica_sesiones()
+        try:
+            try:
+                with db.begin_nested():
+                    upsert_borradores(db, [fila for fila, _ in pendientes])
+            except Exception as e:
+                logger.warning(f"Falló el upsert por lotes de borradores ({len(pendientes)} filas), se reintenta fila por fila: {e}")
+                for fila, version in pendientes:
+                    try:
+                        with db.begin_nested():
+                            upsert_borradores(db, [fila])
+                    except Exception as e_fila:
+                        logger.error(f"Borrador de la asignación {fila['id_asignacion']} descartado del buffer: {e_fila}")
+                        fallidas.append((fila, version))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"Error vaciando buffer de borradores ({len(pendientes)} filas): {e}")
+            return 0
+        finally:
+            db.close()
+
+        with self._lock:
+            for fila, version in fallidas:
+                entrada = self._entradas.get(fila["id_asignacion"])
+                if entrada is not None and entrada.version == version:
+                    del self._entradas[fila["id_asignacion"]]
+                    self.descartadas += 1
+            ids_fallidas = {fila["id_asignacion"] for fila, _ in fallidas}
+            escritas = [p for p in pendientes if p[0]["id_asignacion"] not in ids_fallidas]
+            for fila, version in escritas:
+                entrada = self._entradas.get(fila["id_asignacion"])
+                if entrada is not None and entrada.version_persistida < version:
+                    entrada.version_persistida = version
+            self.vaciados += 1
+            self.filas_escritas += len(escritas)
+        return len(escritas)
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ciclo, name="buffer-borradores", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 10):
+        """Detiene el hilo y persiste lo pendiente (apagado ordenado)."""
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout)
+        self.vaciar()
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "habilitado": self.habilitado,
+                "entradas": len(self._entradas),
+                "sucias": sum(1 for e in self._entradas.values() if e.sucia),
+                "guardados": self.guardados,
+                "vaciados": self.vaciados,
+                "filas_escritas": self.filas_escritas,
+                "desalojos": self.desalojos,
+                "descartadas": self.descartadas,
+                "intervalo_segundos": self.intervalo_segundos,
+            }
+
+    def _ciclo(self):
+        while not self._detener.wait(self.intervalo_segundos):
+            self.vaciar()
+
+    def _quitar_al_confirmar(self, db: Session, id_asignacion: int):
+        """
+        Registra id_asignacion para salir del buffer cuando `db` confirme. Un
+        rollback del SAVEPOINT donde se finalizó (o de la transacción) lo olvida.
+        """
+        pendientes = db.info.get("borradores_finalizados")
+        if pendientes is None:
+            pendientes = db.info["borradores_finalizados"] = []
+
+            def al_confirmar(sesion):
+                ids = [i for i, _ in pendientes]
+                pendientes.clear()
+                with self._lock:
+                    for i in ids:
+                        self._entradas.pop(i, None)
+
+            def al_revertir(sesion, transaccion):
+                def dentro(t):
+                    while t is not None:
+                        if t is transaccion:
+                            return True
+                        t = t.parent
+                    return False
+                pendientes[:] = [(i, t) for i, t in pendientes if not dentro(t)]
+
+            event.listen(db, "after_commit", al_confirmar)
+            event.listen(db, "after_soft_rollback", al_revertir)
+        pendientes.append((id_asignacion, db.get_nested_transaction() or db.get_transaction()))
+
+    def _desalojar(self) -> List[Dict[str, Any]]:
+        # Llamar con el lock tomado
+        desalojadas = []
+        while len(self._entradas) > self.max_entradas:
+            id_asignacion, entrada = self._entradas.popitem(last=False)
+            self.desalojos += 1
+            if entrada.sucia:
+                desalojadas.append(self._fila(id_asignacion, entrada))
+        return desalojadas
+
+    @staticmethod
+    def _fila(id_asignacion: int, entrada: _Entrada) -> Dict[str, Any]:
+        return {
+            "id_asignacion": id_asignacion,
+            "respuestas_json": entrada.respuestas_json,
+            "fecha_actualizacion": entrada.fecha_actualizacion,
+        }
+
+
+# Instancia única por proceso (el hilo de vaciado se inicia desde main.py si está habilitado)
+buffer_borradores = BufferBorradores()
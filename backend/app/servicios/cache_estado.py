@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple
+
+# TTL del cache de bloqueo. Acota el tiempo que un worker puede responder con
+# un estado desactualizado si la invalidación ocurrió en otro proceso.
+CACHE_ESTADO_TTL_SEGUNDOS = float(os.getenv("CACHE_ESTADO_TTL_SEGUNDOS", "30"))
+CACHE_ESTADO_MAX_ENTRADAS = int(os.getenv("CACHE_ESTADO_MAX_ENTRADAS", "200000"))
+
+
+class CacheEstadoBloqueo:
+    """
+    Cache en memoria de proceso: alumno -> primera encuesta bloqueante pendiente.
+    Guarda también los resultados negativos (alumno habilitado), que son la
+    mayoría de los logins en Sapientia.
+    """
+
+    def __init__(self, ttl_segundos: float = CACHE_ESTADO_TTL_SEGUNDOS, max_entradas: int = CACHE_ESTADO_MAX_ENTRADAS):
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        # id_alumno -> (expira_en, id_encuesta | None, nombre_encuesta | None)
+        self._entradas: Dict[int, Tuple[float, Optional[int], Optional[str]]] = {}
+        self._lock = threading.Lock()
+        # Generación: evita que una lectura iniciada antes de una invalidación
+        # repueble el cache con un resultado viejo.
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    def obtener(self, id_alumno: int):
+        """
+        Retorna (encontrado, id_encuesta, nombre_encuesta).
+        encontrado=False significa que hay que consultar la BD.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(id_alumno)
+            if entrada is not None and entrada[0] > ahora:
+                self.aciertos += 1
+                return True, entrada[1], entrada[2]
+            if entrada is not None:
+                del self._entradas[id_alumno]
+            self.fallos += 1
+            return False, None, None
+
+    def generacion(self) -> int:
+        with self._lock:
+            return self._generacion
+
+    def guardar(self, id_alumno: int, id_encuesta: Optional[int], nombre_encuesta: Optional[str], generacion: Optional[int] = None):
+        with self._lock:
+            if generacion is not None and generacion != self._generacion:
+                return
+            if len(self._entradas) >= self.max_entradas and id_alumno not in self._entradas:
+                self._purgar_expiradas()
+                if len(self._entradas) >= self.max_entradas:
+                    # Sin política LRU: descartamos la entrada más antigua insertada
+                    self._entradas.pop(next(iter(self._entradas)))
+            self._entradas[id_alumno] = (time.monotonic() + self.ttl_segundos, id_encuesta, nombre_encuesta)
+
+    def invalidar(self, id_alumno: int):
+        """Invalida el estado de un alumno (ej: tras recibir sus respuestas)."""
+        with self._lock:
+            self._entradas.pop(id_alumno, None)
+            self._generacion += 1
+            self.invalidaciones += 1
+
+    def invalidar_todo(self):
+        """Invalida todo el cache (publicación/finalización/edición de encuestas)."""
+        with self._lock:
+            self._entradas.clear()
+            self._generacion += 1
+            self.invalidaciones += 1
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / total, 4) if total else 0.0,
+                "invalidaciones": self.invalidaciones,
+                "entradas": len(self._entradas),
+                "ttl_segundos": self.ttl_segundos,
+            }
+
+    def _purgar_expiradas(self):
+        ahora = time.monotonic()
+        expiradas = [k for k, v in self._entradas.items() if v[0] <= ahora]
+        for k in expiradas:
+            del self._entradas[k]
+
+
+# Instancia única por proceso
+cache_estado_bloqueo = CacheEstadoBloqueo()
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+from typing import Optional, Dict, Tuple
+from sqlalchemy.orm import Session, joinedload
+from app import modelos, schemas
+
+
+class CachePayloadEncuesta:
+    """
+    Cache en memoria del contenido de una encuesta (preguntas y opciones) ya
+    serializado a JSON para el alumno. Cada entrada está versionada por
+    (fecha_modificacion, estado) de la encuesta y lleva un ETag derivado del
+    hash del contenido.
+    """
+
+    def __init__(self):
+        # id_encuesta -> (version, etag, payload_json)
+        self._entradas: Dict[int, Tuple[tuple, str, bytes]] = {}
+        self._lock = threading.Lock()
+        self.reconstrucciones = 0
+
+    @staticmethod
+    def _version(fecha_modificacion, estado) -> tuple:
+        return (fecha_modificacion.isoformat() if fecha_modificacion else None, str(estado))
+
+    def obtener(self, db: Session, id_encuesta: int) -> Optional[Tuple[str, bytes]]:
+        """
+        Retorna (etag, payload_json) o None si la encuesta no existe o sigue en borrador.
+        Solo consulta la fila de la encuesta para validar la versión; el árbol
+        completo se carga únicamente cuando hay que reconstruir.
+        """
+        fila = db.query(
+            modelos.Encuesta.fecha_modificacion, modelos.Encuesta.estado
+        ).filter(modelos.Encuesta.id == id_encuesta).first()
+        if fila is None or fila.estado == modelos.EstadoEncuesta.borrador:
+            return None
+
+        version = self._version(fila.fecha_modificacion, fila.estado)
+        with self._lock:
+            entrada = self._entradas.get(id_encuesta)
+        if entrada is not None and entrada[0] == version:
+            return entrada[1], entrada[2]
+
+        return self._reconstruir(db, id_encuesta)
+
+    def _reconstruir(self, db: Session, id_encuesta: int) -> Optional[Tuple[str, bytes]]:
+        encuesta = (
+            db.query(modelos.Encuesta)
+            .options(joinedload(modelos.Encuesta.preguntas).joinedload(modelos.Pregunta.opciones))
+            .filter(modelos.Encuesta.id == id_encuesta)
+            .first()
+        )
+        if encuesta is None:
+            return None
+
+        preguntas = []
+        for p in sorted(encuesta.preguntas, key=lambda p: p.orden):
+            if not p.activo:
+                continue
+            pregunta = schemas.PreguntaSalida.model_validate(p)
+            pregunta.opciones.sort(key=lambda o: o.orden)
+            preguntas.append(pregunta)
+
+        payload = schemas.EncuestaAlumnoSalida(
+            id=encuesta.id,
+            nombre=encuesta.nombre,
+            descripcion=encuesta.descripcion,
+            mensaje_final=encuesta.mensaje_final,
+            prioridad=encuesta.prioridad,
+            estado=encuesta.estado,
+            preguntas=preguntas
+        )
+        payload_json = payload.model_dump_json().encode("utf-8")
+        etag = '"' + hashlib.sha256(payload_json).hexdigest()[:32] + '"'
+        version = self._version(encuesta.fecha_modificacion, encuesta.estado)
+
+        with self._lock:
+            self._entradas[id_encuesta] = (version, etag, payload_json)
+            self.reconstrucciones += 1
+        return etag, payload_json
+
+    def invalidar(self, id_encuesta: int):
+        with self._lock:
+            self._entradas.pop(id_encuesta, None)
+
+
+# Instancia única por proceso
+cache_payload_encuesta = CachePayloadEncuesta()
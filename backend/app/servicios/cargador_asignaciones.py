@@ -0,0 +1,205 @@
+import io
+import csv
+import json
+import time
+import logging
+from typing import Iterable, Iterator, Dict, Any, List
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app import modelos
+from app.servicios.contexto_asignacion import DiccionarioContextos, huella_metadatos
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS_CARGA = ("id_usuario", "id_encuesta", "id_referencia_contexto", "metadatos_asignacion")
+
+
+class _FlujoCSV(io.TextIOBase):
+    """Archivo de solo lectura que genera CSV a demanda: COPY consume las filas sin materializarlas."""
+
+    def __init__(self, filas: Iterator[Dict[str, Any]], contador: List[int]):
+        self._filas = filas
+        self._contador = contador
+        self._pendiente = ""
+        self._buffer = io.StringIO()
+        self._escritor = csv.writer(self._buffer, lineterminator="\n")
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._pendiente) < size:
+            fila = next(self._filas, None)
+            if fila is None:
+                break
+            self._escritor.writerow((
+                fila["id_usuario"],
+                fila["id_encuesta"],
+                fila.get("id_referencia_contexto"),
+                json.dumps(fila.get("metadatos_asignacion") or {}, ensure_ascii=False),
+            ))
+            self._contador[0] += 1
+            self._pendiente += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            salida, self._pendiente = self._pendiente, ""
+        else:
+            salida, self._pendiente = self._pendiente[:size], self._pendiente[size:]
+        return salida
+
+
+class CargadorAsignaciones:
+    """
+    Carga masiva de asignacion_usuario. En PostgreSQL las filas viajan por
+    COPY FROM STDIN a una tabla temporal y se fusionan con un único
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING (uq_usuario_encuesta_contexto).
+    Los metadatos de las filas con id_referencia_contexto se registran una vez por
+    referencia y contenido en contexto_asignacion y la asignación guarda id_contexto.
+    En otros motores las filas pasan por lotes a una tabla temporal y se
+    fusionan con un único INSERT ... SELECT con anti-join contra las existentes.
+    No hace commit.
+    """
+
+    @staticmethod
+    def cargar(db: Session, filas: Iterable[Dict[str, Any]], tamano_lote: int = 1000) -> Dict[str, Any]:
+        """
+        `filas`: dicts con id_usuario, id_encuesta, id_referencia_contexto y
+        metadatos_asignacion (puede ser un generador). Retorna métricas de la carga.
+        """
+        inicio = time.monotonic()
+        if db.bind.dialect.name == "postgresql":
+            leidas, insertadas = CargadorAsignaciones._cargar_copy(db, filas)
+        else:
+            leidas, insertadas = CargadorAsignaciones._cargar_por_lotes(db, filas, tamano_lote)
+
+        segundos = time.monotonic() - inicio
+        metricas = {
+            "filas_leidas": leidas,
+            "filas_insertadas": insertadas,
+            "duplicadas": leidas - insertadas,
+            "segundos": round(segundos, 3),
+            "filas_por_segundo": round(leidas / segundos, 1) if segundos > 0 else None,
+        }
+        logger.info(f"Carga de asignaciones: {metricas}")
+        return metricas
+
+    @staticmethod
+    def _cargar_copy(db: Session, filas: Iterable[Dict[str, Any]]):
+        db.execute(text("""
+            CREATE TEMP TABLE IF NOT EXISTS carga_asignacion (
+                id_usuario integer,
+                id_encuesta integer,
+                id_referencia_contexto varchar(255),
+                metadatos_asignacion jsonb
+            ) ON COMMIT DROP
+        """))
+        db.execute(text("TRUNCATE carga_asignacion"))
+
+        contador = [0]
+        cursor = db.connection().connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY carga_asignacion ({', '.join(COLUMNAS_CARGA)}) FROM STDIN WITH (FORMAT csv)",
+                _FlujoCSV(iter(filas), contador)
+            )
+        finally:
+            cursor.close()
+
+        insertadas = DiccionarioContextos.insertar_asignaciones(db, """
+            SELECT c.id_usuario, c.id_encuesta, c.id_referencia_contexto, c.metadatos_asignacion AS metadatos
+            FROM carga_asignacion c
+        """, {})
+        return contador[0], insertadas
+
+    @staticmethod
+    def _cargar_por_lotes(db: Session, filas: Iterable[Dict[str, Any]], tamano_lote: int):
+        # Las filas se acumulan por lotes en una tabla temporal (no en memoria) y se
+        # fusionan con un único INSERT ... SELECT que descarta, con anti-joins, las
+        # ya asignadas y las repetidas dentro de la carga (se conserva la primera).
+        db.execute(text("""
+            CREATE TEMP TABLE IF NOT EXISTS carga_asignacion_lotes (
+                orden integer NOT NULL,
+                id_usuario integer NOT NULL,
+                id_encuesta integer NOT NULL,
+                id_referencia_contexto varchar(255),
+                metadatos_asignacion text,
+                huella_metadatos varchar(32)
+            )
+        """))
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_carga_asignacion_lotes
+            ON carga_asignacion_lotes (id_usuario, id_encuesta, id_referencia_contexto)
+        """))
+        db.execute(text("DELETE FROM carga_asignacion_lotes"))
+
+        insertar_lote = text(f"""
+            INSERT INTO carga_asignacion_lotes (orden, {', '.join(COLUMNAS_CARGA)}, huella_metadatos)
+            VALUES (:orden, :id_usuario, :id_encuesta, :id_referencia_contexto, :metadatos_asignacion, :huella_metadatos)
+        """)
+        leidas = 0
+        lote: List[Dict[str, Any]] = []
+        for fila in filas:
+            metadatos = fila.get("metadatos_asignacion")
+            lote.append({
+                "orden": leidas,
+                "id_usuario": fila["id_usuario"],
+                "id_encuesta": fila["id_encuesta"],
+                "id_referencia_contexto": fila.get("id_referencia_contexto"),
+                "metadatos_asignacion": json.dumps(metadatos, ensure_ascii=False) if metadatos is not None else None,
+                "huella_metadatos": huella_metadatos(metadatos),
+            })
+            leidas += 1
+            if len(lote) >= tamano_lote:
+                db.execute(insertar_lote, lote)
+                lote = []
+        if lote:
+            db.execute(insertar_lote, lote)
+
+        # Contextos nuevos (uno por referencia y contenido) al diccionario
+        db.execute(text("""
+            INSERT INTO encuestas_oltp.contexto_asignacion (id_referencia_contexto, metadatos, huella_metadatos)
+            SELECT c.id_referencia_contexto, COALESCE(c.metadatos_asignacion, '{}'), c.huella_metadatos
+            FROM carga_asignacion_lotes c
+            WHERE c.id_referencia_contexto IS NOT NULL
+              AND NOT EXISTS (
+                SELECT 1 FROM encuestas_oltp.contexto_asignacion x
+                WHERE x.id_referencia_contexto = c.id_referencia_contexto
+                  AND x.huella_metadatos = c.huella_metadatos
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM carga_asignacion_lotes p
+                WHERE p.id_referencia_contexto = c.id_referencia_contexto
+                  AND p.huella_metadatos = c.huella_metadatos
+                  AND p.orden < c.orden
+            )
+        """))
+        resultado = db.execute(text("""
+            INSERT INTO encuestas_oltp.asignacion_usuario
+                (id_usuario, id_encuesta, id_referencia_contexto, id_contexto, metadatos_asignacion, estado)
+            SELECT
+                c.id_usuario, c.id_encuesta, c.id_referencia_contexto, x.id,
+                CASE WHEN x.id IS NULL THEN c.metadatos_asignacion END, :estado
+            FROM carga_asignacion_lotes c
+            LEFT JOIN encuestas_oltp.contexto_asignacion x ON
+                x.id_referencia_contexto = c.id_referencia_contexto AND
+                x.huella_metadatos = c.huella_metadatos
+            WHERE NOT EXISTS (
+                SELECT 1 FROM encuestas_oltp.asignacion_usuario a
+                WHERE a.id_usuario = c.id_usuario
+                  AND a.id_encuesta = c.id_encuesta
+                  AND a.id_referencia_contexto = c.id_referencia_contexto
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM carga_asignacion_lotes p
+                WHERE p.id_usuario = c.id_usuario
+                  AND p.id_encuesta = c.id_encuesta
+                  AND (p.id_referencia_contexto = c.id_referencia_contexto
+                       OR (p.id_referencia_contexto IS NULL AND c.id_referencia_contexto IS NULL))
+                  AND p.orden < c.orden
+            )
+            ORDER BY c.orden
+        """), {"estado": modelos.EstadoAsignacion.pendiente.name})
+        insertadas = resultado.rowcount or 0
+        db.execute(text("DELETE FROM carga_asignacion_lotes"))
+        return leidas, insertadas
@@ -0,0 +1,273 @@
+import os
+import re
+import sys
+import time
+import bisect
+import unicodedata
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se recarga la oferta académica desde Sapientia (0 = solo a demanda)
+CATALOGO_REFRESCO_SEGUNDOS = float(os.getenv("CATALOGO_REFRESCO_SEGUNDOS", "900"))
+# Combinaciones de filtros memorizadas por snapshot (LRU): los filtros llegan como
+# texto libre en la query string, sin tope cualquier cliente podría agrandarlo
+CATALOGO_MEMO_MAX_ENTRADAS = int(os.getenv("CATALOGO_MEMO_MAX_ENTRADAS", "4096"))
+
+# (cod_asignatura, asignatura, seccion)
+Asignatura = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+def _i(valor):
+    return sys.intern(valor) if isinstance(valor, str) else valor
+
+
+def _ordenar(valores) -> List[str]:
+    return sorted(v for v in valores if v)
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin acentos: 'Gómez' -> 'gomez'."""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto: str) -> List[str]:
+    return [t for t in re.split(r"[^0-9a-zñ]+", normalizar(texto)) if t]
+
+
+class IndicePrefijos:
+    """
+    Índice de autocompletado: lista ordenada de (token, posición) sobre la que se
+    busca por prefijo con bisect. Cada consulta exige que cada palabra escrita sea
+    prefijo de alguna palabra de la entrada.
+    """
+
+    def __init__(self, entradas: List[Tuple[str, str, Dict[str, Any], set]]):
+        # entradas: (texto a indexar, texto visible, resultado, ubicaciones (campus, facultad, departamento))
+        self._entradas = sorted(entradas, key=lambda e: normalizar(e[1]))
+        self._normalizadas = [normalizar(e[1]) for e in self._entradas]
+        tokens = []
+        for posicion, (indexado, _, _, _) in enumerate(self._entradas):
+            for token in set(tokenizar(indexado)):
+                tokens.append((_i(token), posicion))
+        tokens.sort()
+        self._tokens = [t for t, _ in tokens]
+        self._posiciones = [p for _, p in tokens]
+
+    def _coincidencias(self, prefijo: str) -> set:
+        desde = bisect.bisect_left(self._tokens, prefijo)
+        hasta = bisect.bisect_left(self._tokens, prefijo + "\uffff", desde)
+        return set(self._posiciones[desde:hasta])
+
+    def buscar(self, consulta: str, limite: int = 10, campus: Optional[str] = None, facultad: Optional[str] = None, departamento: Optional[str] = None) -> List[Dict[str, Any]]:
+        palabras = tokenizar(consulta)
+        if not palabras:
+            return []
+        # Empezamos por la palabra más larga: suele ser la más selectiva
+        palabras.sort(key=len, reverse=True)
+        candidatos = self._coincidencias(palabras[0])
+        for palabra in palabras[1:]:
+            if not candidatos:
+                break
+            candidatos &= self._coincidencias(palabra)
+
+        if campus or facultad or departamento:
+            candidatos = {
+                p for p in candidatos
+                if any(
+                    (not campus or c == campus) and (not facultad or f == facultad) and (not departamento or d == departamento)
+                    for c, f, d in self._entradas[p][3]
+                )
+            }
+
+        # Primero los que empiezan con lo escrito, luego orden alfabético
+        texto = " ".join(tokenizar(consulta))
+        orden = sorted(candidatos, key=lambda p: (not self._normalizadas[p].startswith(texto), p))
+        return [self._entradas[p][2] for p in orden[:limite]]
+
+
+class SnapshotCatalogo:
+    """
+    Árbol inmutable campus -> facultad -> departamento -> asignatura/sección -> docentes,
+    construido con una sola lectura de sapientia.oferta_academica. Los textos se
+    internan (cada nombre se guarda una vez) y cada combinación de filtros se
+    resuelve una sola vez por snapshot.
+    """
+
+    def __init__(self, filas):
+        self.arbol: Dict[Optional[str], Dict[Optional[str], Dict[Optional[str], Dict[Asignatura, set]]]] = {}
+        for campus, facultad, departamento, cod, nombre, seccion, docente in filas:
+            asignaturas = (
+                self.arbol
+                .setdefault(_i(campus), {})
+                .setdefault(_i(facultad), {})
+                .setdefault(_i(departamento), {})
+            )
+            asignaturas.setdefault((_i(cod), _i(nombre), _i(seccion)), set()).add(_i(docente))
+
+        huella = hashlib.sha1()
+        for fila in sorted(repr(f) for f in self._recorrer(None, None, None)):
+            huella.update(fila.encode("utf-8"))
+        self.version = huella.hexdigest()[:16]
+        self.fecha_carga = datetime.now(timezone.utc)
+        self._memo: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recorrer(self, campus, facultad, departamento):
+        """Genera (campus, facultad, departamento, asignatura, docentes) que cumplen los filtros."""
+        for c, facultades in self.arbol.items():
+            if campus and c != campus:
+                continue
+            for f, departamentos in facultades.items():
+                if facultad and f != facultad:
+                    continue
+                for d, asignaturas in departamentos.items():
+                    if departamento and d != departamento:
+                        continue
+                    for asignatura, docentes in asignaturas.items():
+                        yield c, f, d, asignatura, tuple(sorted(docentes, key=lambda x: (x is None, x or "")))
+
+    def _memorizar(self, clave: tuple, calcular):
+        with self._lock:
+            if clave in self._memo:
+                self._memo.move_to_end(clave)
+                return self._memo[clave]
+        valor = calcular()
+        with self._lock:
+            self._memo[clave] = valor
+            while len(self._memo) > CATALOGO_MEMO_MAX_ENTRADAS:
+                self._memo.popitem(last=False)
+        return valor
+
+    def campus(self) -> List[str]:
+        return self._memorizar(("campus",), lambda: _ordenar(self.arbol.keys()))
+
+    def facultades(self, campus: Optional[str] = None) -> List[str]:
+        return self._memorizar(("facultades", campus), lambda: _ordenar(
+            {f for c, facs in self.arbol.items() if not campus or c == campus for f in facs}
+        ))
+
+    def departamentos(self, campus: Optional[str] = None, facultad: Optional[str] = None) -> List[str]:
+        return self._memorizar(("departamentos", campus, facultad), lambda: _ordenar(
+            {d for _, _, d, _, _ in self._recorrer(campus, facultad, None)}
+        ))
+
+    def docentes(self, campus: Optional[str] = None, facultad: Optional[str] = None, departamento: Optional[str] = None) -> List[str]:
+        return self._memorizar(("docentes", campus, facultad, departamento), lambda: _ordenar(
+            {doc for _, _, _, _, docentes in self._recorrer(campus, facultad, departamento) for doc in docentes}
+        ))
+
+    def asignaturas(self, campus: Optional[str] = None, facultad: Optional[str] = None, departamento: Optional[str] = None, docente: Optional[str] = None) -> List[Dict[str, Any]]:
+        def calcular():
+            unicas = {
+                asignatura
+                for _, _, _, asignatura, docentes in self._recorrer(campus, facultad, departamento)
+                if not docente or docente in docentes
+            }
+            # Mismo orden que ORDER BY asignatura, seccion (NULL al final)
+            orden = sorted(unicas, key=lambda a: (a[1] is None, a[1] or "", a[2] is None, a[2] or ""))
+            return [{"codigo": a[0], "nombre": a[1], "seccion": a[2]} for a in orden]
+        return self._memorizar(("asignaturas", campus, facultad, departamento, docente), calcular)
+
+    def indice(self, tipo: str) -> IndicePrefijos:
+        """Índice de autocompletado de 'docente' o 'asignatura' (se construye en el primer uso)."""
+        def construir():
+            entradas: Dict[Any, list] = {}
+            for c, f, d, (cod, nombre, seccion), docentes in self._recorrer(None, None, None):
+                if tipo == "docente":
+                    for docente in docentes:
+                        if docente:
+                            entrada = entradas.setdefault(docente, [docente, docente, {"nombre": docente}, set()])
+                            entrada[3].add((c, f, d))
+                elif nombre:
+                    entrada = entradas.setdefault((cod, nombre), [f"{nombre} {cod or ''}", nombre, {"codigo": cod, "nombre": nombre, "secciones": []}, set()])
+                    entrada[3].add((c, f, d))
+                    if seccion and seccion not in entrada[2]["secciones"]:
+                        entrada[2]["secciones"].append(seccion)
+            for entrada in entradas.values():
+                if "secciones" in entrada[2]:
+                    entrada[2]["secciones"].sort()
+            return IndicePrefijos([tuple(e) for e in entradas.values()])
+        return self._memorizar(("indice", tipo), construir)
+
+    def asignaturas_etiquetas(self) -> List[str]:
+        """Formato "Nombre (Codigo)" usado por /catalogos/asignatura."""
+        return self._memorizar(("asignaturas_etiquetas",), lambda: sorted(
+            {f"{a['nombre']} ({a['codigo']})" for a in self.asignaturas()}
+        ))
+
+
+class CatalogoAcademico:
+    """
+    Mantiene el snapshot vigente del catálogo. Se recarga cuando vence
+    CATALOGO_REFRESCO_SEGUNDOS o a demanda; mientras un request recarga,
+    los demás siguen respondiendo con el snapshot anterior.
+    """
+
+    def __init__(self, refresco_segundos: float = CATALOGO_REFRESCO_SEGUNDOS):
+        self.refresco_segundos = refresco_segundos
+        self._snapshot: Optional[SnapshotCatalogo] = None
+        self._vence_en = 0.0
+        self._lock_carga = threading.Lock()
+        self.cargas = 0
+
+    def obtener(self, db: Session) -> SnapshotCatalogo:
+        snapshot = self._snapshot
+        if snapshot is not None and (self.refresco_segundos <= 0 or time.monotonic() < self._vence_en):
+            return snapshot
+        # Sin snapshot esperamos la carga; con snapshot vencido solo recarga uno
+        if not self._lock_carga.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            if self._snapshot is snapshot:
+                self._cargar(db)
+            return self._snapshot
+        finally:
+            self._lock_carga.release()
+
+    def refrescar(self, db: Session) -> SnapshotCatalogo:
+        with self._lock_carga:
+            self._cargar(db)
+            return self._snapshot
+
+    def invalidar(self):
+        self._vence_en = 0.0
+        if self.refresco_segundos <= 0:
+            self._snapshot = None
+
+    def metricas(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "cargado": snapshot is not None,
+            "version": snapshot.version if snapshot else None,
+            "fecha_carga": snapshot.fecha_carga.isoformat() if snapshot else None,
+            "cargas": self.cargas,
+            "refresco_segundos": self.refresco_segundos,
+        }
+
+    def _cargar(self, db: Session):
+        inicio = time.monotonic()
+        filas = db.execute(text("""
+            SELECT DISTINCT campus, facultad, departamento, cod_asignatura, asignatura, seccion, docente
+            FROM sapientia.oferta_academica
+        """)).fetchall()
+        nuevo = SnapshotCatalogo(filas)
+        # Sin cambios se conserva el snapshot anterior: su fecha_carga es el
+        # Last-Modified de los catálogos y su memo ya está caliente
+        if self._snapshot is None or self._snapshot.version != nuevo.version:
+            self._snapshot = nuevo
+        self._vence_en = time.monotonic() + self.refresco_segundos
+        self.cargas += 1
+        logger.info(f"Catálogo académico cargado: {len(filas)} filas en {time.monotonic() - inicio:.3f}s (versión {self._snapshot.version})")
+
+
+# Instancia única por proceso
+catalogo_academico = CatalogoAcademico()
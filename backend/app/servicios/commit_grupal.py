@@ -0,0 +1,166 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.database import SesionLocal
+
+logger = logging.getLogger(__name__)
+
+COMMIT_GRUPAL_HABILITADO = os.getenv("COMMIT_GRUPAL_HABILITADO", "false").lower() == "true"
+COMMIT_GRUPAL_VENTANA_MS = float(os.getenv("COMMIT_GRUPAL_VENTANA_MS", "5"))
+COMMIT_GRUPAL_MAX_LOTE = int(os.getenv("COMMIT_GRUPAL_MAX_LOTE", "100"))
+COMMIT_GRUPAL_TIMEOUT_SEGUNDOS = float(os.getenv("COMMIT_GRUPAL_TIMEOUT_SEGUNDOS", "30"))
+
+# Una operación recibe la sesión del lote, escribe sin hacer commit y retorna su resultado
+Operacion = Callable[[Session], Any]
+
+
+class CommitGrupal:
+    """
+    Agrupa las operaciones que llegan dentro de una ventana de pocos milisegundos
+    en una única transacción de BD con un solo commit (y un solo fsync).
+    Cada operación corre en un SAVEPOINT, así un error de validación solo afecta
+    a su request. Si falla el commit del lote, cada operación se reintenta con
+    su propio commit.
+    """
+
+    def __init__(
+        self,
+        fabrica_sesiones: Callable[[], Session],
+        ventana_ms: float = COMMIT_GRUPAL_VENTANA_MS,
+        max_lote: int = COMMIT_GRUPAL_MAX_LOTE
+    ):
+        self._fabrica_sesiones = fabrica_sesiones
+        self.ventana_segundos = ventana_ms / 1000.0
+        self.max_lote = max_lote
+        self._cola: "queue.Queue[Optional[Tuple[Operacion, Future, float]]]" = queue.Queue()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Métricas
+        self.lotes = 0
+        self.operaciones = 0
+        self.fallbacks = 0
+        self._espera_total_segundos = 0.0
+
+    @property
+    def activo(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        if self.activo:
+            return
+        self._hilo = threading.Thread(target=self._ciclo, name="commit-grupal", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 10):
+        """Procesa lo pendiente y detiene el hilo."""
+        if self.activo:
+            self._cola.put(None)
+            self._hilo.join(timeout)
+
+    def ejecutar(self, operacion: Operacion, timeout: float = COMMIT_GRUPAL_TIMEOUT_SEGUNDOS) -> Any:
+        """Encola la operación y bloquea hasta que su lote se confirma."""
+        futuro: Future = Future()
+        self._cola.put((operacion, futuro, time.monotonic()))
+        return futuro.result(timeout=timeout)
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "activo": self.activo,
+                "ventana_ms": self.ventana_segundos * 1000,
+                "max_lote": self.max_lote,
+                "lotes": self.lotes,
+                "operaciones": self.operaciones,
+                "tamano_promedio_lote": round(self.operaciones / self.lotes, 2) if self.lotes else 0.0,
+                "latencia_agregada_promedio_ms": round(self._espera_total_segundos * 1000 / self.operaciones, 3) if self.operaciones else 0.0,
+                "fallbacks": self.fallbacks,
+            }
+
+    def _ciclo(self):
+        detener = False
+        while not detener:
+            primero = self._cola.get()
+            if primero is None:
+                break
+            lote = [primero]
+            limite = time.monotonic() + self.ventana_segundos
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self._cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if item is None:
+                    detener = True
+                    break
+                lote.append(item)
+            self._procesar_lote(lote)
+
+        # Drenar lo que haya quedado encolado antes de la señal de parada
+        pendientes = []
+        while True:
+            try:
+                item = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                pendientes.append(item)
+        if pendientes:
+            self._procesar_lote(pendientes)
+
+    def _procesar_lote(self, lote: List[Tuple[Operacion, Future, float]]):
+        inicio = time.monotonic()
+        with self._lock:
+            self.lotes += 1
+            self.operaciones += len(lote)
+            self._espera_total_segundos += sum(inicio - encolado for _, _, encolado in lote)
+
+        resultados: List[Tuple[Future, bool, Any]] = []
+        db = self._fabrica_sesiones()
+        try:
+            for operacion, futuro, _ in lote:
+                try:
+                    with db.begin_nested():
+                        resultados.append((futuro, True, operacion(db)))
+                except Exception as e:
+                    resultados.append((futuro, False, e))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            db.close()
+            logger.warning(f"Commit grupal falló ({len(lote)} operaciones), reintentando una por una: {e}")
+            with self._lock:
+                self.fallbacks += 1
+            self._procesar_individual(lote)
+            return
+        db.close()
+
+        for futuro, exito, valor in resultados:
+            if exito:
+                futuro.set_result(valor)
+            else:
+                futuro.set_exception(valor)
+
+    def _procesar_individual(self, lote: List[Tuple[Operacion, Future, float]]):
+        for operacion, futuro, _ in lote:
+            db = self._fabrica_sesiones()
+            try:
+                resultado = operacion(db)
+                db.commit()
+                futuro.set_result(resultado)
+            except Exception as e:
+                db.rollback()
+                futuro.set_exception(e)
+            finally:
+                db.close()
+
+
+# Instancia única por proceso (se inicia desde main.py si está habilitado)
+commit_grupal = CommitGrupal(SesionLocal)
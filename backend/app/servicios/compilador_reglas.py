@@ -0,0 +1,189 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy.orm import Session
+from app import modelos
+from app.servicios.catalogo_academico import catalogo_academico, SnapshotCatalogo
+
+# Columna de sapientia.oferta_academica (alias 'o') para cada campo de filtros_json
+COLUMNAS_FILTRO = {
+    "sede": "campus",
+    "campus": "campus",
+    "facultad": "facultad",
+    "carrera": "departamento",
+    "departamento": "departamento",
+    "asignatura": "asignatura",
+}
+_MAX_COMPILADAS = 256
+
+
+class ReglasCompiladas:
+    """
+    Resultado de compilar todas las reglas de una encuesta. `where` es el
+    predicado sobre el alias 'o' (None = sin restricción) y `params` sus
+    parámetros; `alumnos`/`docentes` indican si alguna regla alcanza a ese público.
+    """
+
+    def __init__(self, where: Optional[str], params: Dict[str, Any], alumnos: bool, docentes: bool, version: str):
+        self.where = where
+        self.params = params
+        self.alumnos = alumnos
+        self.docentes = docentes
+        self.version = version
+
+    @property
+    def predicado(self) -> Tuple[Optional[str], Dict[str, Any]]:
+        # Copia de params: cada consulta agrega los suyos (id_encuesta, rangos...)
+        return self.where, dict(self.params)
+
+
+class CompiladorReglas:
+    """
+    Traduce todas las ReglaAsignacion de una encuesta a un único predicado
+    parametrizado: OR entre reglas y AND entre los filtros de cada regla. Los
+    valores de filtros_json (sin distinguir mayúsculas) se resuelven contra el
+    snapshot del catálogo a los valores exactos de la columna, así la consulta
+    compara `o.campus IN (...)` y puede usar índices en lugar de LOWER(o.campus).
+    Un valor que el snapshot todavía no conoce se compara con LOWER() para no
+    perder coincidencias. El resultado se cachea por (encuesta, contenido de las
+    reglas, versión del catálogo).
+
+    id_facultad/id_carrera/id_asignatura no se aplican: oferta_academica no
+    tiene identificadores numéricos con los que compararlos.
+    """
+
+    _cache: "OrderedDict[tuple, ReglasCompiladas]" = OrderedDict()
+    _valores: Dict[Tuple[str, str], Dict[str, List[str]]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def huella_reglas(encuesta: modelos.Encuesta) -> str:
+        contenido = [
+            (
+                r.publico_objetivo.value if r.publico_objetivo else None,
+                r.filtros_json, r.id_facultad, r.id_carrera, r.id_asignatura
+            )
+            for r in sorted(encuesta.reglas, key=lambda r: r.id or 0)
+        ]
+        return hashlib.sha1(json.dumps(contenido, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def compilar(db: Session, encuesta: modelos.Encuesta) -> ReglasCompiladas:
+        snapshot = catalogo_academico.obtener(db)
+        clave = (encuesta.id, CompiladorReglas.huella_reglas(encuesta), snapshot.version)
+        with CompiladorReglas._lock:
+            if clave in CompiladorReglas._cache:
+                CompiladorReglas._cache.move_to_end(clave)
+                return CompiladorReglas._cache[clave]
+
+        compiladas = CompiladorReglas._compilar(encuesta.reglas, snapshot, version=f"{clave[1]}-{clave[2]}")
+        with CompiladorReglas._lock:
+            CompiladorReglas._cache[clave] = compiladas
+            while len(CompiladorReglas._cache) > _MAX_COMPILADAS:
+                CompiladorReglas._cache.popitem(last=False)
+        return compiladas
+
+    @staticmethod
+    def invalidar():
+        with CompiladorReglas._lock:
+            CompiladorReglas._cache.clear()
+            CompiladorReglas._valores.clear()
+
+    @staticmethod
+    def _compilar(reglas: List[modelos.ReglaAsignacion], snapshot: SnapshotCatalogo, version: str) -> ReglasCompiladas:
+        publicos_alumnos = (modelos.PublicoObjetivo.alumnos, modelos.PublicoObjetivo.ambos)
+        publicos_docentes = (modelos.PublicoObjetivo.docentes, modelos.PublicoObjetivo.ambos)
+        params: Dict[str, Any] = {}
+        disyuncion = []
+        sin_restriccion = False
+
+        for n_regla, regla in enumerate(sorted(reglas, key=lambda r: r.id or 0)):
+            if regla.publico_objetivo not in publicos_alumnos:
+                continue
+            conjuncion = []
+            for n_filtro, filtro in enumerate(regla.filtros_json or []):
+                columna = COLUMNAS_FILTRO.get((filtro.get("campo") or "").lower())
+                valores = CompiladorReglas._valores_filtro(filtro)
+                if not columna or not valores:
+                    continue
+                conjuncion.append(CompiladorReglas._condicion(
+                    columna, valores, snapshot, params, prefijo=f"r{n_regla}_{n_filtro}"
+                ))
+            if not conjuncion:
+                # Una regla sin filtros alcanza a todos: el OR completo no restringe
+                sin_restriccion = True
+                continue
+            disyuncion.append("(" + " AND ".join(conjuncion) + ")")
+
+        where = None
+        if disyuncion and not sin_restriccion:
+            where = "(" + " OR ".join(disyuncion) + ")"
+        else:
+            params = {}
+        return ReglasCompiladas(
+            where=where,
+            params=params,
+            alumnos=any(r.publico_objetivo in publicos_alumnos for r in reglas),
+            docentes=any(r.publico_objetivo in publicos_docentes for r in reglas),
+            version=version
+        )
+
+    @staticmethod
+    def _valores_filtro(filtro: Dict[str, Any]) -> List[str]:
+        # Mismo criterio que sapientia_service.construir_filtros_alumnos: 'valores' (lista) o 'valor'
+        valores = filtro.get("valores")
+        if valores and isinstance(valores, list):
+            return sorted({v.lower() for v in valores if isinstance(v, str)})
+        if filtro.get("valor"):
+            return [str(filtro["valor"]).lower()]
+        return []
+
+    @staticmethod
+    def _condicion(columna: str, valores: List[str], snapshot: SnapshotCatalogo, params: Dict[str, Any], prefijo: str) -> str:
+        conocidos = CompiladorReglas._valores_columna(snapshot, columna)
+        exactos = sorted({original for v in valores for original in conocidos.get(v, [])})
+        desconocidos = [v for v in valores if v not in conocidos]
+
+        partes = []
+        if exactos:
+            nombres = []
+            for i, valor in enumerate(exactos):
+                params[f"{prefijo}_{i}"] = valor
+                nombres.append(f":{prefijo}_{i}")
+            partes.append(f"o.{columna} IN ({', '.join(nombres)})")
+        if desconocidos:
+            nombres = []
+            for i, valor in enumerate(desconocidos):
+                params[f"{prefijo}_l{i}"] = valor
+                nombres.append(f":{prefijo}_l{i}")
+            partes.append(f"LOWER(o.{columna}) IN ({', '.join(nombres)})")
+        return partes[0] if len(partes) == 1 else "(" + " OR ".join(partes) + ")"
+
+    @staticmethod
+    def _valores_columna(snapshot: SnapshotCatalogo, columna: str) -> Dict[str, List[str]]:
+        """valor en minúsculas -> valores exactos de la columna en el snapshot."""
+        clave = (snapshot.version, columna)
+        with CompiladorReglas._lock:
+            if clave in CompiladorReglas._valores:
+                return CompiladorReglas._valores[clave]
+
+        if columna == "campus":
+            valores = snapshot.campus()
+        elif columna == "facultad":
+            valores = snapshot.facultades()
+        elif columna == "departamento":
+            valores = snapshot.departamentos()
+        else:
+            valores = sorted({a["nombre"] for a in snapshot.asignaturas() if a["nombre"]})
+        mapa: Dict[str, List[str]] = {}
+        for valor in valores:
+            mapa.setdefault(valor.lower(), []).append(valor)
+
+        with CompiladorReglas._lock:
+            # Solo se guardan los mapas del snapshot vigente
+            for vieja in [k for k in CompiladorReglas._valores if k[0] != snapshot.version]:
+                del CompiladorReglas._valores[vieja]
+            CompiladorReglas._valores[clave] = mapa
+        return mapa
@@ -0,0 +1,90 @@
+import json
+import hashlib
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+
+
+def huella_metadatos(metadatos: Optional[dict]) -> str:
+    """
+    Huella de los metadatos para motores sin jsonb (SQLite en tests): md5 del
+    JSON con claves ordenadas. En PostgreSQL se calcula en SQL como
+    md5(metadatos::text), que ya es canónico para jsonb.
+    """
+    canonico = json.dumps(metadatos or {}, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.md5(canonico.encode("utf-8")).hexdigest()
+
+
+class DiccionarioContextos:
+    """
+    Escritura de contexto_asignacion: un JSON por (id_referencia_contexto,
+    huella de los metadatos) en lugar de uno por asignación y por transacción.
+    Una referencia que llega con otros metadatos obtiene su propia entrada.
+    Las asignaciones sin id_contexto (previas al diccionario, sin referencia o
+    que perdieron una carrera al registrar el contexto) conservan el JSON en
+    metadatos_asignacion, y sus transacciones lo copian en metadatos_contexto
+    como antes. La publicación paralela evita esa carrera registrando los
+    contextos compartidos con `registrar` antes de repartir las particiones.
+    """
+
+    @staticmethod
+    def registrar(db: Session, origen_sql: str, params: dict) -> int:
+        """
+        Solo PostgreSQL. `origen_sql` produce (id_referencia_contexto, metadatos
+        jsonb). Registra los contextos que faltan sin insertar asignaciones.
+        Retorna los contextos nuevos. No hace commit.
+        """
+        resultado = db.execute(text(f"""
+            INSERT INTO encuestas_oltp.contexto_asignacion (id_referencia_contexto, metadatos, huella_metadatos)
+            SELECT DISTINCT ON (s.id_referencia_contexto, md5(s.metadatos::text))
+                s.id_referencia_contexto, s.metadatos, md5(s.metadatos::text)
+            FROM ({origen_sql}) s
+            WHERE s.id_referencia_contexto IS NOT NULL
+            ORDER BY s.id_referencia_contexto, md5(s.metadatos::text)
+            ON CONFLICT (id_referencia_contexto, huella_metadatos) DO NOTHING
+        """), params)
+        return resultado.rowcount or 0
+
+    @staticmethod
+    def insertar_asignaciones(db: Session, origen_sql: str, params: dict) -> int:
+        """
+        Solo PostgreSQL. `origen_sql` produce (id_usuario, id_encuesta,
+        id_referencia_contexto, metadatos jsonb). En una única sentencia registra
+        los contextos nuevos (ON CONFLICT DO NOTHING) e inserta las asignaciones
+        con su id_contexto. Si otra transacción registró el contexto en paralelo y
+        todavía no es visible, la asignación guarda el JSON en metadatos_asignacion.
+        Retorna las asignaciones insertadas. No hace commit.
+        """
+        resultado = db.execute(text(f"""
+            WITH s AS (
+                {origen_sql}
+            ),
+            h AS (
+                SELECT s.*, md5(s.metadatos::text) AS huella FROM s
+            ),
+            nuevos AS (
+                INSERT INTO encuestas_oltp.contexto_asignacion (id_referencia_contexto, metadatos, huella_metadatos)
+                SELECT DISTINCT ON (h.id_referencia_contexto, h.huella) h.id_referencia_contexto, h.metadatos, h.huella
+                FROM h
+                WHERE h.id_referencia_contexto IS NOT NULL
+                ORDER BY h.id_referencia_contexto, h.huella
+                ON CONFLICT (id_referencia_contexto, huella_metadatos) DO NOTHING
+                RETURNING id, id_referencia_contexto, huella_metadatos
+            )
+            INSERT INTO encuestas_oltp.asignacion_usuario
+                (id_usuario, id_encuesta, id_referencia_contexto, id_contexto, metadatos_asignacion, estado, fecha_asignacion)
+            SELECT
+                h.id_usuario, h.id_encuesta, h.id_referencia_contexto,
+                COALESCE(n.id, x.id),
+                CASE WHEN COALESCE(n.id, x.id) IS NULL THEN h.metadatos END,
+                'pendiente', now()
+            FROM h
+            LEFT JOIN nuevos n ON
+                n.id_referencia_contexto = h.id_referencia_contexto AND
+                n.huella_metadatos = h.huella
+            LEFT JOIN encuestas_oltp.contexto_asignacion x ON
+                x.id_referencia_contexto = h.id_referencia_contexto AND
+                x.huella_metadatos = h.huella
+            ON CONFLICT (id_usuario, id_encuesta, id_referencia_contexto) DO NOTHING
+        """), params)
+        return resultado.rowcount or 0
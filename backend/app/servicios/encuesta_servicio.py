@@ -7,10 +7,24 @@ from datetime import datetime, timezone
 import logging
 import copy
 from app.services import sapientia_service
+from app.servicios.cache_estado import cache_estado_bloqueo
+from app.servicios.proyeccion_bloqueo import ProyeccionBloqueo
+from app.servicios.cache_payload_encuesta import cache_payload_encuesta
+from app.servicios.publicacion_sql import PublicacionSQL
+from app.servicios.cargador_asignaciones import CargadorAsignaciones
+from app.servicios.publicacion_paralela import PublicacionParalela
+from app.servicios.compilador_reglas import CompiladorReglas
+from app.servicios.registro_inscripciones import RegistroCambiosInscripciones
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
+ETAPA_EVALUACION_DOCENTE = "evaluacion_docente"
+ETAPA_ALUMNOS = "alumnos"
+ETAPA_DOCENTES = "docentes"
+# Etapas que recorren sapientia.inscripciones y se pueden partir por id_alumno
+ETAPAS_POR_ALUMNO = (ETAPA_EVALUACION_DOCENTE, ETAPA_ALUMNOS)
+
 class EncuestaServicio:
     """
     Servicio de dominio para la gestión del ciclo de vida de encuestas.
@@ -113,29 +127,39 @@ class EncuestaServicio:
         
         EncuestaServicio.validar_reglas(encuesta)
 
+        if db.query(modelos.TrabajoPublicacion.id).filter(
+            modelos.TrabajoPublicacion.id_encuesta == encuesta_id,
+            modelos.TrabajoPublicacion.estado.in_(["pendiente", "en_curso"])
+        ).first():
+            raise HTTPException(status_code=409, detail="La encuesta ya tiene una publicación en segundo plano en curso")
+
         try:
-            # Lógica de asignaciones según público
-            regla = encuesta.reglas[0]
-            
-            # --- EVALUACIÓN DOCENTE (JIT) ---
-            if encuesta.prioridad == modelos.PrioridadEncuesta.evaluacion_docente and regla.publico_objetivo == modelos.PublicoObjetivo.alumnos:
-                EncuestaServicio._procesar_evaluacion_docente(db, encuesta, batch_size_jit)
-            
-            # --- ENCUESTA GENERAL (ALUMNOS) ---
-            elif regla.publico_objetivo in [modelos.PublicoObjetivo.alumnos, modelos.PublicoObjetivo.ambos]:
-                EncuestaServicio._procesar_asignacion_alumnos(db, encuesta, batch_size_pub)
-                
-            # --- ENCUESTA GENERAL (DOCENTES) ---
-            if regla.publico_objetivo in [modelos.PublicoObjetivo.docentes, modelos.PublicoObjetivo.ambos]:
-                 # Si es evaluacion docente, no aplica a docentes (ya está el raise en admin original, pero validamos aqui)
-                 if encuesta.prioridad != modelos.PrioridadEncuesta.evaluacion_docente:
-                    EncuestaServicio._procesar_asignacion_docentes(db, encuesta)
-
-            # Actualizar Estado
-            encuesta.estado = modelos.EstadoEncuesta.en_curso
-            encuesta.usuario_modificacion = usuario_id
-            encuesta.fecha_publicacion = datetime.now(timezone.utc) # Opcional si agregamos campo
+            inicio = datetime.now(timezone.utc)
+            # Antes de leer inscripciones: los cambios posteriores los toma la republicación incremental
+            desde_cambios = RegistroCambiosInscripciones.limite(db)
+            insertadas = 0
+            # Serie y en una sola transacción: si algo falla no quedan asignaciones de
+            # una encuesta en BORRADOR. Las particiones paralelas (commit por partición)
+            # solo se usan en la publicación en segundo plano, que tiene checkpoints.
+            for etapa in EncuestaServicio.etapas_publicacion(encuesta):
+                insertadas += EncuestaServicio.procesar_etapa(db, encuesta, etapa, batch_size_jit if etapa == ETAPA_EVALUACION_DOCENTE else batch_size_pub)
+
+            EncuestaServicio.marcar_publicada(db, encuesta, usuario_id)
+            RegistroCambiosInscripciones.sembrar(db, encuesta, desde_cambios)
+            # Queda en el historial de publicaciones: alimenta el ritmo del estimador
+            db.add(modelos.TrabajoPublicacion(
+                id_encuesta=encuesta.id,
+                estado="completado",
+                procesados=0,
+                insertadas=insertadas,
+                cancelacion_solicitada=False,
+                id_usuario=usuario_id,
+                fecha_inicio=inicio,
+                fecha_fin=datetime.now(timezone.utc)
+            ))
             db.commit()
+            cache_estado_bloqueo.invalidar_todo()
+            cache_payload_encuesta.invalidar(encuesta.id)
             db.refresh(encuesta)
             return encuesta
 
@@ -144,111 +168,145 @@ class EncuestaServicio:
             logger.exception(f"Error publicando encuesta {encuesta_id}: {e}")
             raise HTTPException(status_code=500, detail="Error interno al publicar la encuesta")
 
+    @staticmethod
+    def etapas_publicacion(encuesta: modelos.Encuesta) -> list:
+        """
+        Etapas de asignación que corresponden a la encuesta, en orden. Las etapas de
+        alumnos admiten procesarse por tramos de id_alumno (ver procesar_etapa).
+        """
+        etapas = []
+        # Lógica de asignaciones según público: se consideran todas las reglas
+        publicos = {regla.publico_objetivo for regla in encuesta.reglas}
+
+        # --- EVALUACIÓN DOCENTE (JIT) ---
+        if encuesta.prioridad == modelos.PrioridadEncuesta.evaluacion_docente and modelos.PublicoObjetivo.alumnos in publicos:
+            etapas.append(ETAPA_EVALUACION_DOCENTE)
+
+        # --- ENCUESTA GENERAL (ALUMNOS) ---
+        elif publicos & {modelos.PublicoObjetivo.alumnos, modelos.PublicoObjetivo.ambos}:
+            etapas.append(ETAPA_ALUMNOS)
+
+        # --- ENCUESTA GENERAL (DOCENTES) ---
+        # Si es evaluacion docente, no aplica a docentes
+        if publicos & {modelos.PublicoObjetivo.docentes, modelos.PublicoObjetivo.ambos}:
+            if encuesta.prioridad != modelos.PrioridadEncuesta.evaluacion_docente:
+                etapas.append(ETAPA_DOCENTES)
+        return etapas
+
+    @staticmethod
+    def procesar_etapa(db: Session, encuesta: modelos.Encuesta, etapa: str, batch_size: int = 1000, rango_alumnos: tuple = None, particion: tuple = None, alumnos: list = None) -> int:
+        """
+        Genera las asignaciones de una etapa. `rango_alumnos` (desde, hasta],
+        `particion` (indice, total) y `alumnos` (lista de id_alumno) limitan las
+        etapas de alumnos a una parte de id_alumno (ver
+        sapientia_service.filtro_alumnos). Retorna las filas insertadas. No hace commit.
+        """
+        if etapa == ETAPA_EVALUACION_DOCENTE:
+            return EncuestaServicio._procesar_evaluacion_docente(db, encuesta, batch_size, rango_alumnos, particion, alumnos)
+        if etapa == ETAPA_ALUMNOS:
+            return EncuestaServicio._procesar_asignacion_alumnos(db, encuesta, batch_size, rango_alumnos, particion, alumnos)
+        return EncuestaServicio._procesar_asignacion_docentes(db, encuesta)
+
+    @staticmethod
+    def procesar_etapa_particionada(db: Session, encuesta: modelos.Encuesta, etapa: str, batch_size: int = 1000, rango_alumnos: tuple = None) -> int:
+        """
+        Como procesar_etapa, pero si PublicacionParalela está disponible reparte las
+        etapas de alumnos en particiones por id_alumno, cada una con su sesión y su
+        commit. Sin paralelismo no hace commit. Solo para PublicacionSegundoPlano:
+        los commits parciales necesitan sus checkpoints y reanudación.
+        """
+        if etapa not in ETAPAS_POR_ALUMNO or not PublicacionParalela.disponible(db):
+            return EncuestaServicio.procesar_etapa(db, encuesta, etapa, batch_size, rango_alumnos)
+
+        id_encuesta = encuesta.id
+        def procesar(sesion: Session, particion: tuple) -> int:
+            encuesta_particion = sesion.get(modelos.Encuesta, id_encuesta)
+            return EncuestaServicio.procesar_etapa(sesion, encuesta_particion, etapa, batch_size, rango_alumnos, particion)
+
+        preparar = None
+        if etapa == ETAPA_EVALUACION_DOCENTE:
+            # Un contexto (materia, sección, docente) cae en varias particiones: se
+            # registra una vez antes del reparto y cada partición solo lo referencia
+            def preparar(sesion: Session) -> int:
+                predicado = CompiladorReglas.compilar(sesion, sesion.get(modelos.Encuesta, id_encuesta)).predicado
+                return PublicacionSQL.registrar_contextos_evaluacion_docente(sesion, predicado, rango_alumnos)
+        return PublicacionParalela.ejecutar(procesar, preparar=preparar)
+
+    @staticmethod
+    def marcar_publicada(db: Session, encuesta: modelos.Encuesta, usuario_id: int):
+        """Pasa la encuesta a EN_CURSO y recalcula la proyección de bloqueos. No hace commit."""
+        encuesta.estado = modelos.EstadoEncuesta.en_curso
+        encuesta.usuario_modificacion = usuario_id
+        encuesta.fecha_publicacion = datetime.now(timezone.utc) # Opcional si agregamos campo
+        db.flush()
+        ProyeccionBloqueo.recalcular_encuesta(db, encuesta.id)
+
     # --- MÉTODOS PRIVADOS DE ASIGNACIÓN ---
+    # En PostgreSQL la publicación es un INSERT ... SELECT (PublicacionSQL). El camino
+    # Python genera las filas y las pasa a CargadorAsignaciones (COPY en PostgreSQL,
+    # lotes en otros motores). Ambos filtran alumnos con el predicado de todas las
+    # reglas de la encuesta (CompiladorReglas): una sola pasada aunque haya varias.
     
     @staticmethod
-    def _procesar_evaluacion_docente(db: Session, encuesta: modelos.Encuesta, batch_size: int):
-        batch_mappings = []
-        
-        for item in sapientia_service.get_contexto_evaluacion_docente(db):
-            batch_mappings.append({
+    def _procesar_evaluacion_docente(db: Session, encuesta: modelos.Encuesta, batch_size: int, rango_alumnos: tuple = None, particion: tuple = None, alumnos: list = None) -> int:
+        predicado = CompiladorReglas.compilar(db, encuesta).predicado
+        if PublicacionSQL.disponible(db):
+            creadas = PublicacionSQL.insertar_evaluacion_docente(db, encuesta.id, predicado, rango_alumnos, particion, alumnos)
+            logger.info(f"Encuesta {encuesta.id}: {creadas} asignaciones de evaluación docente (INSERT ... SELECT)")
+            return creadas
+
+        filas = (
+            {
                 "id_usuario": item['id_usuario'],
                 "id_encuesta": encuesta.id,
                 "id_referencia_contexto": item['id_referencia_contexto'],
-                "metadatos_asignacion": item['metadatos'],
-                "estado": modelos.EstadoAsignacion.pendiente,
-                "fecha_asignacion": datetime.now(timezone.utc)
-            })
-
-            if len(batch_mappings) >= batch_size:
-                EncuestaServicio._insertar_lote_seguro(db, encuesta.id, batch_mappings)
-                batch_mappings = []
-        
-        if batch_mappings:
-            EncuestaServicio._insertar_lote_seguro(db, encuesta.id, batch_mappings)
+                "metadatos_asignacion": item['metadatos']
+            }
+            for item in sapientia_service.get_contexto_evaluacion_docente(db, rango_alumnos, particion, predicado, alumnos)
+        )
+        return CargadorAsignaciones.cargar(db, filas, batch_size)["filas_insertadas"]
 
     @staticmethod
-    def _procesar_asignacion_alumnos(db: Session, encuesta: modelos.Encuesta, batch_size: int):
-        filtros = encuesta.reglas[0].filtros_json if encuesta.reglas else None
-        batch_mappings = []
-        used_ids = set() # Set local para dedup en memoria si el generador trae repetidos
-
-        for alu in sapientia_service.get_alumnos_cursando(db, filtros_json=filtros):
-            if alu['id'] in used_ids:
-                continue
-            used_ids.add(alu['id'])
-            
-            batch_mappings.append({
-                "id_usuario": alu['id'],
-                "id_encuesta": encuesta.id,
-                "id_referencia_contexto": f"GEN-ALU-{alu['id']}",
-                "metadatos_asignacion": {
-                    "nombre_alumno": alu['nombre'],
-                    "campus": alu['campus'],
-                    "facultad": alu['facultad'],
-                    "carrera": alu['carrera']
-                },
-                "estado": modelos.EstadoAsignacion.pendiente,
-                "fecha_asignacion": datetime.now(timezone.utc)
-            })
-
-            if len(batch_mappings) >= batch_size:
-                 # Check existencia contra DB antes de insertar
-                 # Optimización: Solo checkear si ya había asignaciones previas... pero asumimos idempotencia
-                 EncuestaServicio._insertar_lote_por_usuario(db, encuesta.id, batch_mappings)
-                 batch_mappings = []
-        
-        if batch_mappings:
-            EncuestaServicio._insertar_lote_por_usuario(db, encuesta.id, batch_mappings)
+    def _procesar_asignacion_alumnos(db: Session, encuesta: modelos.Encuesta, batch_size: int, rango_alumnos: tuple = None, particion: tuple = None, alumnos: list = None) -> int:
+        predicado = CompiladorReglas.compilar(db, encuesta).predicado
+        if PublicacionSQL.disponible(db):
+            creadas = PublicacionSQL.insertar_alumnos(db, encuesta.id, predicado, rango_alumnos, particion, alumnos)
+            logger.info(f"Encuesta {encuesta.id}: {creadas} asignaciones de alumnos (INSERT ... SELECT)")
+            return creadas
+
+        def filas():
+            # Deduplicación en la consulta (una fila por alumno): memoria constante
+            for alu in sapientia_service.get_alumnos_cursando(
+                db, rango_alumnos=rango_alumnos, particion=particion, predicado=predicado, uno_por_alumno=True, alumnos=alumnos
+            ):
+                yield {
+                    "id_usuario": alu['id'],
+                    "id_encuesta": encuesta.id,
+                    "id_referencia_contexto": f"GEN-ALU-{alu['id']}",
+                    "metadatos_asignacion": {
+                        "nombre_alumno": alu['nombre'],
+                        "campus": alu['campus'],
+                        "facultad": alu['facultad'],
+                        "carrera": alu['carrera']
+                    }
+                }
+
+        return CargadorAsignaciones.cargar(db, filas(), batch_size)["filas_insertadas"]
 
     @staticmethod
-    def _procesar_asignacion_docentes(db: Session, encuesta: modelos.Encuesta):
+    def _procesar_asignacion_docentes(db: Session, encuesta: modelos.Encuesta) -> int:
+        if PublicacionSQL.disponible(db):
+            return PublicacionSQL.insertar_docentes(db, encuesta.id)
+
         # Asumimos volumen bajo para docentes
         docentes = sapientia_service.get_docentes_activos(db)
-        mappings = []
-        for doc in docentes:
-             mappings.append({
+        filas = [
+            {
                 "id_usuario": doc['id'],
                 "id_encuesta": encuesta.id,
                 "id_referencia_contexto": f"GEN-DOC-{doc['id']}",
-                "metadatos_asignacion": {"nombre_docente": doc['nombre']},
-                "estado": modelos.EstadoAsignacion.pendiente,
-                "fecha_asignacion": datetime.now(timezone.utc)
-            })
-        
-        if mappings:
-            EncuestaServicio._insertar_lote_por_usuario(db, encuesta.id, mappings)
-
-    @staticmethod
-    def _insertar_lote_seguro(db: Session, encuesta_id: int, mappings: list):
-        """Inserta ignorando duplicados por id_referencia_contexto"""
-        if not mappings: return
-        
-        ctx_ids = [m['id_referencia_contexto'] for m in mappings]
-        existentes = db.query(modelos.AsignacionUsuario.id_referencia_contexto).filter(
-            modelos.AsignacionUsuario.id_encuesta == encuesta_id,
-            modelos.AsignacionUsuario.id_referencia_contexto.in_(ctx_ids)
-        ).all()
-        ctx_existentes = {e[0] for e in existentes}
-        
-        final_batch = [m for m in mappings if m['id_referencia_contexto'] not in ctx_existentes]
-        if final_batch:
-            db.bulk_insert_mappings(modelos.AsignacionUsuario, final_batch)
-            db.commit()
-
-    @staticmethod
-    def _insertar_lote_por_usuario(db: Session, encuesta_id: int, mappings: list):
-        """Inserta ignorando duplicados por id_usuario (para encuestas generales)"""
-        if not mappings: return
-        
-        u_ids = [m['id_usuario'] for m in mappings]
-        existentes = db.query(modelos.AsignacionUsuario.id_usuario).filter(
-            modelos.AsignacionUsuario.id_encuesta == encuesta_id,
-            modelos.AsignacionUsuario.id_usuario.in_(u_ids)
-        ).all()
-        id_existentes = {e[0] for e in existentes}
-        
-        final_batch = [m for m in mappings if m['id_usuario'] not in id_existentes]
-        if final_batch:
-            db.bulk_insert_mappings(modelos.AsignacionUsuario, final_batch)
-            db.commit()
+                "metadatos_asignacion": {"nombre_docente": doc['nombre']}
+            }
+            for doc in docentes
+        ]
+        return CargadorAsignaciones.cargar(db, filas)["filas_insertadas"]
@@ -0,0 +1,92 @@
+from typing import Dict, Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app import modelos
+from app.servicios.compilador_reglas import CompiladorReglas
+from app.servicios.publicacion_sql import PublicacionSQL
+from app.servicios.encuesta_servicio import (
+    EncuestaServicio, ETAPA_EVALUACION_DOCENTE, ETAPA_ALUMNOS, ETAPA_DOCENTES
+)
+
+# Publicaciones completadas que se promedian para estimar el ritmo
+HISTORIAL_RITMO = 20
+
+# Candidatos (id_usuario, id_referencia_contexto) por etapa: las mismas consultas
+# que usa la publicación (PublicacionSQL), en su variante portable para contar
+_CANDIDATOS = {
+    ETAPA_EVALUACION_DOCENTE: lambda predicado: PublicacionSQL.candidatos_evaluacion_docente(predicado, metadatos=False),
+    ETAPA_ALUMNOS: lambda predicado: PublicacionSQL.candidatos_alumnos(predicado, metadatos=False),
+    ETAPA_DOCENTES: lambda predicado: PublicacionSQL.candidatos_docentes(metadatos=False),
+}
+
+
+class EstimadorPublicacion:
+    """
+    Simulación de publicación (dry-run): cuenta, solo con COUNT, cuántas
+    asignaciones generaría cada etapa, cuántas ya existen y cuántas serían nuevas,
+    y estima la duración con el ritmo (filas insertadas por segundo) de las
+    últimas publicaciones completadas. No escribe nada.
+    """
+
+    @staticmethod
+    def estimar(db: Session, encuesta: modelos.Encuesta) -> Dict[str, Any]:
+        EncuestaServicio.validar_reglas(encuesta)
+        predicado = CompiladorReglas.compilar(db, encuesta).predicado
+
+        etapas = []
+        for etapa in EncuestaServicio.etapas_publicacion(encuesta):
+            etapas.append(EstimadorPublicacion._contar_etapa(db, encuesta.id, etapa, predicado))
+
+        nuevas = sum(e["nuevas"] for e in etapas)
+        ritmo = EstimadorPublicacion.ritmo_historico(db)
+        return {
+            "id_encuesta": encuesta.id,
+            "etapas": etapas,
+            "candidatas": sum(e["candidatas"] for e in etapas),
+            "existentes": sum(e["existentes"] for e in etapas),
+            "nuevas": nuevas,
+            "filas_por_segundo": ritmo,
+            "duracion_estimada_segundos": round(nuevas / ritmo, 1) if ritmo else None,
+        }
+
+    @staticmethod
+    def _contar_etapa(db: Session, id_encuesta: int, etapa: str, predicado: tuple) -> Dict[str, Any]:
+        candidatos, params = _CANDIDATOS[etapa](predicado)
+        params["id_encuesta"] = id_encuesta
+
+        fila = db.execute(text(f"""
+            SELECT
+                COUNT(*) AS candidatas,
+                COUNT(DISTINCT c.id_usuario) AS usuarios,
+                COUNT(DISTINCT c.id_referencia_contexto) AS contextos,
+                COALESCE(SUM(CASE WHEN EXISTS (
+                    SELECT 1 FROM encuestas_oltp.asignacion_usuario a
+                    WHERE a.id_encuesta = :id_encuesta
+                      AND a.id_usuario = c.id_usuario
+                      AND a.id_referencia_contexto = c.id_referencia_contexto
+                ) THEN 1 ELSE 0 END), 0) AS existentes
+            FROM ({candidatos}) c
+        """), params).first()
+        return {
+            "etapa": etapa,
+            "usuarios": fila.usuarios,
+            "contextos": fila.contextos,
+            "candidatas": fila.candidatas,
+            "existentes": fila.existentes,
+            "nuevas": fila.candidatas - fila.existentes,
+        }
+
+    @staticmethod
+    def ritmo_historico(db: Session) -> Optional[float]:
+        """Filas insertadas por segundo en las últimas publicaciones completadas (None sin historial)."""
+        T = modelos.TrabajoPublicacion
+        trabajos = db.query(T.insertadas, T.fecha_inicio, T.fecha_fin).filter(
+            T.estado == "completado",
+            T.insertadas > 0,
+            T.fecha_inicio.isnot(None),
+            T.fecha_fin.isnot(None)
+        ).order_by(T.id.desc()).limit(HISTORIAL_RITMO).all()
+
+        filas = sum(t.insertadas for t in trabajos)
+        segundos = sum(max((t.fecha_fin - t.fecha_inicio).total_seconds(), 0.001) for t in trabajos)
+        return round(filas / segundos, 1) if trabajos else None
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy import select, delete
+from fastapi import HTTPException
+from app import modelos
+
+IDEMPOTENCIA_TTL_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_TTL_SEGUNDOS", "86400"))
+IDEMPOTENCIA_MAX_MEMORIA = int(os.getenv("IDEMPOTENCIA_MAX_MEMORIA", "50000"))
+
+
+class ClaveIdempotenciaRepetida(Exception):
+    """La misma Idempotency-Key ya se registró en esta sesión (p. ej. dos envíos en un commit grupal)."""
+
+
+def _sha256(valor: str) -> str:
+    return hashlib.sha256(valor.encode("utf-8")).hexdigest()
+
+
+class AlmacenIdempotencia:
+    """
+    Deduplicación por Idempotency-Key con TTL.
+    Primer nivel: LRU en memoria de proceso (huella -> resultado).
+    Segundo nivel: tabla clave_idempotencia, escrita en la transacción de la operación.
+    Un reintento se responde con el resultado guardado, sin escrituras en la BD.
+    """
+
+    def __init__(self, ttl_segundos: int = IDEMPOTENCIA_TTL_SEGUNDOS, max_memoria: int = IDEMPOTENCIA_MAX_MEMORIA):
+        self.ttl_segundos = ttl_segundos
+        self.max_memoria = max_memoria
+        # huella -> (expira_en, huella_payload, resultado)
+        self._memoria: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.reintentos_atendidos = 0
+
+    @staticmethod
+    def huellas(operacion: str, clave: str, payload: Dict[str, Any]) -> Tuple[str, str]:
+        huella = _sha256(f"{operacion}:{clave}")
+        huella_payload = _sha256(json.dumps(payload, sort_keys=True, default=str))
+        return huella, huella_payload
+
+    @staticmethod
+    def _verificar_payload(huella_payload: str, huella_guardada: str):
+        if huella_payload != huella_guardada:
+            raise HTTPException(
+                status_code=422,
+                detail="La Idempotency-Key ya fue usada con un contenido distinto"
+            )
+
+    def obtener(self, db: Session, operacion: str, clave: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Retorna el resultado guardado para la clave, o None si es la primera vez."""
+        huella, huella_payload = self.huellas(operacion, clave, payload)
+
+        with self._lock:
+            entrada = self._memoria.get(huella)
+            if entrada is not None and entrada[0] <= time.monotonic():
+                del self._memoria[huella]
+                entrada = None
+            if entrada is not None:
+                self._memoria.move_to_end(huella)
+        if entrada is not None:
+            self._verificar_payload(huella_payload, entrada[1])
+            self.reintentos_atendidos += 1
+            return entrada[2]
+
+        fila = db.execute(
+            select(modelos.ClaveIdempotencia.huella_payload, modelos.ClaveIdempotencia.resultado, modelos.ClaveIdempotencia.fecha_creacion)
+            .where(modelos.ClaveIdempotencia.huella == huella)
+        ).first()
+        if fila is None or self._expirada(fila.fecha_creacion):
+            return None
+
+        self._verificar_payload(huella_payload, fila.huella_payload)
+        self._recordar(huella, huella_payload, fila.resultado)
+        self.reintentos_atendidos += 1
+        return fila.resultado
+
+    def registrar(self, db: Session, operacion: str, clave: str, payload: Dict[str, Any], resultado: Dict[str, Any]):
+        """
+        Agrega la clave a la transacción en curso (no hace commit). Si otro request con
+        la misma clave confirma antes, el commit del llamador falla por clave primaria;
+        si ya está en la misma sesión, lanza ClaveIdempotenciaRepetida.
+        """
+        huella, huella_payload = self.huellas(operacion, clave, payload)
+        if identity_key(modelos.ClaveIdempotencia, huella) in db.identity_map:
+            # Otro envío del mismo lote ya la registró: se resuelve como un reintento
+            raise ClaveIdempotenciaRepetida(huella)
+        db.execute(
+            delete(modelos.ClaveIdempotencia).where(
+                modelos.ClaveIdempotencia.huella == huella,
+                modelos.ClaveIdempotencia.fecha_creacion < self._limite_expiracion()
+            )
+        )
+        db.add(modelos.ClaveIdempotencia(
+            huella=huella,
+            operacion=operacion,
+            huella_payload=huella_payload,
+            resultado=resultado
+        ))
+        return huella, huella_payload
+
+    def confirmar(self, huella: str, huella_payload: str, resultado: Dict[str, Any]):
+        """Llamar después del commit para responder los reintentos desde memoria."""
+        self._recordar(huella, huella_payload, resultado)
+
+    def purgar_expiradas(self, db: Session, limite: int = 5000) -> int:
+        """Borra hasta `limite` claves vencidas. Retorna la cantidad borrada."""
+        huellas = select(modelos.ClaveIdempotencia.huella).where(
+            modelos.ClaveIdempotencia.fecha_creacion < self._limite_expiracion()
+        ).limit(limite).scalar_subquery()
+        resultado = db.execute(
+            delete(modelos.ClaveIdempotencia).where(modelos.ClaveIdempotencia.huella.in_(huellas))
+        )
+        return resultado.rowcount or 0
+
+    def _recordar(self, huella: str, huella_payload: str, resultado: Dict[str, Any]):
+        with self._lock:
+            self._memoria[huella] = (time.monotonic() + self.ttl_segundos, huella_payload, resultado)
+            self._memoria.move_to_end(huella)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def _limite_expiracion(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=self.ttl_segundos)
+
+    def _expirada(self, fecha_creacion: Optional[datetime]) -> bool:
+        if fecha_creacion is None:
+            return False
+        if fecha_creacion.tzinfo is None:
+            fecha_creacion = fecha_creacion.replace(tzinfo=timezone.utc)
+        return fecha_creacion < self._limite_expiracion()
+
+
+# Instancia única por proceso
+almacen_idempotencia = AlmacenIdempotencia()
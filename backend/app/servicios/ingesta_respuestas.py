@@ -0,0 +1,148 @@
+import os
+import uuid
+import logging
+import threading
+from typing import Optional, Dict, Any
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, func
+from fastapi import HTTPException
+from app import modelos, schemas
+from app.servicios.respuestas_servicio import RespuestasServicio
+from app.servicios.cache_estado import cache_estado_bloqueo
+
+logger = logging.getLogger(__name__)
+
+# Modo opcional: si está deshabilitado, el endpoint asíncrono responde 503
+INGESTA_ASINCRONA_HABILITADA = os.getenv("INGESTA_ASINCRONA_HABILITADA", "false").lower() == "true"
+INGESTA_TAMANO_LOTE = int(os.getenv("INGESTA_TAMANO_LOTE", "200"))
+INGESTA_INTERVALO_SEGUNDOS = float(os.getenv("INGESTA_INTERVALO_SEGUNDOS", "1"))
+INGESTA_MAX_INTENTOS = int(os.getenv("INGESTA_MAX_INTENTOS", "5"))
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_PROCESADO = "procesado"
+ESTADO_ERROR = "error"
+
+
+class IngestaRespuestas:
+    """
+    Ingesta asíncrona de respuestas (CU07): el envío se valida, se guarda en la
+    cola durable envio_respuestas_cola y se confirma con un recibo. El drenado
+    reutiliza RespuestasServicio, con un único commit por lote.
+    """
+
+    @staticmethod
+    def encolar(db: Session, envio: schemas.EnvioRespuestasAlumno) -> str:
+        id_recibo = str(uuid.uuid4())
+        db.add(modelos.EnvioRespuestasCola(
+            id_recibo=id_recibo,
+            payload=envio.model_dump(mode="json"),
+            estado=ESTADO_PENDIENTE,
+            intentos=0
+        ))
+        db.commit()
+        return id_recibo
+
+    @staticmethod
+    def estado_recibo(db: Session, id_recibo: str) -> Optional[Dict[str, Any]]:
+        item = db.query(modelos.EnvioRespuestasCola).filter(
+            modelos.EnvioRespuestasCola.id_recibo == id_recibo
+        ).first()
+        if not item:
+            return None
+        return {
+            "id_recibo": item.id_recibo,
+            "estado": item.estado,
+            "intentos": item.intentos,
+            "error": item.error,
+            "fecha_recepcion": item.fecha_recepcion,
+            "fecha_procesado": item.fecha_procesado
+        }
+
+    @staticmethod
+    def procesar_lote(db: Session, tamano_lote: int = INGESTA_TAMANO_LOTE) -> Dict[str, int]:
+        """
+        Drena hasta `tamano_lote` envíos pendientes en una sola transacción.
+        Cada envío corre en un SAVEPOINT: un envío inválido se marca como error
+        sin afectar al resto del lote.
+        """
+        consulta = (
+            select(modelos.EnvioRespuestasCola)
+            .where(modelos.EnvioRespuestasCola.estado == ESTADO_PENDIENTE)
+            .order_by(modelos.EnvioRespuestasCola.id)
+            .limit(tamano_lote)
+        )
+        if db.bind.dialect.name == "postgresql":
+            # Varios procesos pueden drenar la cola sin pisarse
+            consulta = consulta.with_for_update(skip_locked=True)
+        items = db.execute(consulta).scalars().all()
+
+        procesados = 0
+        errores = 0
+        usuarios = set()
+        for item in items:
+            item.intentos += 1
+            try:
+                envio = schemas.EnvioRespuestasAlumno.model_validate(item.payload)
+                with db.begin_nested():
+                    RespuestasServicio.validar_preguntas(db, envio)
+                    item.id_transaccion = RespuestasServicio.persistir_envio(db, envio)
+                item.estado = ESTADO_PROCESADO
+                item.error = None
+                item.fecha_procesado = func.now()
+                usuarios.add(envio.id_usuario)
+                procesados += 1
+            except HTTPException as e:
+                # Error de validación: no tiene sentido reintentar
+                item.estado = ESTADO_ERROR
+                item.error = str(e.detail)
+                errores += 1
+            except Exception as e:
+                logger.exception(f"Error procesando recibo {item.id_recibo}: {e}")
+                item.error = str(e)
+                if item.intentos >= INGESTA_MAX_INTENTOS:
+                    item.estado = ESTADO_ERROR
+                errores += 1
+
+        if items:
+            db.commit()
+            for id_usuario in usuarios:
+                cache_estado_bloqueo.invalidar(id_usuario)
+
+        return {"leidos": len(items), "procesados": procesados, "errores": errores}
+
+
+class TrabajadorIngesta:
+    """Hilo en segundo plano que drena la cola de ingesta periódicamente."""
+
+    def __init__(self, fabrica_sesiones, intervalo_segundos: float = INGESTA_INTERVALO_SEGUNDOS):
+        self._fabrica_sesiones = fabrica_sesiones
+        self._intervalo = intervalo_segundos
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ciclo, name="trabajador-ingesta", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 10):
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout)
+
+    def _ciclo(self):
+        while not self._detener.is_set():
+            leidos = 0
+            db = self._fabrica_sesiones()
+            try:
+                leidos = IngestaRespuestas.procesar_lote(db)["leidos"]
+            except Exception as e:
+                db.rollback()
+                logger.exception(f"Error en trabajador de ingesta: {e}")
+            finally:
+                db.close()
+            # Si el lote vino lleno seguimos drenando sin esperar
+            if leidos < INGESTA_TAMANO_LOTE:
+                self._detener.wait(self._intervalo)
@@ -0,0 +1,146 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, insert, delete
+from typing import Optional, List, Tuple, Dict, Any
+import os
+import logging
+from app import modelos
+
+logger = logging.getLogger(__name__)
+
+# Desactivada por defecto: antes de habilitarla hay que poblar la tabla con
+# POST /admin/tecnico/proyeccion-bloqueo/reconstruir
+USAR_PROYECCION_BLOQUEO = os.getenv("USAR_PROYECCION_BLOQUEO", "false").lower() == "true"
+
+
+class ProyeccionBloqueo:
+    """
+    Mantiene la tabla bloqueo_pendiente (alumno -> primera encuesta obligatoria pendiente)
+    para que CU11 sea una búsqueda por clave primaria.
+    Todas las operaciones son por conjunto y no hacen commit: participan de la
+    transacción del llamador.
+    """
+
+    @staticmethod
+    def condiciones_bloqueo():
+        """Condiciones que hacen bloqueante a una asignación (CU11)."""
+        return (
+            modelos.AsignacionUsuario.estado == modelos.EstadoAsignacion.pendiente,
+            modelos.Encuesta.activo == True,
+            modelos.Encuesta.estado == modelos.EstadoEncuesta.en_curso,
+            modelos.Encuesta.prioridad == modelos.PrioridadEncuesta.obligatoria
+        )
+
+    @staticmethod
+    def _select_bloqueos(filtro_usuarios=None):
+        """SELECT (id_usuario, id_encuesta, nombre) con la encuesta bloqueante de menor id por alumno."""
+        primera = (
+            select(
+                modelos.AsignacionUsuario.id_usuario.label("id_usuario"),
+                func.min(modelos.Encuesta.id).label("id_encuesta")
+            )
+            .join(modelos.Encuesta, modelos.Encuesta.id == modelos.AsignacionUsuario.id_encuesta)
+            .where(*ProyeccionBloqueo.condiciones_bloqueo())
+        )
+        if filtro_usuarios is not None:
+            primera = primera.where(modelos.AsignacionUsuario.id_usuario.in_(filtro_usuarios))
+        primera = primera.group_by(modelos.AsignacionUsuario.id_usuario).subquery()
+
+        return (
+            select(primera.c.id_usuario, primera.c.id_encuesta, modelos.Encuesta.nombre)
+            .join(modelos.Encuesta, modelos.Encuesta.id == primera.c.id_encuesta)
+        )
+
+    @staticmethod
+    def _recalcular(db: Session, filtro_usuarios):
+        db.execute(
+            delete(modelos.BloqueoPendiente)
+            .where(modelos.BloqueoPendiente.id_usuario.in_(filtro_usuarios))
+        )
+        db.execute(
+            insert(modelos.BloqueoPendiente).from_select(
+                ["id_usuario", "id_encuesta", "nombre_encuesta"],
+                ProyeccionBloqueo._select_bloqueos(filtro_usuarios)
+            )
+        )
+
+    @staticmethod
+    def recalcular_alumnos(db: Session, ids_usuarios: List[int]):
+        """Recalcula la proyección para alumnos puntuales (ej: tras recibir respuestas)."""
+        if not ids_usuarios:
+            return
+        ProyeccionBloqueo._recalcular(db, list(ids_usuarios))
+
+    @staticmethod
+    def recalcular_encuesta(db: Session, id_encuesta: int):
+        """
+        Recalcula la proyección de todos los alumnos asignados a una encuesta
+        (publicación, finalización o edición de prioridad/estado/nombre).
+        """
+        usuarios = (
+            select(modelos.AsignacionUsuario.id_usuario)
+            .where(modelos.AsignacionUsuario.id_encuesta == id_encuesta)
+            .scalar_subquery()
+        )
+        ProyeccionBloqueo._recalcular(db, usuarios)
+
+    @staticmethod
+    def reconstruir(db: Session) -> int:
+        """Reconstruye la proyección completa. Retorna la cantidad de alumnos bloqueados."""
+        db.execute(delete(modelos.BloqueoPendiente))
+        db.execute(
+            insert(modelos.BloqueoPendiente).from_select(
+                ["id_usuario", "id_encuesta", "nombre_encuesta"],
+                ProyeccionBloqueo._select_bloqueos()
+            )
+        )
+        return db.query(func.count(modelos.BloqueoPendiente.id_usuario)).scalar()
+
+    @staticmethod
+    def consultar(db: Session, id_usuario: int) -> Tuple[Optional[int], Optional[str]]:
+        """Búsqueda por clave primaria. Retorna (id_encuesta, nombre) o (None, None)."""
+        fila = db.get(modelos.BloqueoPendiente, id_usuario)
+        if fila is None:
+            return None, None
+        return fila.id_encuesta, fila.nombre_encuesta
+
+    @staticmethod
+    def consultar_lote(db: Session, ids_usuarios: List[int]) -> Dict[int, Tuple[int, str]]:
+        filas = db.query(
+            modelos.BloqueoPendiente.id_usuario,
+            modelos.BloqueoPendiente.id_encuesta,
+            modelos.BloqueoPendiente.nombre_encuesta
+        ).filter(modelos.BloqueoPendiente.id_usuario.in_(ids_usuarios)).all()
+        return {f[0]: (f[1], f[2]) for f in filas}
+
+    @staticmethod
+    def verificar_consistencia(db: Session, muestra_max: int = 50) -> Dict[str, Any]:
+        """
+        Compara la proyección contra la consulta original sobre asignacion_usuario.
+        Retorna cantidades de diferencias y una muestra de alumnos afectados.
+        """
+        esperado = {f[0]: f[1] for f in db.execute(ProyeccionBloqueo._select_bloqueos()).all()}
+        actual = {
+            f[0]: f[1] for f in db.query(
+                modelos.BloqueoPendiente.id_usuario, modelos.BloqueoPendiente.id_encuesta
+            ).all()
+        }
+
+        faltantes = [u for u in esperado if u not in actual]
+        sobrantes = [u for u in actual if u not in esperado]
+        distintos = [u for u in esperado if u in actual and esperado[u] != actual[u]]
+
+        consistente = not (faltantes or sobrantes or distintos)
+        if not consistente:
+            logger.warning(
+                f"Proyección de bloqueo inconsistente: {len(faltantes)} faltantes, "
+                f"{len(sobrantes)} sobrantes, {len(distintos)} distintos"
+            )
+        return {
+            "consistente": consistente,
+            "alumnos_bloqueados": len(esperado),
+            "filas_proyeccion": len(actual),
+            "faltantes": len(faltantes),
+            "sobrantes": len(sobrantes),
+            "distintos": len(distintos),
+            "muestra": sorted(faltantes + sobrantes + distintos)[:muestra_max]
+        }
@@ -0,0 +1,80 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from sqlalchemy.orm import Session
+from app.database import SesionLocal
+
+logger = logging.getLogger(__name__)
+
+# Hilos que publican a la vez (1 = sin paralelismo). Cada uno usa su propia conexión.
+PUBLICACION_PARALELA_WORKERS = int(os.getenv("PUBLICACION_PARALELA_WORKERS", "1"))
+# Más particiones que hilos: una partición lenta no deja a los demás hilos ociosos
+PARTICIONES_POR_WORKER = 4
+
+
+class PublicacionParalela:
+    """
+    Reparte la generación de asignaciones en particiones por id_alumno
+    (id_alumno % total = indice) y las procesa en un pool de hilos, cada
+    partición con su sesión y su commit. Las particiones no comparten alumnos y
+    la inserción es idempotente (uq_usuario_encuesta_contexto): reintentar una
+    partición fallida no duplica filas. El trabajo pesado corre en PostgreSQL
+    (INSERT ... SELECT o COPY), por eso alcanzan hilos en lugar de procesos.
+    """
+
+    @staticmethod
+    def disponible(db: Session, workers: int = None) -> bool:
+        workers = PUBLICACION_PARALELA_WORKERS if workers is None else workers
+        # SQLite (tests) no admite escrituras concurrentes desde varias conexiones
+        return workers > 1 and db.bind.dialect.name != "sqlite"
+
+    @staticmethod
+    def ejecutar(
+        procesar: Callable[[Session, tuple], int],
+        workers: int = None,
+        fabrica_sesiones=SesionLocal,
+        preparar: Optional[Callable[[Session], Any]] = None
+    ) -> int:
+        """
+        Llama a `procesar(sesion, (indice, total))` para cada partición y confirma
+        cada una por separado. Retorna la suma de filas insertadas. Si alguna
+        partición falla, la excepción se propaga cuando terminan las demás.
+        `preparar(sesion)` corre y se confirma antes del reparto: escribe lo que
+        comparten las particiones (p. ej. contextos de asignación), que si no
+        competirían por la misma fila.
+        """
+        workers = PUBLICACION_PARALELA_WORKERS if workers is None else workers
+        total = workers * PARTICIONES_POR_WORKER
+        inicio = time.monotonic()
+
+        if preparar is not None:
+            db = fabrica_sesiones()
+            try:
+                preparar(db)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+        def procesar_particion(indice: int) -> int:
+            db = fabrica_sesiones()
+            try:
+                insertadas = procesar(db, (indice, total))
+                db.commit()
+                return insertadas
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="publicacion-particion") as pool:
+            futuros = [pool.submit(procesar_particion, indice) for indice in range(total)]
+            insertadas = sum(f.result() for f in futuros)
+
+        logger.info(f"Publicación paralela: {insertadas} asignaciones en {total} particiones con {workers} hilos ({time.monotonic() - inicio:.2f}s)")
+        return insertadas
@@ -0,0 +1,382 @@
+import os
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, or_, text
+from fastapi import HTTPException
+from app import modelos
+from app.database import SesionLocal
+from app.servicios.encuesta_servicio import EncuestaServicio, ETAPAS_POR_ALUMNO, ETAPA_DOCENTES
+from app.servicios.cache_estado import cache_estado_bloqueo
+from app.servicios.cache_payload_encuesta import cache_payload_encuesta
+from app.servicios.registro_inscripciones import RegistroCambiosInscripciones
+
+logger = logging.getLogger(__name__)
+
+# Alumnos (id_alumno distintos) por tramo: cada tramo es un commit con su checkpoint
+PUBLICACION_TRAMO_ALUMNOS = int(os.getenv("PUBLICACION_TRAMO_ALUMNOS", "2000"))
+# Sin latido durante este tiempo, otro proceso puede reanudar el trabajo
+PUBLICACION_LEASE_SEGUNDOS = float(os.getenv("PUBLICACION_LEASE_SEGUNDOS", "120"))
+BATCH_SIZE_PUBLICACION = int(os.getenv("BATCH_SIZE_PUBLICACION", "1000"))
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_EN_CURSO = "en_curso"
+ESTADO_COMPLETADO = "completado"
+ESTADO_ERROR = "error"
+ESTADO_CANCELADO = "cancelado"
+ESTADOS_ACTIVOS = (ESTADO_PENDIENTE, ESTADO_EN_CURSO)
+
+# Etapa final: asignaciones listas, falta pasar la encuesta a EN_CURSO
+ETAPA_FINALIZAR = "finalizar"
+# Límite inferior del primer tramo (id_alumno es INTEGER)
+ALUMNO_ID_MINIMO = -2 ** 31
+
+
+def _utc(fecha: Optional[datetime]) -> Optional[datetime]:
+    # SQLite devuelve fechas sin zona horaria
+    if fecha is not None and fecha.tzinfo is None:
+        return fecha.replace(tzinfo=timezone.utc)
+    return fecha
+
+
+class PublicacionSegundoPlano:
+    """
+    Publicación de encuestas como trabajo en segundo plano (trabajo_publicacion).
+    Las etapas de alumnos se recorren en tramos de id_alumno; cada tramo inserta
+    sus asignaciones y avanza el checkpoint en el mismo commit. La inserción es
+    idempotente (uq_usuario_encuesta_contexto), así que repetir el último tramo
+    tras una caída no duplica filas. Un trabajo lo ejecuta un solo proceso a la
+    vez: el que lo reclama y mantiene el latido (fecha_actualizacion).
+    """
+
+    def __init__(
+        self,
+        fabrica_sesiones=SesionLocal,
+        tramo_alumnos: int = PUBLICACION_TRAMO_ALUMNOS,
+        lease_segundos: float = PUBLICACION_LEASE_SEGUNDOS,
+        tamano_lote: int = BATCH_SIZE_PUBLICACION
+    ):
+        self._fabrica_sesiones = fabrica_sesiones
+        self.tramo_alumnos = tramo_alumnos
+        self.lease_segundos = lease_segundos
+        self.tamano_lote = tamano_lote
+        self._propietario = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._hilos: Dict[int, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+
+    # --- API usada por los endpoints ---
+
+    @staticmethod
+    def trabajo_activo(db: Session, id_encuesta: int) -> Optional[modelos.TrabajoPublicacion]:
+        return db.query(modelos.TrabajoPublicacion).filter(
+            modelos.TrabajoPublicacion.id_encuesta == id_encuesta,
+            modelos.TrabajoPublicacion.estado.in_(ESTADOS_ACTIVOS)
+        ).first()
+
+    def crear(self, db: Session, encuesta_id: int, usuario_id: int) -> modelos.TrabajoPublicacion:
+        """Valida la encuesta y registra el trabajo. No lo lanza (ver lanzar)."""
+        encuesta = db.query(modelos.Encuesta).filter(modelos.Encuesta.id == encuesta_id).first()
+        if not encuesta:
+            raise HTTPException(status_code=404, detail="Encuesta no encontrada")
+        if encuesta.estado != modelos.EstadoEncuesta.borrador:
+            raise HTTPException(status_code=400, detail="Solo se pueden publicar encuestas en estado BORRADOR")
+        EncuestaServicio.validar_reglas(encuesta)
+        if self.trabajo_activo(db, encuesta_id):
+            raise HTTPException(status_code=409, detail="La encuesta ya tiene una publicación en curso")
+
+        # Antes de que el trabajo lea inscripciones: los cambios posteriores los
+        # toma la republicación incremental una vez publicada
+        RegistroCambiosInscripciones.sembrar(db, encuesta, RegistroCambiosInscripciones.limite(db))
+        trabajo = modelos.TrabajoPublicacion(
+            id_encuesta=encuesta_id,
+            estado=ESTADO_PENDIENTE,
+            procesados=0,
+            insertadas=0,
+            cancelacion_solicitada=False,
+            id_usuario=usuario_id
+        )
+        db.add(trabajo)
+        db.commit()
+        db.refresh(trabajo)
+        return trabajo
+
+    @staticmethod
+    def cancelar(db: Session, trabajo: modelos.TrabajoPublicacion) -> modelos.TrabajoPublicacion:
+        """
+        Un trabajo pendiente se cancela en el acto; uno en curso se detiene al
+        terminar el tramo actual. Las asignaciones ya confirmadas se conservan
+        para una eventual reanudación.
+        """
+        if trabajo.estado not in ESTADOS_ACTIVOS:
+            raise HTTPException(status_code=400, detail=f"El trabajo ya está {trabajo.estado}")
+        trabajo.cancelacion_solicitada = True
+        if trabajo.estado == ESTADO_PENDIENTE and trabajo.propietario is None:
+            trabajo.estado = ESTADO_CANCELADO
+            trabajo.fecha_fin = datetime.now(timezone.utc)
+        db.commit()
+        db.refresh(trabajo)
+        return trabajo
+
+    @staticmethod
+    def preparar_reanudacion(db: Session, trabajo: modelos.TrabajoPublicacion) -> modelos.TrabajoPublicacion:
+        """Vuelve a dejar pendiente un trabajo con error o cancelado; conserva el checkpoint."""
+        if trabajo.estado not in (ESTADO_ERROR, ESTADO_CANCELADO):
+            raise HTTPException(status_code=400, detail="Solo se pueden reanudar trabajos con error o cancelados")
+        encuesta = db.query(modelos.Encuesta).filter(modelos.Encuesta.id == trabajo.id_encuesta).first()
+        if not encuesta or encuesta.estado != modelos.EstadoEncuesta.borrador:
+            raise HTTPException(status_code=400, detail="La encuesta ya no está en estado BORRADOR")
+        if PublicacionSegundoPlano.trabajo_activo(db, trabajo.id_encuesta):
+            raise HTTPException(status_code=409, detail="La encuesta ya tiene una publicación en curso")
+        trabajo.estado = ESTADO_PENDIENTE
+        trabajo.cancelacion_solicitada = False
+        trabajo.propietario = None
+        trabajo.error = None
+        trabajo.fecha_fin = None
+        db.commit()
+        db.refresh(trabajo)
+        return trabajo
+
+    @staticmethod
+    def describir(trabajo: modelos.TrabajoPublicacion) -> Dict[str, Any]:
+        """Estado del trabajo con avance y ETA según el ritmo observado desde fecha_inicio."""
+        porcentaje = None
+        eta_segundos = None
+        if trabajo.total_estimado:
+            porcentaje = round(min(100.0, 100.0 * trabajo.procesados / trabajo.total_estimado), 1)
+        inicio = _utc(trabajo.fecha_inicio)
+        if trabajo.estado == ESTADO_EN_CURSO and inicio and trabajo.procesados and trabajo.total_estimado:
+            transcurrido = (_utc(trabajo.fecha_actualizacion) or datetime.now(timezone.utc)) - inicio
+            ritmo = trabajo.procesados / max(transcurrido.total_seconds(), 0.001)
+            eta_segundos = round(max(trabajo.total_estimado - trabajo.procesados, 0) / ritmo, 1)
+        return {
+            "id": trabajo.id,
+            "id_encuesta": trabajo.id_encuesta,
+            "estado": trabajo.estado,
+            "etapa": trabajo.etapa,
+            "procesados": trabajo.procesados,
+            "insertadas": trabajo.insertadas,
+            "total_estimado": trabajo.total_estimado,
+            "porcentaje": porcentaje,
+            "eta_segundos": eta_segundos,
+            "cancelacion_solicitada": trabajo.cancelacion_solicitada,
+            "error": trabajo.error,
+            "fecha_creacion": trabajo.fecha_creacion,
+            "fecha_inicio": trabajo.fecha_inicio,
+            "fecha_actualizacion": trabajo.fecha_actualizacion,
+            "fecha_fin": trabajo.fecha_fin,
+        }
+
+    # --- Ejecución ---
+
+    def lanzar(self, id_trabajo: int) -> bool:
+        """Ejecuta el trabajo en un hilo propio. False si este proceso ya lo está corriendo."""
+        with self._lock:
+            hilo = self._hilos.get(id_trabajo)
+            if hilo is not None and hilo.is_alive():
+                return False
+            hilo = threading.Thread(target=self.ejecutar, args=(id_trabajo,), name=f"publicacion-{id_trabajo}", daemon=True)
+            self._hilos[id_trabajo] = hilo
+            hilo.start()
+            return True
+
+    def ejecutar(self, id_trabajo: int) -> Optional[str]:
+        """
+        Corre (o reanuda) el trabajo hasta terminarlo, cancelarlo o fallar.
+        Retorna el estado final, o None si otro proceso lo tiene reclamado.
+        """
+        db = self._fabrica_sesiones()
+        try:
+            if not self._reclamar(db, id_trabajo):
+                return None
+            trabajo = db.get(modelos.TrabajoPublicacion, id_trabajo)
+            try:
+                return self._ejecutar(db, trabajo)
+            except Exception as e:
+                db.rollback()
+                logger.exception(f"Error en publicación {id_trabajo}: {e}")
+                trabajo = db.get(modelos.TrabajoPublicacion, id_trabajo)
+                trabajo.estado = ESTADO_ERROR
+                trabajo.error = str(e)
+                trabajo.propietario = None
+                trabajo.fecha_fin = datetime.now(timezone.utc)
+                db.commit()
+                return ESTADO_ERROR
+        finally:
+            db.close()
+
+    def _reclamar(self, db: Session, id_trabajo: int) -> bool:
+        actual = db.get(modelos.TrabajoPublicacion, id_trabajo)
+        if actual is None or actual.estado not in ESTADOS_ACTIVOS:
+            return False
+        ahora = datetime.now(timezone.utc)
+        # Al reanudar se corre fecha_inicio para que el ETA no cuente el tiempo caído
+        inicio = ahora
+        if actual.fecha_inicio and actual.fecha_actualizacion:
+            inicio = ahora - (_utc(actual.fecha_actualizacion) - _utc(actual.fecha_inicio))
+
+        T = modelos.TrabajoPublicacion
+        resultado = db.execute(
+            update(T)
+            .where(
+                T.id == id_trabajo,
+                T.estado.in_(ESTADOS_ACTIVOS),
+                or_(
+                    T.propietario.is_(None),
+                    T.propietario == self._propietario,
+                    T.fecha_actualizacion < ahora - timedelta(seconds=self.lease_segundos)
+                )
+            )
+            .values(propietario=self._propietario, estado=ESTADO_EN_CURSO, fecha_inicio=inicio, fecha_actualizacion=ahora)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        db.expire_all()
+        return resultado.rowcount == 1
+
+    def _ejecutar(self, db: Session, trabajo: modelos.TrabajoPublicacion) -> str:
+        encuesta = db.query(modelos.Encuesta).filter(modelos.Encuesta.id == trabajo.id_encuesta).first()
+        if encuesta is None or encuesta.estado != modelos.EstadoEncuesta.borrador:
+            raise ValueError("La encuesta ya no está en estado BORRADOR")
+
+        etapas = EncuestaServicio.etapas_publicacion(encuesta) + [ETAPA_FINALIZAR]
+        if trabajo.total_estimado is None:
+            trabajo.total_estimado = self._estimar_total(db, etapas)
+            db.commit()
+
+        desde_etapa = etapas.index(trabajo.etapa) if trabajo.etapa in etapas else 0
+        for indice, etapa in enumerate(etapas[desde_etapa:], start=desde_etapa):
+            if trabajo.etapa != etapa:
+                trabajo.etapa = etapa
+                trabajo.ultimo_id_alumno = None
+                db.commit()
+
+            if etapa == ETAPA_FINALIZAR:
+                if self._cancelado(db, trabajo):
+                    return ESTADO_CANCELADO
+                EncuestaServicio.marcar_publicada(db, encuesta, trabajo.id_usuario)
+                trabajo.estado = ESTADO_COMPLETADO
+                trabajo.propietario = None
+                trabajo.fecha_fin = datetime.now(timezone.utc)
+                trabajo.fecha_actualizacion = trabajo.fecha_fin
+                db.commit()
+                cache_estado_bloqueo.invalidar_todo()
+                cache_payload_encuesta.invalidar(encuesta.id)
+                logger.info(f"Publicación {trabajo.id}: encuesta {encuesta.id} publicada con {trabajo.insertadas} asignaciones")
+                return ESTADO_COMPLETADO
+
+            while True:
+                if self._cancelado(db, trabajo):
+                    return ESTADO_CANCELADO
+                if etapa in ETAPAS_POR_ALUMNO:
+                    desde = trabajo.ultimo_id_alumno if trabajo.ultimo_id_alumno is not None else ALUMNO_ID_MINIMO
+                    hasta, cantidad = self._siguiente_tramo(db, desde)
+                    if hasta is None:
+                        break
+                    insertadas = EncuestaServicio.procesar_etapa_particionada(db, encuesta, etapa, self.tamano_lote, (desde, hasta))
+                    trabajo.ultimo_id_alumno = hasta
+                else:
+                    insertadas = EncuestaServicio.procesar_etapa(db, encuesta, etapa, self.tamano_lote)
+                    cantidad = self._contar_docentes(db)
+                    # Etapa de una sola pasada: se confirma ya como terminada, así una
+                    # reanudación no la repite ni vuelve a sumar sus docentes
+                    trabajo.etapa = etapas[indice + 1]
+                    trabajo.ultimo_id_alumno = None
+                trabajo.procesados += cantidad
+                trabajo.insertadas += insertadas
+                trabajo.fecha_actualizacion = datetime.now(timezone.utc)
+                # Asignaciones del tramo y checkpoint en el mismo commit
+                db.commit()
+                if etapa not in ETAPAS_POR_ALUMNO:
+                    break
+
+    def _cancelado(self, db: Session, trabajo: modelos.TrabajoPublicacion) -> bool:
+        db.refresh(trabajo)
+        if not trabajo.cancelacion_solicitada:
+            return False
+        trabajo.estado = ESTADO_CANCELADO
+        trabajo.propietario = None
+        trabajo.fecha_fin = datetime.now(timezone.utc)
+        db.commit()
+        logger.info(f"Publicación {trabajo.id} cancelada en la etapa {trabajo.etapa}")
+        return True
+
+    def _siguiente_tramo(self, db: Session, desde: int):
+        """(último id_alumno del tramo, alumnos en el tramo) o (None, 0) si no quedan."""
+        fila = db.execute(text("""
+            SELECT MAX(id_alumno) AS hasta, COUNT(*) AS cantidad
+            FROM (
+                SELECT DISTINCT id_alumno
+                FROM sapientia.inscripciones
+                WHERE id_alumno > :desde
+                ORDER BY id_alumno
+                LIMIT :limite
+            ) t
+        """), {"desde": desde, "limite": self.tramo_alumnos}).first()
+        if fila is None or fila.hasta is None:
+            return None, 0
+        return fila.hasta, fila.cantidad
+
+    @staticmethod
+    def _contar_docentes(db: Session) -> int:
+        return db.execute(text(
+            "SELECT COUNT(DISTINCT id_docente) FROM sapientia.oferta_academica WHERE id_docente IS NOT NULL"
+        )).scalar() or 0
+
+    @staticmethod
+    def _estimar_total(db: Session, etapas: List[str]) -> int:
+        """Unidades de avance: alumnos distintos por etapa de alumnos y docentes para la etapa de docentes."""
+        total = 0
+        if any(e in ETAPAS_POR_ALUMNO for e in etapas):
+            alumnos = db.execute(text("SELECT COUNT(DISTINCT id_alumno) FROM sapientia.inscripciones")).scalar() or 0
+            total += alumnos * sum(1 for e in etapas if e in ETAPAS_POR_ALUMNO)
+        if ETAPA_DOCENTES in etapas:
+            total += PublicacionSegundoPlano._contar_docentes(db)
+        return total
+
+    # --- Supervisor: reanuda trabajos abandonados (reinicio o caída de otro proceso) ---
+
+    def reanudar_abandonados(self) -> int:
+        """Lanza los trabajos activos sin latido reciente. Retorna cuántos lanzó."""
+        limite = datetime.now(timezone.utc) - timedelta(seconds=self.lease_segundos)
+        T = modelos.TrabajoPublicacion
+        db = self._fabrica_sesiones()
+        try:
+            ids = db.execute(
+                select(T.id).where(
+                    T.estado.in_(ESTADOS_ACTIVOS),
+                    or_(T.propietario.is_(None), T.propietario == self._propietario, T.fecha_actualizacion < limite)
+                )
+            ).scalars().all()
+        finally:
+            db.close()
+        return sum(1 for id_trabajo in ids if self.lanzar(id_trabajo))
+
+    def iniciar(self):
+        if self._supervisor is not None and self._supervisor.is_alive():
+            return
+        self._detener.clear()
+        self._supervisor = threading.Thread(target=self._bucle, name="supervisor-publicaciones", daemon=True)
+        self._supervisor.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._supervisor is not None:
+            self._supervisor.join(timeout=5)
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                self.reanudar_abandonados()
+            except Exception as e:
+                logger.exception(f"Error revisando publicaciones pendientes: {e}")
+            self._detener.wait(self.lease_segundos)
+
+
+# Instancia única por proceso
+publicacion_segundo_plano = PublicacionSegundoPlano()
@@ -0,0 +1,142 @@
+import os
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app.services import sapientia_service
+from app.servicios.contexto_asignacion import DiccionarioContextos
+
+# false: publicar generando las filas en Python y cargándolas con COPY (CargadorAsignaciones)
+PUBLICACION_SQL_HABILITADA = os.getenv("PUBLICACION_SQL_HABILITADA", "true").lower() == "true"
+
+
+class PublicacionSQL:
+    """
+    Motor de publicación por conjuntos: el join inscripciones/oferta_academica y la
+    inserción en asignacion_usuario corren en PostgreSQL como un único
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING, con los metadatos armados con
+    jsonb_build_object y registrados en contexto_asignacion (DiccionarioContextos).
+    La deduplicación la resuelve uq_usuario_encuesta_contexto.
+    No hace commit. En otros motores (SQLite en tests), o con
+    PUBLICACION_SQL_HABILITADA=false, se usa el camino Python de EncuestaServicio.
+    """
+
+    @staticmethod
+    def disponible(db: Session) -> bool:
+        return PUBLICACION_SQL_HABILITADA and db.bind.dialect.name == "postgresql"
+
+    @staticmethod
+    def _insertar(db: Session, select_sql: str, params: dict) -> int:
+        # select_sql produce (id_usuario, id_referencia_contexto, metadatos). Los
+        # metadatos van una vez por contenido a contexto_asignacion; la asignación guarda id_contexto.
+        return DiccionarioContextos.insertar_asignaciones(db, f"""
+            SELECT s.id_usuario, CAST(:id_encuesta AS integer) AS id_encuesta, s.id_referencia_contexto, s.metadatos
+            FROM ({select_sql}) s
+        """, params)
+
+    # --- CANDIDATOS POR ETAPA ---
+    # Única definición de qué (id_usuario, id_referencia_contexto) genera cada etapa:
+    # la usan la publicación y el estimador (EstimadorPublicacion). Con
+    # metadatos=False la consulta es portable (DISTINCT, sin jsonb) y solo sirve
+    # para contar; con metadatos=True agrega la columna `metadatos` (PostgreSQL).
+
+    @staticmethod
+    def candidatos_evaluacion_docente(predicado: Optional[tuple] = None, rango_alumnos: Optional[tuple] = None, particion: Optional[tuple] = None, metadatos: bool = True, alumnos: Optional[list] = None) -> Tuple[str, dict]:
+        """Un candidato por alumno y (materia, sección, docente). Mismo contexto que get_contexto_evaluacion_docente."""
+        where_clauses, params = sapientia_service.condiciones_alumnos(None, rango_alumnos, particion, predicado, alumnos)
+        columnas = """
+                i.id_alumno AS id_usuario,
+                o.cod_asignatura || '-' || o.seccion || '-' || o.id_docente AS id_referencia_contexto"""
+        if metadatos:
+            columnas += """,
+                jsonb_build_object(
+                    'materia', o.asignatura,
+                    'seccion', o.seccion,
+                    'docente', o.docente,
+                    'departamento', o.departamento
+                ) AS metadatos"""
+        return f"""
+            SELECT {"" if metadatos else "DISTINCT"}{columnas}
+            FROM sapientia.inscripciones i
+            JOIN sapientia.oferta_academica o ON
+                i.cod_asignatura = o.cod_asignatura AND
+                i.seccion = o.seccion
+            WHERE {" AND ".join(["o.id_docente IS NOT NULL"] + where_clauses)}
+        """, params
+
+    @staticmethod
+    def candidatos_alumnos(predicado: Optional[tuple] = None, rango_alumnos: Optional[tuple] = None, particion: Optional[tuple] = None, metadatos: bool = True, alumnos: Optional[list] = None) -> Tuple[str, dict]:
+        """Un candidato por alumno (GEN-ALU-<id>), con el primer contexto académico encontrado."""
+        where_clauses, params = sapientia_service.condiciones_alumnos(None, rango_alumnos, particion, predicado, alumnos)
+        where = ("WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
+        columnas = """
+                i.id_alumno AS id_usuario,
+                'GEN-ALU-' || i.id_alumno AS id_referencia_contexto"""
+        if metadatos:
+            columnas += """,
+                jsonb_build_object(
+                    'nombre_alumno', 'Alumno ' || i.id_alumno,
+                    'campus', o.campus,
+                    'facultad', o.facultad,
+                    'carrera', o.departamento
+                ) AS metadatos"""
+        return f"""
+            SELECT {"DISTINCT ON (i.id_alumno)" if metadatos else "DISTINCT"}{columnas}
+            FROM sapientia.inscripciones i
+            JOIN sapientia.oferta_academica o ON
+                i.cod_asignatura = o.cod_asignatura AND
+                i.seccion = o.seccion
+            {where}
+            {"ORDER BY i.id_alumno" if metadatos else ""}
+        """, params
+
+    @staticmethod
+    def candidatos_docentes(metadatos: bool = True) -> Tuple[str, dict]:
+        """Un candidato por docente activo (GEN-DOC-<id>)."""
+        columnas = """
+                o.id_docente AS id_usuario,
+                'GEN-DOC-' || o.id_docente AS id_referencia_contexto"""
+        if metadatos:
+            columnas += """,
+                jsonb_build_object('nombre_docente', o.docente) AS metadatos"""
+        return f"""
+            SELECT {"DISTINCT ON (o.id_docente)" if metadatos else "DISTINCT"}{columnas}
+            FROM sapientia.oferta_academica o
+            WHERE o.id_docente IS NOT NULL
+            {"ORDER BY o.id_docente" if metadatos else ""}
+        """, {}
+
+    # --- INSERCIÓN ---
+
+    @staticmethod
+    def insertar_evaluacion_docente(db: Session, id_encuesta: int, predicado: Optional[tuple] = None, rango_alumnos: Optional[tuple] = None, particion: Optional[tuple] = None, alumnos: Optional[list] = None) -> int:
+        """Una asignación por alumno y (materia, sección, docente)."""
+        select_sql, params = PublicacionSQL.candidatos_evaluacion_docente(predicado, rango_alumnos, particion, alumnos=alumnos)
+        params["id_encuesta"] = id_encuesta
+        return PublicacionSQL._insertar(db, select_sql, params)
+
+    @staticmethod
+    def registrar_contextos_evaluacion_docente(db: Session, predicado: Optional[tuple] = None, rango_alumnos: Optional[tuple] = None) -> int:
+        """
+        Registra en contexto_asignacion los contextos (materia, sección, docente)
+        de la etapa sin insertar asignaciones. Los comparten alumnos de distintas
+        particiones: PublicacionParalela los registra antes de repartirlas.
+        """
+        select_sql, params = PublicacionSQL.candidatos_evaluacion_docente(predicado, rango_alumnos)
+        return DiccionarioContextos.registrar(db, select_sql, params)
+
+    @staticmethod
+    def insertar_alumnos(db: Session, id_encuesta: int, predicado: Optional[tuple] = None, rango_alumnos: Optional[tuple] = None, particion: Optional[tuple] = None, alumnos: Optional[list] = None) -> int:
+        """
+        Una asignación por alumno (GEN-ALU-<id>). `predicado`: ReglasCompiladas.predicado
+        de la encuesta.
+        """
+        select_sql, params = PublicacionSQL.candidatos_alumnos(predicado, rango_alumnos, particion, alumnos=alumnos)
+        params["id_encuesta"] = id_encuesta
+        return PublicacionSQL._insertar(db, select_sql, params)
+
+    @staticmethod
+    def insertar_docentes(db: Session, id_encuesta: int) -> int:
+        """Una asignación por docente activo (GEN-DOC-<id>)."""
+        select_sql, params = PublicacionSQL.candidatos_docentes()
+        params["id_encuesta"] = id_encuesta
+        return PublicacionSQL._insertar(db, select_sql, params)
@@ -0,0 +1,96 @@
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List
+from sqlalchemy.orm import Session
+from sqlalchemy import text, func
+from app import modelos
+from app.servicios.compilador_reglas import CompiladorReglas
+
+logger = logging.getLogger(__name__)
+
+# Con más alumnos afectados que esto conviene recorrer todas las inscripciones
+REPUBLICACION_MAX_ALUMNOS_CAMBIADOS = int(os.getenv("REPUBLICACION_MAX_ALUMNOS_CAMBIADOS", "5000"))
+# cambio_inscripcion conserva al menos estas horas (publicaciones sincrónicas en curso)
+REPUBLICACION_RETENCION_CAMBIOS_HORAS = float(os.getenv("REPUBLICACION_RETENCION_CAMBIOS_HORAS", "24"))
+
+
+class RegistroCambiosInscripciones:
+    """
+    Lectura de cambio_inscripcion por ventanas de id_transaccion. El límite de
+    una ventana es el xmin del snapshot actual: toda transacción con id menor ya
+    terminó, así que una transacción lenta de la carga de Sapientia nunca queda
+    detrás de la marca sin haberse leído. En otros motores (SQLite en tests) no
+    hay transacciones concurrentes y el límite es el último id + 1.
+    """
+
+    @staticmethod
+    def limite(db: Session) -> int:
+        """Primer id_transaccion que todavía puede no ser visible. Llamar antes de escribir."""
+        if db.bind.dialect.name == "postgresql":
+            return db.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar()
+        return db.execute(text(
+            "SELECT COALESCE(MAX(id_transaccion), 0) + 1 FROM encuestas_oltp.cambio_inscripcion"
+        )).scalar()
+
+    @staticmethod
+    def sembrar(db: Session, encuesta: modelos.Encuesta, desde: int):
+        """
+        Marca la encuesta como al día hasta `desde` (leído con limite() antes de
+        recorrer inscripciones) con sus reglas actuales. No hace commit.
+        """
+        db.merge(modelos.MarcaRepublicacion(
+            id_encuesta=encuesta.id,
+            id_transaccion_desde=desde,
+            huella_reglas=CompiladorReglas.huella_reglas(encuesta)
+        ))
+
+    @staticmethod
+    def alumnos_afectados(db: Session, desde: int, hasta: int, maximo: int = REPUBLICACION_MAX_ALUMNOS_CAMBIADOS) -> Optional[List[int]]:
+        """
+        id_alumno con inscripciones nuevas o modificadas en [desde, hasta), más los
+        inscritos en secciones cuya oferta cambió. None si son más de `maximo`.
+        """
+        filas = db.execute(text("""
+            SELECT c.id_alumno
+            FROM encuestas_oltp.cambio_inscripcion c
+            WHERE c.id_transaccion >= :desde AND c.id_transaccion < :hasta
+              AND c.id_alumno IS NOT NULL
+            UNION
+            SELECT i.id_alumno
+            FROM encuestas_oltp.cambio_inscripcion c
+            JOIN sapientia.inscripciones i ON
+                i.cod_asignatura = c.cod_asignatura AND
+                i.seccion = c.seccion
+            WHERE c.id_transaccion >= :desde AND c.id_transaccion < :hasta
+              AND c.id_alumno IS NULL
+            LIMIT :limite
+        """), {"desde": desde, "hasta": hasta, "limite": maximo + 1}).fetchall()
+        if len(filas) > maximo:
+            return None
+        return sorted(fila[0] for fila in filas)
+
+    @staticmethod
+    def depurar(db: Session) -> int:
+        """
+        Borra los cambios ya aplicados a todas las encuestas en curso o con
+        publicación en segundo plano activa y más viejos que la retención. No hace commit.
+        """
+        minimo = db.query(func.min(modelos.MarcaRepublicacion.id_transaccion_desde)).join(
+            modelos.Encuesta, modelos.Encuesta.id == modelos.MarcaRepublicacion.id_encuesta
+        ).filter(
+            (modelos.Encuesta.estado == modelos.EstadoEncuesta.en_curso) |
+            modelos.Encuesta.id.in_(
+                db.query(modelos.TrabajoPublicacion.id_encuesta).filter(
+                    modelos.TrabajoPublicacion.estado.in_(["pendiente", "en_curso"])
+                )
+            )
+        ).scalar()
+        limite_fecha = datetime.now(timezone.utc) - timedelta(hours=REPUBLICACION_RETENCION_CAMBIOS_HORAS)
+        consulta = db.query(modelos.CambioInscripcion).filter(modelos.CambioInscripcion.fecha < limite_fecha)
+        if minimo is not None:
+            consulta = consulta.filter(modelos.CambioInscripcion.id_transaccion < minimo)
+        borrados = consulta.delete(synchronize_session=False)
+        if borrados:
+            logger.info(f"cambio_inscripcion: {borrados} cambios ya aplicados depurados")
+        return borrados
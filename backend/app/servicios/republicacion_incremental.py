@@ -0,0 +1,159 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional
+from sqlalchemy.orm import Session
+from app import modelos
+from app.servicios.encuesta_servicio import EncuestaServicio, ETAPAS_POR_ALUMNO
+from app.servicios.compilador_reglas import CompiladorReglas
+from app.servicios.registro_inscripciones import RegistroCambiosInscripciones
+from app.servicios.proyeccion_bloqueo import ProyeccionBloqueo
+from app.servicios.cache_estado import cache_estado_bloqueo
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se republican las encuestas en curso (0 = solo a demanda)
+REPUBLICACION_INTERVALO_SEGUNDOS = float(os.getenv("REPUBLICACION_INTERVALO_SEGUNDOS", "0"))
+BATCH_SIZE_PUBLICACION = int(os.getenv("BATCH_SIZE_PUBLICACION", "1000"))
+
+
+class RepublicacionIncremental:
+    """
+    Asigna a encuestas en curso las inscripciones que llegaron después de
+    publicarlas. Cada encuesta guarda en marca_republicacion hasta qué
+    transacción de cambio_inscripcion ya aplicó (se siembra al publicar) y la
+    huella de sus reglas. Una corrida lee solo los cambios posteriores a la marca
+    y reprocesa los alumnos afectados (id_alumno IN (...)), así que su costo es
+    proporcional a los cambios y no a las inscripciones. Si cambiaron las reglas,
+    no hay marca o los alumnos afectados son demasiados, recorre todo.
+    Las bajas de inscripciones no quitan asignaciones.
+    """
+
+    @staticmethod
+    def republicar(
+        db: Session,
+        encuesta: modelos.Encuesta,
+        batch_size: int = BATCH_SIZE_PUBLICACION
+    ) -> Dict[str, Any]:
+        """
+        Inserta las asignaciones de los alumnos con cambios desde la marca de la
+        encuesta y la avanza. Bloquea la fila de la encuesta (PostgreSQL) para que
+        dos corridas simultáneas, p. ej. el trabajador y el endpoint, no avancen
+        la misma marca. Hace commit.
+        """
+        inicio = time.monotonic()
+        # Antes de cualquier escritura: el propio id de transacción no debe frenar el límite
+        hasta = RegistroCambiosInscripciones.limite(db)
+        db.query(modelos.Encuesta.id).filter(modelos.Encuesta.id == encuesta.id).with_for_update().one()
+        marca = db.query(modelos.MarcaRepublicacion).filter(
+            modelos.MarcaRepublicacion.id_encuesta == encuesta.id
+        ).populate_existing().first()
+
+        huella = CompiladorReglas.huella_reglas(encuesta)
+        completa = marca is None or marca.huella_reglas != huella
+        alumnos = None
+        if not completa:
+            if marca.id_transaccion_desde >= hasta:
+                db.commit()
+                return RepublicacionIncremental._resultado(encuesta, False, 0, 0, inicio)
+            alumnos = RegistroCambiosInscripciones.alumnos_afectados(db, marca.id_transaccion_desde, hasta)
+            completa = alumnos is None
+
+        etapas = [e for e in EncuestaServicio.etapas_publicacion(encuesta) if e in ETAPAS_POR_ALUMNO]
+        insertadas = 0
+        if etapas and (completa or alumnos):
+            for etapa in etapas:
+                insertadas += EncuestaServicio.procesar_etapa(db, encuesta, etapa, batch_size, alumnos=alumnos)
+
+        if marca is None:
+            db.add(modelos.MarcaRepublicacion(id_encuesta=encuesta.id, id_transaccion_desde=hasta, huella_reglas=huella))
+        else:
+            marca.id_transaccion_desde = max(marca.id_transaccion_desde, hasta)
+            marca.huella_reglas = huella
+
+        if insertadas:
+            if completa:
+                ProyeccionBloqueo.recalcular_encuesta(db, encuesta.id)
+            else:
+                ProyeccionBloqueo.recalcular_alumnos(db, alumnos)
+        db.commit()
+        if insertadas:
+            cache_estado_bloqueo.invalidar_todo()
+
+        resultado = RepublicacionIncremental._resultado(
+            encuesta, completa, None if completa else len(alumnos), insertadas, inicio
+        )
+        if insertadas:
+            logger.info(f"Republicación incremental: {resultado}")
+        return resultado
+
+    @staticmethod
+    def republicar_en_curso(db: Session) -> Dict[str, Any]:
+        """Republica todas las encuestas en curso y depura los cambios ya aplicados."""
+        inicio = time.monotonic()
+        encuestas = db.query(modelos.Encuesta).filter(
+            modelos.Encuesta.estado == modelos.EstadoEncuesta.en_curso,
+            modelos.Encuesta.activo == True
+        ).all()
+        resultados = []
+        for encuesta in encuestas:
+            if not encuesta.reglas:
+                continue
+            try:
+                resultados.append(RepublicacionIncremental.republicar(db, encuesta))
+            except Exception as e:
+                db.rollback()
+                logger.exception(f"Error en republicación incremental de la encuesta {encuesta.id}: {e}")
+                resultados.append({"id_encuesta": encuesta.id, "error": str(e)})
+        depurados = RegistroCambiosInscripciones.depurar(db)
+        db.commit()
+        return {
+            "encuestas": resultados,
+            "insertadas": sum(r.get("insertadas", 0) for r in resultados),
+            "cambios_depurados": depurados,
+            "segundos": round(time.monotonic() - inicio, 3),
+        }
+
+    @staticmethod
+    def _resultado(encuesta: modelos.Encuesta, completa: bool, alumnos: Optional[int], insertadas: int, inicio: float) -> Dict[str, Any]:
+        return {
+            "id_encuesta": encuesta.id,
+            "completa": completa,
+            "alumnos_afectados": alumnos,
+            "insertadas": insertadas,
+            "segundos": round(time.monotonic() - inicio, 3),
+        }
+
+
+class TrabajadorRepublicacion:
+    """Hilo que corre la republicación incremental cada REPUBLICACION_INTERVALO_SEGUNDOS."""
+
+    def __init__(self, fabrica_sesiones, intervalo_segundos: float = REPUBLICACION_INTERVALO_SEGUNDOS):
+        self._fabrica_sesiones = fabrica_sesiones
+        self._intervalo = intervalo_segundos
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="republicacion-incremental", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 10):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+
+    def _bucle(self):
+        while not self._detener.wait(self._intervalo):
+            db = self._fabrica_sesiones()
+            try:
+                RepublicacionIncremental.republicar_en_curso(db)
+            except Exception as e:
+                db.rollback()
+                logger.exception(f"Error en republicación incremental: {e}")
+            finally:
+                db.close()
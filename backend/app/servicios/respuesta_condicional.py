@@ -0,0 +1,73 @@
+import os
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional, Tuple
+from fastapi import Request, Response
+
+# Los catálogos requieren usuario autenticado: ningún caché compartido puede
+# servirlos, y el cliente revalida siempre con el ETag (responder 304 es barato)
+CATALOGO_CACHE_CONTROL = os.getenv("CATALOGO_CACHE_CONTROL", "private, no-cache")
+CATALOGO_GZIP_MIN_BYTES = int(os.getenv("CATALOGO_GZIP_MIN_BYTES", "1024"))
+_MAX_CUERPOS = 512
+
+# (version, url) -> (json, json_gzip | None)
+_cuerpos: "OrderedDict[Tuple[str, str], Tuple[bytes, Optional[bytes]]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cuerpo(version: str, url: str, datos: Any) -> Tuple[bytes, Optional[bytes]]:
+    """Serializa (y comprime si es grande) una sola vez por versión de catálogo y URL."""
+    clave = (version, url)
+    with _lock:
+        if clave in _cuerpos:
+            _cuerpos.move_to_end(clave)
+            return _cuerpos[clave]
+    cuerpo = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    comprimido = gzip.compress(cuerpo, compresslevel=6) if len(cuerpo) >= CATALOGO_GZIP_MIN_BYTES else None
+    with _lock:
+        _cuerpos[clave] = (cuerpo, comprimido)
+        while len(_cuerpos) > _MAX_CUERPOS:
+            _cuerpos.popitem(last=False)
+    return cuerpo, comprimido
+
+
+def _no_modificado(request: Request, etag: str, ultima_modificacion: datetime) -> bool:
+    si_no_coincide = request.headers.get("if-none-match")
+    if si_no_coincide:
+        etiquetas = [e.strip() for e in si_no_coincide.split(",")]
+        # Comparación débil: W/"x" equivale a "x"
+        return "*" in etiquetas or etag in etiquetas or etag[2:] in etiquetas
+    si_modificado_desde = request.headers.get("if-modified-since")
+    if si_modificado_desde:
+        try:
+            return ultima_modificacion.replace(microsecond=0) <= parsedate_to_datetime(si_modificado_desde)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def respuesta_catalogo(request: Request, datos: Any, version: str, ultima_modificacion: datetime) -> Response:
+    """
+    Respuesta JSON de catálogo con ETag/Last-Modified derivados de la versión del
+    catálogo, Cache-Control, 304 ante If-None-Match/If-Modified-Since y gzip para
+    cuerpos grandes.
+    """
+    etag = f'W/"{version}"'
+    cabeceras = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(ultima_modificacion, usegmt=True),
+        "Cache-Control": CATALOGO_CACHE_CONTROL,
+        "Vary": "Accept-Encoding, Authorization",
+    }
+    if _no_modificado(request, etag, ultima_modificacion):
+        return Response(status_code=304, headers=cabeceras)
+
+    cuerpo, comprimido = _cuerpo(version, str(request.url), datos)
+    if comprimido is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        cabeceras["Content-Encoding"] = "gzip"
+        return Response(content=comprimido, media_type="application/json", headers=cabeceras)
+    return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
@@ -0,0 +1,120 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, func
+from typing import Dict, Any, Optional
+import hashlib
+from app import modelos
+from app import schemas
+from app.servicios.proyeccion_bloqueo import ProyeccionBloqueo
+from app.servicios.validador_respuestas import cache_validadores
+from app.servicios.buffer_borradores import buffer_borradores
+
+SALT_HASH_USUARIO = "SAPIENTIA_SECRET_SALT_2025"
+
+
+class RespuestasServicio:
+    """
+    Servicio de dominio para la recepción de respuestas (CU07).
+    La persistencia usa sentencias multi-fila de SQLAlchemy Core en lugar de
+    una instancia ORM por respuesta, y no hace commit: el llamador decide el
+    límite de la transacción.
+    """
+
+    @staticmethod
+    def validar_preguntas(db: Session, envio: schemas.EnvioRespuestasAlumno):
+        """
+        QA Fix: Validación de Integridad de Datos. Usa el validador compilado de la
+        encuesta (preguntas, opciones por pregunta y reglas por tipo), sin consultas
+        a la BD salvo cuando hay que compilarlo.
+        """
+        cache_validadores.obtener(db, envio.id_encuesta).validar(envio)
+
+    @staticmethod
+    def construir_contexto(envio: schemas.EnvioRespuestasAlumno, meta_asignacion: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        hash_usuario = hashlib.sha256(f"{envio.id_usuario}{SALT_HASH_USUARIO}".encode()).hexdigest()
+        meta_asignacion = meta_asignacion or {}
+
+        # Contexto base del envío (app móvil/frontend)
+        contexto_final = {
+            "origen": "sapientia_api",
+            "hash_usuario": hash_usuario,
+            "id_referencia": envio.id_referencia_contexto,
+            **envio.metadatos_contexto
+        }
+
+        # Merge: Metadatos de asignación tienen precedencia o complementan
+        # IMPORTANTE: Mapeo de claves para ETL (etl.py espera 'profesor', 'asignatura')
+        # sapientia_service.py genera 'docente', 'materia'
+        if "docente" in meta_asignacion:
+            contexto_final["profesor"] = meta_asignacion["docente"]
+
+        if "materia" in meta_asignacion:
+            contexto_final["asignatura"] = meta_asignacion["materia"]
+
+        # Copiamos el resto de metadatos útiles
+        for k, v in meta_asignacion.items():
+            if k not in contexto_final:
+                contexto_final[k] = v
+
+        return contexto_final
+
+    @staticmethod
+    def persistir_envio(db: Session, envio: schemas.EnvioRespuestasAlumno) -> int:
+        """
+        Escribe transacción, respuestas y cambio de estado de la asignación con
+        cuatro sentencias: SELECT asignación, INSERT ... RETURNING, INSERT multi-fila
+        y UPDATE. Retorna el id_transaccion generado.
+        """
+        # 1. Asignación (mismo criterio que antes: primera por usuario+encuesta)
+        asignacion = db.execute(
+            select(
+                modelos.AsignacionUsuario.id,
+                modelos.AsignacionUsuario.id_contexto,
+                modelos.AsignacionUsuario.metadatos_asignacion
+            )
+            .where(
+                modelos.AsignacionUsuario.id_usuario == envio.id_usuario,
+                modelos.AsignacionUsuario.id_encuesta == envio.id_encuesta
+            )
+            .limit(1)
+        ).first()
+
+        # 2. Transacción. Con id_contexto la transacción guarda solo los datos del
+        # envío y la referencia; el ETL combina ambos (mismo criterio que construir_contexto).
+        id_contexto = asignacion.id_contexto if asignacion else None
+        contexto_final = RespuestasServicio.construir_contexto(
+            envio, asignacion.metadatos_asignacion if asignacion and id_contexto is None else None
+        )
+        id_transaccion = db.execute(
+            insert(modelos.TransaccionEncuesta)
+            .values(
+                id_encuesta=envio.id_encuesta, metadatos_contexto=contexto_final,
+                id_contexto=id_contexto, procesado_etl=False
+            )
+            .returning(modelos.TransaccionEncuesta.id_transaccion)
+        ).scalar_one()
+
+        # 3. Respuestas (un único INSERT multi-fila)
+        if envio.respuestas:
+            db.execute(
+                insert(modelos.Respuesta).values([
+                    {
+                        "id_transaccion": id_transaccion,
+                        "id_pregunta": r.id_pregunta,
+                        "valor_respuesta": r.valor_respuesta,
+                        "id_opcion": r.id_opcion
+                    }
+                    for r in envio.respuestas
+                ])
+            )
+
+        # 4. Asignación realizada
+        if asignacion:
+            db.execute(
+                update(modelos.AsignacionUsuario)
+                .where(modelos.AsignacionUsuario.id == asignacion.id)
+                .values(estado=modelos.EstadoAsignacion.realizada, fecha_realizacion=func.now())
+            )
+            ProyeccionBloqueo.recalcular_alumnos(db, [envio.id_usuario])
+            buffer_borradores.finalizar(db, asignacion.id)
+
+        return id_transaccion
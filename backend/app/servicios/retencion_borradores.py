@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, func, or_
+from app import modelos
+
+logger = logging.getLogger(__name__)
+
+BORRADOR_RETENCION_DIAS = int(os.getenv("BORRADOR_RETENCION_DIAS", "180"))
+BORRADOR_GC_TAMANO_LOTE = int(os.getenv("BORRADOR_GC_TAMANO_LOTE", "1000"))
+BORRADOR_GC_MAX_LOTES = int(os.getenv("BORRADOR_GC_MAX_LOTES", "100"))
+
+
+class RetencionBorradores:
+    """
+    Recolección de basura de respuesta_borrador (RF08). Un borrador deja de servir
+    cuando su asignación está realizada o cancelada, cuando la encuesta está
+    finalizada o cuando lleva más de BORRADOR_RETENCION_DIAS sin cambios.
+    Se borra en lotes acotados con commit por lote para no retener locks largos.
+    """
+
+    _lock = threading.Lock()
+    ultima_ejecucion: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _condicion(retencion_dias: int):
+        limite = datetime.now(timezone.utc) - timedelta(days=retencion_dias)
+        asignacion = modelos.AsignacionUsuario
+        return or_(
+            modelos.RespuestaBorrador.id_asignacion.in_(
+                select(asignacion.id).where(asignacion.estado.in_([
+                    modelos.EstadoAsignacion.realizada, modelos.EstadoAsignacion.cancelada
+                ]))
+            ),
+            modelos.RespuestaBorrador.id_asignacion.in_(
+                select(asignacion.id)
+                .join(modelos.Encuesta, modelos.Encuesta.id == asignacion.id_encuesta)
+                .where(modelos.Encuesta.estado == modelos.EstadoEncuesta.finalizado)
+            ),
+            modelos.RespuestaBorrador.fecha_actualizacion < limite
+        )
+
+    @staticmethod
+    def ejecutar(
+        db: Session,
+        dry_run: bool = False,
+        retencion_dias: int = BORRADOR_RETENCION_DIAS,
+        tamano_lote: int = BORRADOR_GC_TAMANO_LOTE,
+        max_lotes: int = BORRADOR_GC_MAX_LOTES
+    ) -> Dict[str, Any]:
+        """
+        Borra hasta `max_lotes` lotes de `tamano_lote` borradores vencidos.
+        En dry_run solo cuenta los candidatos. Hace commit por lote.
+        """
+        if not RetencionBorradores._lock.acquire(blocking=False):
+            return {"mensaje": "Ya hay una ejecución de retención en curso"}
+        try:
+            inicio = time.monotonic()
+            condicion = RetencionBorradores._condicion(retencion_dias)
+            metricas: Dict[str, Any] = {
+                "dry_run": dry_run,
+                "retencion_dias": retencion_dias,
+                "tamano_lote": tamano_lote,
+                "lotes": 0,
+                "borrados": 0,
+                "candidatos": None,
+                "completo": True,
+            }
+
+            if dry_run:
+                metricas["candidatos"] = db.execute(
+                    select(func.count()).select_from(modelos.RespuestaBorrador).where(condicion)
+                ).scalar()
+            else:
+                while metricas["lotes"] < max_lotes:
+                    ids = db.execute(
+                        select(modelos.RespuestaBorrador.id).where(condicion).limit(tamano_lote)
+                    ).scalars().all()
+                    if not ids:
+                        break
+                    db.execute(delete(modelos.RespuestaBorrador).where(modelos.RespuestaBorrador.id.in_(ids)))
+                    db.commit()
+                    metricas["lotes"] += 1
+                    metricas["borrados"] += len(ids)
+                    if len(ids) < tamano_lote:
+                        break
+                else:
+                    # Se alcanzó max_lotes: puede quedar trabajo para la próxima ejecución
+                    metricas["completo"] = False
+
+            metricas["duracion_segundos"] = round(time.monotonic() - inicio, 3)
+            metricas["fecha"] = datetime.now(timezone.utc).isoformat()
+            if not dry_run:
+                logger.info(f"Retención de borradores: {metricas['borrados']} borrados en {metricas['lotes']} lotes")
+            RetencionBorradores.ultima_ejecucion = metricas
+            return metricas
+        finally:
+            RetencionBorradores._lock.release()
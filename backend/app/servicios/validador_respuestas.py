@@ -0,0 +1,125 @@
+import os
+import time
+import threading
+from typing import Dict, Set, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from fastapi import HTTPException
+from app import modelos, schemas
+
+# Respaldo para despliegues con varios procesos: la invalidación explícita solo
+# alcanza al proceso que editó la encuesta.
+VALIDADOR_TTL_SEGUNDOS = float(os.getenv("VALIDADOR_TTL_SEGUNDOS", "300"))
+
+TIPOS_CON_OPCIONES = {modelos.TipoPregunta.opcion_unica, modelos.TipoPregunta.opcion_multiple}
+
+
+class ValidadorEncuesta:
+    """
+    Reglas de validación de respuestas compiladas a partir de Pregunta/OpcionRespuesta
+    de una encuesta: conjunto de preguntas válidas, mapa opción -> pregunta y tipo de
+    cada pregunta. Validar un envío no requiere consultas a la BD.
+    """
+
+    def __init__(self, id_encuesta: int, tipos: Dict[int, modelos.TipoPregunta], pregunta_por_opcion: Dict[int, int]):
+        self.id_encuesta = id_encuesta
+        self.tipos = tipos
+        self.ids_preguntas: Set[int] = set(tipos)
+        self.pregunta_por_opcion = pregunta_por_opcion
+
+    @classmethod
+    def compilar(cls, db: Session, id_encuesta: int) -> "ValidadorEncuesta":
+        preguntas = db.execute(
+            select(modelos.Pregunta.id, modelos.Pregunta.tipo)
+            .where(modelos.Pregunta.id_encuesta == id_encuesta)
+        ).all()
+        opciones = db.execute(
+            select(modelos.OpcionRespuesta.id, modelos.OpcionRespuesta.id_pregunta)
+            .join(modelos.Pregunta, modelos.Pregunta.id == modelos.OpcionRespuesta.id_pregunta)
+            .where(modelos.Pregunta.id_encuesta == id_encuesta)
+        ).all()
+        return cls(
+            id_encuesta,
+            {p.id: modelos.TipoPregunta(p.tipo) for p in preguntas},
+            {o.id: o.id_pregunta for o in opciones}
+        )
+
+    def validar(self, envio: schemas.EnvioRespuestasAlumno):
+        """Lanza HTTPException 400 ante la primera regla violada."""
+        ids_preguntas_enviadas = {r.id_pregunta for r in envio.respuestas}
+        invalidas = ids_preguntas_enviadas - self.ids_preguntas
+        if invalidas:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Integridad de datos fallida: Las preguntas {invalidas} no pertenecen a la encuesta {envio.id_encuesta}"
+            )
+
+        respuestas_por_pregunta: Dict[int, int] = {}
+        opciones_vistas: Set[Tuple[int, int]] = set()
+        for r in envio.respuestas:
+            tipo = self.tipos[r.id_pregunta]
+            respuestas_por_pregunta[r.id_pregunta] = respuestas_por_pregunta.get(r.id_pregunta, 0) + 1
+
+            if tipo == modelos.TipoPregunta.seccion:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"La pregunta {r.id_pregunta} es una sección y no admite respuestas"
+                )
+
+            if r.id_opcion is not None:
+                if tipo not in TIPOS_CON_OPCIONES:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"La pregunta {r.id_pregunta} ({tipo.value}) no admite id_opcion"
+                    )
+                if self.pregunta_por_opcion.get(r.id_opcion) != r.id_pregunta:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Integridad de datos fallida: La opción {r.id_opcion} no pertenece a la pregunta {r.id_pregunta}"
+                    )
+                if (r.id_pregunta, r.id_opcion) in opciones_vistas:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"La opción {r.id_opcion} está repetida en la pregunta {r.id_pregunta}"
+                    )
+                opciones_vistas.add((r.id_pregunta, r.id_opcion))
+
+            if tipo == modelos.TipoPregunta.opcion_unica and respuestas_por_pregunta[r.id_pregunta] > 1:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"La pregunta {r.id_pregunta} es de opción única y recibió más de una respuesta"
+                )
+
+
+class CacheValidadores:
+    """Validadores compilados por encuesta, en memoria de proceso."""
+
+    def __init__(self, ttl_segundos: float = VALIDADOR_TTL_SEGUNDOS):
+        self.ttl_segundos = ttl_segundos
+        self._entradas: Dict[int, Tuple[float, ValidadorEncuesta]] = {}
+        self._lock = threading.Lock()
+        self.compilaciones = 0
+
+    def obtener(self, db: Session, id_encuesta: int) -> ValidadorEncuesta:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(id_encuesta)
+        if entrada is not None and entrada[0] > ahora:
+            return entrada[1]
+
+        validador = ValidadorEncuesta.compilar(db, id_encuesta)
+        with self._lock:
+            self._entradas[id_encuesta] = (ahora + self.ttl_segundos, validador)
+            self.compilaciones += 1
+        return validador
+
+    def invalidar(self, id_encuesta: Optional[int] = None):
+        with self._lock:
+            if id_encuesta is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(id_encuesta, None)
+
+
+# Instancia única por proceso
+cache_validadores = CacheValidadores()
@@ -1,4 +1,5 @@
 # apply_schema_update.py
+import re
 from sqlalchemy import text
 from app.database import SesionLocal
 import sys
@@ -6,15 +7,29 @@ import sys
 # Encoding safe output
 sys.stdout.reconfigure(encoding='utf-8')
 
-def apply_update():
-    print("Iniciando actualización de esquema...")
+def dividir_sentencias(script: str):
+    """Separa por ';' salvo dentro de cuerpos $$ ... $$ (funciones plpgsql)."""
+    sentencias, actual, en_cuerpo = [], [], False
+    for parte in re.split(r"(\$\$|;)", script):
+        if parte == "$$":
+            en_cuerpo = not en_cuerpo
+        if parte == ";" and not en_cuerpo:
+            sentencias.append("".join(actual).strip())
+            actual = []
+        else:
+            actual.append(parte)
+    sentencias.append("".join(actual).strip())
+    return [s for s in sentencias if s]
+
+def apply_update(archivo: str = "update_schema_2.sql"):
+    print(f"Iniciando actualización de esquema ({archivo})...")
     try:
         db = SesionLocal()
-        with open("update_schema_2.sql", "r") as f:
+        with open(archivo, "r", encoding="utf-8") as f:
             sql_script = f.read()
         
         # Split by statements if needed, but text() might handle it or we exec one by one
-        statements = [s.strip() for s in sql_script.split(';') if s.strip()]
+        statements = dividir_sentencias(sql_script)
         
         for stmt in statements:
             print(f"Ejecutando: {stmt[:50]}...")
@@ -30,4 +45,4 @@ def apply_update():
         db.close()
 
 if __name__ == "__main__":
-    apply_update()
+    apply_update(*sys.argv[1:2])
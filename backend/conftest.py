@@ -64,6 +64,19 @@ def setup_databases():
                 periodo TEXT
             )
         """))
+
+        # 4. Registro de cambios (en PostgreSQL lo hacen los triggers de update_schema_4.sql).
+        # Solo un trigger TEMP puede escribir en otra base adjunta
+        for tabla, alumno in (("inscripciones", "NEW.id_alumno"), ("oferta_academica", "NULL")):
+            for evento in ("INSERT", "UPDATE"):
+                connection.execute(text(f"""
+                    CREATE TEMP TRIGGER tr_cambio_{tabla}_{evento.lower()} AFTER {evento} ON sapientia.{tabla}
+                    BEGIN
+                        INSERT INTO cambio_inscripcion (id_transaccion, id_alumno, cod_asignatura, seccion)
+                        VALUES ((SELECT COALESCE(MAX(id_transaccion), 0) + 1 FROM cambio_inscripcion),
+                                {alumno}, NEW.cod_asignatura, NEW.seccion);
+                    END
+                """))
         connection.commit()
 
 # =============================================================================
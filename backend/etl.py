@@ -61,6 +61,40 @@ def cargar_dimension(conn, df_source, table_name, schema, key_cols, id_col):
     
     return df_final
 
+def cargar_contextos(conn, ids_contexto):
+    """
+    Lee de contexto_asignacion solo los contextos referenciados por el lote y los
+    normaliza una vez por contexto (no una vez por respuesta).
+    """
+    ids = sorted({int(i) for i in ids_contexto.dropna()})
+    if not ids:
+        return pd.DataFrame({'id_contexto': pd.Series(dtype='float64')})
+    filas = conn.execute(
+        text("SELECT id, metadatos FROM encuestas_oltp.contexto_asignacion WHERE id = ANY(:ids)"),
+        {"ids": ids}
+    ).fetchall()
+    df_ctx = pd.json_normalize([fila.metadatos for fila in filas])
+    df_ctx['id_contexto'] = [float(fila.id) for fila in filas]
+    return df_ctx
+
+def combinar_contexto(df_meta, df_ctx):
+    """
+    Completa los metadatos del envío con los del contexto académico, con el mismo
+    criterio que RespuestasServicio.construir_contexto: 'docente' y 'materia' del
+    contexto pisan 'profesor' y 'asignatura'; el resto solo completa lo que falta.
+    """
+    ctx = df_meta[['id_contexto']].merge(df_ctx, on='id_contexto', how='left')
+    ctx.index = df_meta.index
+    if 'docente' in ctx.columns:
+        df_meta['profesor'] = ctx['docente'].combine_first(df_meta['profesor']) if 'profesor' in df_meta.columns else ctx['docente']
+    if 'materia' in ctx.columns:
+        df_meta['asignatura'] = ctx['materia'].combine_first(df_meta['asignatura']) if 'asignatura' in df_meta.columns else ctx['materia']
+    for col in ctx.columns:
+        if col == 'id_contexto':
+            continue
+        df_meta[col] = df_meta[col].combine_first(ctx[col]) if col in df_meta.columns else ctx[col]
+    return df_meta
+
 def ejecutar_etl():
     print("Iniciando proceso ETL Masivo (Batch)...")
     
@@ -77,6 +111,7 @@ def ejecutar_etl():
                 t.id_transaccion,
                 t.fecha_finalizacion,
                 t.metadatos_contexto,
+                t.id_contexto,
                 r.valor_respuesta,
                 p.texto_pregunta,
                 p.tipo as tipo_pregunta,
@@ -102,14 +137,21 @@ def ejecutar_etl():
         
         # A. Normalizar Metadatos JSON (Expandir columnas)
         # Convertimos la columna JSON en columnas de dataframe: facultad, carrera, etc.
-        df_meta = pd.json_normalize(df['metadatos_contexto'])
+        # Una vez por transacción (no por respuesta); el contexto académico se lee de
+        # contexto_asignacion por id_contexto (transacciones previas lo traen en el JSON).
+        df_trans = df.drop_duplicates('id_transaccion')
+        df_meta = pd.json_normalize(df_trans['metadatos_contexto'].tolist())
+        df_meta['id_transaccion'] = df_trans['id_transaccion'].values
+        df_meta['id_contexto'] = pd.to_numeric(df_trans['id_contexto'].values, errors='coerce')
+        df_ctx = cargar_contextos(conn, df_meta['id_contexto'])
+        df_meta = combinar_contexto(df_meta, df_ctx).drop(columns=['id_contexto'])
         # Aseguramos que existan las columnas aunque el JSON venga vacío
         for col in ['facultad', 'carrera', 'campus', 'profesor', 'asignatura', 'semestre']:
             if col not in df_meta.columns:
                 df_meta[col] = "Desconocido"
         
         # Unimos metadatos al dataframe principal
-        df = df.join(df_meta).fillna("Desconocido")
+        df = df.drop(columns=['metadatos_contexto', 'id_contexto']).merge(df_meta, on='id_transaccion', how='left').fillna("Desconocido")
 
         # B. Preparar datos de Tiempo
         df['fecha_dt'] = pd.to_datetime(df['fecha_finalizacion'])
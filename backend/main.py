@@ -2,9 +2,12 @@ from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from app.database import obtener_bd, motor, Base
+from app.database import obtener_bd, motor, Base, SesionLocal
 from app import modelos
 from app.routers import auth, admin, sapientia, reportes, permisos, plantillas, admin_tecnico, reportes_avanzados
+from app.servicios import ingesta_respuestas, commit_grupal, republicacion_incremental
+from app.servicios.buffer_borradores import buffer_borradores
+from app.servicios.publicacion_segundo_plano import publicacion_segundo_plano
 import os
 from datetime import datetime
 
@@ -35,6 +38,32 @@ app.include_router(plantillas.router)
 
 app.include_router(admin_tecnico.router)
 
+# Trabajadores en segundo plano (opcionales, configurados por variables de entorno)
+trabajador_ingesta = ingesta_respuestas.TrabajadorIngesta(SesionLocal)
+trabajador_republicacion = republicacion_incremental.TrabajadorRepublicacion(SesionLocal)
+
+@app.on_event("startup")
+def iniciar_trabajadores():
+    if ingesta_respuestas.INGESTA_ASINCRONA_HABILITADA:
+        trabajador_ingesta.iniciar()
+    if commit_grupal.COMMIT_GRUPAL_HABILITADO:
+        commit_grupal.commit_grupal.iniciar()
+    if buffer_borradores.habilitado:
+        buffer_borradores.iniciar()
+    if republicacion_incremental.REPUBLICACION_INTERVALO_SEGUNDOS > 0:
+        trabajador_republicacion.iniciar()
+    # Reanuda publicaciones interrumpidas por un reinicio o la caída de otro proceso
+    publicacion_segundo_plano.iniciar()
+
+@app.on_event("shutdown")
+def detener_trabajadores():
+    trabajador_ingesta.detener()
+    commit_grupal.commit_grupal.detener()
+    # Persiste los borradores que quedaron solo en memoria
+    buffer_borradores.detener()
+    publicacion_segundo_plano.detener()
+    trabajador_republicacion.detener()
+
 @app.get("/")
 def leer_raiz():
     return {"mensaje": "El Sistema está en línea"}
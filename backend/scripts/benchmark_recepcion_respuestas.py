@@ -0,0 +1,100 @@
+"""
+Benchmark de CU07 (recepción de respuestas): reporta envíos por segundo.
+
+Uso:
+    python scripts/benchmark_recepcion_respuestas.py --id-encuesta 12 --envios 2000
+
+Por defecto cada envío se revierte (rollback) para no ensuciar la BD; con
+--commit se confirma cada envío, que es lo que mide el costo real del fsync.
+"""
+import sys
+import os
+import time
+import random
+import argparse
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SesionLocal
+from app import modelos, schemas
+from app.servicios.respuestas_servicio import RespuestasServicio
+
+
+def construir_envio(id_encuesta: int, id_usuario: int, preguntas) -> schemas.EnvioRespuestasAlumno:
+    respuestas = []
+    for preg in preguntas:
+        if preg.tipo == modelos.TipoPregunta.seccion:
+            continue
+        if preg.tipo in (modelos.TipoPregunta.opcion_unica, modelos.TipoPregunta.opcion_multiple):
+            if not preg.opciones:
+                continue
+            cantidad = 1
+            if preg.tipo == modelos.TipoPregunta.opcion_multiple:
+                cantidad = random.randint(1, len(preg.opciones))
+            for opcion in random.sample(preg.opciones, cantidad):
+                respuestas.append(schemas.RespuestaIndividual(
+                    id_pregunta=preg.id, valor_respuesta=opcion.texto_opcion, id_opcion=opcion.id
+                ))
+        elif preg.tipo == modelos.TipoPregunta.matriz:
+            # Como VistaPreviaEncuesta: una respuesta de texto por fila, sin id_opcion
+            configuracion = preg.configuracion_json or {}
+            columnas = len(configuracion.get("columnas") or []) or 1
+            for fila in range(len(configuracion.get("filas") or [])):
+                respuestas.append(schemas.RespuestaIndividual(
+                    id_pregunta=preg.id, valor_respuesta=f"Fila {fila} - Columna {random.randrange(columnas)}"
+                ))
+        else:
+            respuestas.append(schemas.RespuestaIndividual(
+                id_pregunta=preg.id, valor_respuesta=f"Respuesta benchmark {random.randint(1000, 9999)}"
+            ))
+    return schemas.EnvioRespuestasAlumno(
+        id_usuario=id_usuario,
+        id_encuesta=id_encuesta,
+        id_referencia_contexto=f"BENCH-{id_usuario}",
+        metadatos_contexto={"origen_benchmark": True},
+        respuestas=respuestas
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de recepción de respuestas (CU07)")
+    parser.add_argument("--id-encuesta", type=int, required=True)
+    parser.add_argument("--envios", type=int, default=1000)
+    parser.add_argument("--commit", action="store_true", help="Confirmar cada envío en lugar de revertirlo")
+    args = parser.parse_args()
+
+    db = SesionLocal()
+    try:
+        preguntas = db.query(modelos.Pregunta).filter(modelos.Pregunta.id_encuesta == args.id_encuesta).all()
+        if not preguntas:
+            print(f"ERROR: La encuesta {args.id_encuesta} no tiene preguntas")
+            return
+
+        envios = [
+            construir_envio(args.id_encuesta, 900000000 + i, preguntas)
+            for i in range(args.envios)
+        ]
+        total_respuestas = sum(len(e.respuestas) for e in envios)
+
+        inicio = time.perf_counter()
+        for envio in envios:
+            RespuestasServicio.validar_preguntas(db, envio)
+            RespuestasServicio.persistir_envio(db, envio)
+            if args.commit:
+                db.commit()
+            else:
+                db.rollback()
+        duracion = time.perf_counter() - inicio
+
+        print(f"Envíos: {args.envios} ({total_respuestas} respuestas, {len(preguntas)} preguntas/encuesta)")
+        print(f"Modo: {'commit' if args.commit else 'rollback'}")
+        print(f"Duración: {duracion:.2f} s")
+        print(f"Envíos/s: {args.envios / duracion:.1f}")
+        print(f"Respuestas/s: {total_respuestas / duracion:.1f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import pytest
+from app import modelos
+from app.modelos import UsuarioAdmin, RolAdmin
+from app.servicios.cache_estado import CacheEstadoBloqueo, cache_estado_bloqueo
+
+
+@pytest.fixture
+def auth_override(client):
+    from main import app
+    from app.routers.auth import obtener_usuario_actual
+    from app.routers.admin import solo_administradores
+    mock_admin = UsuarioAdmin(id_admin=1, nombre_usuario="admin", rol=RolAdmin.ADMINISTRADOR)
+    app.dependency_overrides[obtener_usuario_actual] = lambda: mock_admin
+    app.dependency_overrides[solo_administradores] = lambda: mock_admin
+    cache_estado_bloqueo.invalidar_todo()
+    yield
+    cache_estado_bloqueo.invalidar_todo()
+
+
+def test_cache_guarda_resultados_negativos_y_cuenta():
+    cache = CacheEstadoBloqueo(ttl_segundos=60)
+    assert cache.obtener(1) == (False, None, None)
+    cache.guardar(1, None, None)
+    assert cache.obtener(1) == (True, None, None)
+
+    metricas = cache.metricas()
+    assert metricas["aciertos"] == 1
+    assert metricas["fallos"] == 1
+
+
+def test_cache_descarta_lectura_previa_a_invalidacion():
+    cache = CacheEstadoBloqueo(ttl_segundos=60)
+    generacion = cache.generacion()
+    cache.invalidar(7)
+    cache.guardar(7, 3, "Encuesta vieja", generacion)
+    assert cache.obtener(7)[0] is False
+
+
+def test_cache_expira_por_ttl():
+    cache = CacheEstadoBloqueo(ttl_segundos=0)
+    cache.guardar(5, 1, "E")
+    assert cache.obtener(5)[0] is False
+
+
+def test_verificar_estado_usa_cache_e_invalida_al_finalizar(client, bd, auth_override):
+    encuesta = modelos.Encuesta(
+        nombre="Obligatoria", fecha_inicio=modelos.datetime(2025, 1, 1), fecha_fin=modelos.datetime(2025, 12, 31),
+        prioridad=modelos.PrioridadEncuesta.obligatoria, estado=modelos.EstadoEncuesta.en_curso,
+        activo=True, usuario_creacion=1
+    )
+    bd.add(encuesta)
+    bd.flush()
+    bd.add(modelos.AsignacionUsuario(id_usuario=500, id_encuesta=encuesta.id, estado=modelos.EstadoAsignacion.pendiente))
+    bd.commit()
+
+    r1 = client.post("/sapientia/verificar-estado", params={"id_alumno": 500})
+    r2 = client.post("/sapientia/verificar-estado", params={"id_alumno": 500})
+    assert r1.json()["estado_bloqueo"] is True
+    assert r2.json() == r1.json()
+    assert cache_estado_bloqueo.metricas()["aciertos"] >= 1
+
+    assert client.post(f"/admin/encuestas/{encuesta.id}/finalizar").status_code == 200
+
+    r3 = client.post("/sapientia/verificar-estado", params={"id_alumno": 500})
+    assert r3.json()["estado_bloqueo"] is False
+
+
+def test_verificar_estado_lote(client, bd, auth_override):
+    encuesta = modelos.Encuesta(
+        nombre="Obligatoria Lote", fecha_inicio=modelos.datetime(2025, 1, 1), fecha_fin=modelos.datetime(2025, 12, 31),
+        prioridad=modelos.PrioridadEncuesta.obligatoria, estado=modelos.EstadoEncuesta.en_curso,
+        activo=True, usuario_creacion=1
+    )
+    bd.add(encuesta)
+    bd.flush()
+    bd.add(modelos.AsignacionUsuario(id_usuario=600, id_encuesta=encuesta.id, estado=modelos.EstadoAsignacion.pendiente))
+    bd.add(modelos.AsignacionUsuario(id_usuario=601, id_encuesta=encuesta.id, estado=modelos.EstadoAsignacion.realizada))
+    bd.commit()
+
+    res = client.post("/sapientia/verificar-estado/lote", json={"ids_alumnos": [600, 601, 602, 600]})
+    assert res.status_code == 200
+    resultados = res.json()["resultados"]
+    assert [r["id_alumno"] for r in resultados] == [600, 601, 602]
+    assert [r["estado_bloqueo"] for r in resultados] == [True, False, False]
+    assert resultados[0]["id_encuesta_pendiente"] == encuesta.id
+
+    # La verificación individual debe coincidir (y ahora sale del cache)
+    individual = client.post("/sapientia/verificar-estado", params={"id_alumno": 600}).json()
+    assert individual["id_encuesta_pendiente"] == encuesta.id
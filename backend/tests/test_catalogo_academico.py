@@ -0,0 +1,127 @@
+from app.modelos import UsuarioAdmin, RolAdmin
+from app.servicios.catalogo_academico import catalogo_academico, SnapshotCatalogo
+import pytest
+
+
+@pytest.fixture
+def auth_override(client):
+    from main import app
+    from app.routers.auth import obtener_usuario_actual
+    app.dependency_overrides[obtener_usuario_actual] = lambda: UsuarioAdmin(id_admin=1, nombre_usuario="admin", rol=RolAdmin.ADMINISTRADOR)
+    catalogo_academico.invalidar()
+    yield
+    catalogo_academico.invalidar()
+
+
+def test_snapshot_filtra_como_las_consultas():
+    snapshot = SnapshotCatalogo([
+        ("Central", "Ingenieria", "Informatica", "PROG-101", "Programacion I", "B", "Profesor Y"),
+        ("Central", "Ingenieria", "Ciencias Basicas", "MAT-101", "Matematicas I", "A", "Profesor X"),
+        ("Central", "Ingenieria", "Ciencias Basicas", "MAT-101", "Matematicas I", "B", None),
+        ("Norte", "Derecho", None, "DER-1", "Derecho I", "A", "Profesor Z"),
+    ])
+    assert snapshot.campus() == ["Central", "Norte"]
+    assert snapshot.facultades("Norte") == ["Derecho"]
+    assert snapshot.departamentos(facultad="Ingenieria") == ["Ciencias Basicas", "Informatica"]
+    assert snapshot.docentes(campus="Central") == ["Profesor X", "Profesor Y"]
+    assert [a["seccion"] for a in snapshot.asignaturas(departamento="Ciencias Basicas")] == ["A", "B"]
+    assert snapshot.asignaturas(docente="Profesor Y") == [{"codigo": "PROG-101", "nombre": "Programacion I", "seccion": "B"}]
+    assert snapshot.asignaturas_etiquetas() == ["Derecho I (DER-1)", "Matematicas I (MAT-101)", "Programacion I (PROG-101)"]
+
+
+def test_memo_del_snapshot_acotado(monkeypatch):
+    from app.servicios import catalogo_academico as modulo
+    monkeypatch.setattr(modulo, "CATALOGO_MEMO_MAX_ENTRADAS", 3)
+    snapshot = SnapshotCatalogo([("Central", "Ingenieria", "Informatica", "P-1", "Prog", "A", "Doc")])
+    for i in range(10):
+        assert snapshot.docentes(campus=f"inexistente-{i}") == []
+    assert len(snapshot._memo) == 3
+    assert snapshot.docentes(campus="Central") == ["Doc"]
+
+
+def test_endpoints_de_catalogo_usan_snapshot(client, bd, auth_override, sapientia_data):
+    assert client.get("/sapientia/campus").json() == ["Central"]
+    assert client.get("/sapientia/departamentos", params={"facultad": "Ingenieria"}).json() == ["Ciencias Basicas", "Informatica"]
+    assert client.get("/sapientia/catalogos/docente").json() == ["Profesor X", "Profesor Y"]
+    cargas = catalogo_academico.cargas
+    assert client.get("/sapientia/asignaturas", params={"docente": "Profesor X"}).json()[0]["codigo"] == "MAT-101"
+    assert catalogo_academico.cargas == cargas
+
+
+def test_recarga_sin_cambios_conserva_el_snapshot(bd, sapientia_data):
+    from sqlalchemy import text
+    from app.servicios.catalogo_academico import CatalogoAcademico
+
+    catalogo = CatalogoAcademico(refresco_segundos=0)
+    anterior = catalogo.refrescar(bd)
+    # Misma versión: mismo snapshot y misma fecha_carga (Last-Modified)
+    assert catalogo.refrescar(bd) is anterior
+    bd.execute(text("UPDATE sapientia.oferta_academica SET docente = 'Profesor Z' WHERE id_docente = 11"))
+    nuevo = catalogo.refrescar(bd)
+    assert nuevo is not anterior and nuevo.version != anterior.version
+    assert catalogo.cargas == 3
+
+
+def test_autocompletado_por_prefijo_sin_acentos():
+    snapshot = SnapshotCatalogo([
+        ("Central", "Ingenieria", "Informatica", "PROG-101", "Programación I", "B", "María Gómez"),
+        ("Central", "Ingenieria", "Informatica", "PROG-101", "Programación I", "A", "Marcos Peña"),
+        ("Norte", "Derecho", "Privado", "DER-1", "Derecho Romano", "A", "Mario Gomez Ruiz"),
+    ])
+    docentes = snapshot.indice("docente")
+    assert [d["nombre"] for d in docentes.buscar("gom")] == ["María Gómez", "Mario Gomez Ruiz"]
+    assert [d["nombre"] for d in docentes.buscar("MAR gó")] == ["María Gómez", "Mario Gomez Ruiz"]
+    assert [d["nombre"] for d in docentes.buscar("mar", campus="Norte")] == ["Mario Gomez Ruiz"]
+    assert docentes.buscar("gom", limite=1) == [{"nombre": "María Gómez"}]
+
+    asignaturas = snapshot.indice("asignatura")
+    assert asignaturas.buscar("progra") == [{"codigo": "PROG-101", "nombre": "Programación I", "secciones": ["A", "B"]}]
+    assert asignaturas.buscar("der-1")[0]["codigo"] == "DER-1"
+    assert asignaturas.buscar("xyz") == []
+
+
+def test_endpoint_autocompletar(client, bd, auth_override, sapientia_data):
+    res = client.get("/sapientia/autocompletar/docente", params={"q": "prof y"})
+    assert res.json() == [{"nombre": "Profesor Y"}]
+    assert client.get("/sapientia/autocompletar/campus", params={"q": "c"}).status_code == 400
+
+
+def test_catalogo_http_condicional_y_gzip(client, bd, auth_override, sapientia_data, monkeypatch):
+    from app.servicios import respuesta_condicional
+    monkeypatch.setattr(respuesta_condicional, "CATALOGO_GZIP_MIN_BYTES", 10)
+
+    res = client.get("/sapientia/docentes")
+    assert res.status_code == 200
+    assert res.json() == ["Profesor X", "Profesor Y"]
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["cache-control"] == "private, no-cache"
+    assert "Authorization" in res.headers["vary"]
+    etag = res.headers["etag"]
+
+    assert client.get("/sapientia/docentes", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/sapientia/docentes", headers={"If-Modified-Since": res.headers["last-modified"]}).status_code == 304
+
+    # Otra versión de la oferta invalida el ETag
+    from sqlalchemy import text
+    bd.execute(text("INSERT INTO sapientia.oferta_academica (docente, campus) VALUES ('Profesor Z', 'Norte')"))
+    bd.commit()
+    catalogo_academico.invalidar()
+    nueva = client.get("/sapientia/docentes", headers={"If-None-Match": etag})
+    assert nueva.status_code == 200
+    assert nueva.headers["etag"] != etag
+
+
+def test_nomina_varias_secciones_paginada(client, bd, auth_override, sapientia_data):
+    cuerpo = {
+        "secciones": [{"cod_asignatura": "MAT-101", "seccion": "A"}, {"cod_asignatura": "PROG-101", "seccion": "B"}],
+        "tamano_pagina": 2
+    }
+    pagina1 = client.post("/sapientia/alumnos/nomina", json=cuerpo).json()
+    assert [(a["id"], a["cod_asignatura"]) for a in pagina1["alumnos"]] == [(100, "MAT-101"), (100, "PROG-101")]
+    assert pagina1["siguiente_token"]
+
+    pagina2 = client.post("/sapientia/alumnos/nomina", json={**cuerpo, "token": pagina1["siguiente_token"]}).json()
+    assert [(a["id"], a["cod_asignatura"]) for a in pagina2["alumnos"]] == [(101, "MAT-101")]
+    assert pagina2["siguiente_token"] is None
+
+    assert client.post("/sapientia/alumnos/nomina", json={**cuerpo, "token": "xx"}).status_code == 400
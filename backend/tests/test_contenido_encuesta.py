@@ -0,0 +1,65 @@
+import pytest
+from app.modelos import UsuarioAdmin, RolAdmin
+
+
+@pytest.fixture
+def admin_auth_override(client):
+    from main import app
+    from app.routers.admin import solo_administradores, obtener_usuario_actual as usuario_admin
+    from app.routers.auth import obtener_usuario_actual
+    mock_admin = UsuarioAdmin(id_admin=1, nombre_usuario="admin", rol=RolAdmin.ADMINISTRADOR)
+    app.dependency_overrides[solo_administradores] = lambda: mock_admin
+    app.dependency_overrides[usuario_admin] = lambda: mock_admin
+    app.dependency_overrides[obtener_usuario_actual] = lambda: mock_admin
+    yield
+
+
+def _payload(texto_pregunta):
+    return {
+        "nombre": "Encuesta Contenido",
+        "fecha_inicio": "2025-01-01T00:00:00",
+        "fecha_fin": "2025-12-31T23:59:59",
+        "prioridad": "opcional",
+        "acciones_disparadoras": [],
+        "reglas": [{"publico_objetivo": "docentes"}],
+        "preguntas": [
+            {
+                "texto_pregunta": texto_pregunta,
+                "orden": 1,
+                "tipo": "opcion_unica",
+                "opciones": [{"texto_opcion": "No", "orden": 2}, {"texto_opcion": "Si", "orden": 1}],
+                "activo": True
+            }
+        ]
+    }
+
+
+def test_contenido_encuesta_etag_y_304(client, bd, admin_auth_override):
+    res = client.post("/admin/encuestas/", json=_payload("¿Pregunta original?"))
+    id_encuesta = res.json()["id"]
+
+    # En borrador no se expone al alumno
+    assert client.get(f"/sapientia/encuestas/{id_encuesta}/contenido").status_code == 404
+
+    assert client.post(f"/admin/encuestas/{id_encuesta}/publicar").status_code == 200
+
+    r1 = client.get(f"/sapientia/encuestas/{id_encuesta}/contenido")
+    assert r1.status_code == 200
+    etag = r1.headers["etag"]
+    data = r1.json()
+    assert data["preguntas"][0]["texto_pregunta"] == "¿Pregunta original?"
+    assert [o["texto_opcion"] for o in data["preguntas"][0]["opciones"]] == ["Si", "No"]
+    assert "reglas" not in data
+
+    r2 = client.get(f"/sapientia/encuestas/{id_encuesta}/contenido", headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+
+    # Una edición invalida el contenido y cambia el ETag
+    payload_update = _payload("¿Pregunta editada?")
+    payload_update["estado"] = "en_curso"
+    assert client.put(f"/admin/encuestas/{id_encuesta}", json=payload_update).status_code == 200
+
+    r3 = client.get(f"/sapientia/encuestas/{id_encuesta}/contenido", headers={"If-None-Match": etag})
+    assert r3.status_code == 200
+    assert r3.headers["etag"] != etag
+    assert r3.json()["preguntas"][0]["texto_pregunta"] == "¿Pregunta editada?"
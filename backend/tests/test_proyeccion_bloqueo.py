@@ -0,0 +1,59 @@
+from datetime import datetime
+from app import modelos
+from app.servicios.proyeccion_bloqueo import ProyeccionBloqueo
+
+
+def _crear_encuesta(bd, nombre, prioridad=modelos.PrioridadEncuesta.obligatoria, estado=modelos.EstadoEncuesta.en_curso):
+    encuesta = modelos.Encuesta(
+        nombre=nombre, fecha_inicio=datetime(2025, 1, 1), fecha_fin=datetime(2025, 12, 31),
+        prioridad=prioridad, estado=estado, activo=True, usuario_creacion=1
+    )
+    bd.add(encuesta)
+    bd.flush()
+    return encuesta
+
+
+def test_reconstruir_y_consultar(bd):
+    e1 = _crear_encuesta(bd, "Obligatoria A")
+    e2 = _crear_encuesta(bd, "Obligatoria B")
+    opcional = _crear_encuesta(bd, "Opcional", prioridad=modelos.PrioridadEncuesta.opcional)
+    bd.add_all([
+        modelos.AsignacionUsuario(id_usuario=700, id_encuesta=e2.id, estado=modelos.EstadoAsignacion.pendiente),
+        modelos.AsignacionUsuario(id_usuario=700, id_encuesta=e1.id, estado=modelos.EstadoAsignacion.pendiente),
+        modelos.AsignacionUsuario(id_usuario=701, id_encuesta=opcional.id, estado=modelos.EstadoAsignacion.pendiente),
+        modelos.AsignacionUsuario(id_usuario=702, id_encuesta=e1.id, estado=modelos.EstadoAsignacion.realizada),
+    ])
+    bd.flush()
+
+    assert ProyeccionBloqueo.reconstruir(bd) == 1
+    assert ProyeccionBloqueo.consultar(bd, 700) == (e1.id, "Obligatoria A")
+    assert ProyeccionBloqueo.consultar(bd, 701) == (None, None)
+    assert ProyeccionBloqueo.verificar_consistencia(bd)["consistente"] is True
+
+
+def test_recalcular_tras_cambios(bd):
+    e1 = _crear_encuesta(bd, "Obligatoria A")
+    e2 = _crear_encuesta(bd, "Obligatoria B")
+    a1 = modelos.AsignacionUsuario(id_usuario=710, id_encuesta=e1.id, estado=modelos.EstadoAsignacion.pendiente)
+    bd.add_all([a1, modelos.AsignacionUsuario(id_usuario=710, id_encuesta=e2.id, estado=modelos.EstadoAsignacion.pendiente)])
+    bd.flush()
+    ProyeccionBloqueo.reconstruir(bd)
+
+    # El alumno responde la primera: pasa a bloquearlo la segunda
+    a1.estado = modelos.EstadoAsignacion.realizada
+    bd.flush()
+    ProyeccionBloqueo.recalcular_alumnos(bd, [710])
+    assert ProyeccionBloqueo.consultar(bd, 710) == (e2.id, "Obligatoria B")
+
+    # Al finalizar la segunda deja de estar bloqueado
+    e2.estado = modelos.EstadoEncuesta.finalizado
+    bd.flush()
+    ProyeccionBloqueo.recalcular_encuesta(bd, e2.id)
+    assert ProyeccionBloqueo.consultar(bd, 710) == (None, None)
+
+    # Una inconsistencia introducida a mano es detectada
+    bd.add(modelos.BloqueoPendiente(id_usuario=999, id_encuesta=e1.id, nombre_encuesta="X"))
+    bd.flush()
+    resultado = ProyeccionBloqueo.verificar_consistencia(bd)
+    assert resultado["consistente"] is False
+    assert resultado["sobrantes"] == 1
@@ -0,0 +1,352 @@
+from datetime import datetime
+import pytest
+from app import modelos
+from app.modelos import UsuarioAdmin, RolAdmin
+
+
+@pytest.fixture
+def admin_override(client):
+    from main import app
+    from app.routers.admin import solo_administradores, obtener_usuario_actual
+    mock_admin = UsuarioAdmin(id_admin=1, nombre_usuario="admin", rol=RolAdmin.ADMINISTRADOR)
+    app.dependency_overrides[solo_administradores] = lambda: mock_admin
+    app.dependency_overrides[obtener_usuario_actual] = lambda: mock_admin
+    yield
+
+
+@pytest.fixture
+def encuesta_borrador(bd):
+    encuesta = modelos.Encuesta(
+        nombre="General", fecha_inicio=datetime(2025, 1, 1), fecha_fin=datetime(2025, 12, 31),
+        prioridad=modelos.PrioridadEncuesta.opcional, estado=modelos.EstadoEncuesta.borrador,
+        activo=True, usuario_creacion=1
+    )
+    bd.add(encuesta)
+    bd.commit()
+    return encuesta
+
+
+def test_importar_asignaciones_ignora_duplicadas(client, bd, admin_override, encuesta_borrador):
+    filas = [
+        {"id_usuario": 1, "id_referencia_contexto": "X-1", "metadatos_asignacion": {"materia": "A"}},
+        {"id_usuario": 2, "id_referencia_contexto": "X-1"},
+        {"id_usuario": 1, "id_referencia_contexto": "X-1"},
+    ]
+    res = client.post(f"/admin/encuestas/{encuesta_borrador.id}/asignaciones/importar", json=filas)
+    assert res.status_code == 200, res.text
+    assert res.json()["filas_leidas"] == 3
+    assert res.json()["filas_insertadas"] == 2
+    # Repetidas dentro de la carga: se conserva la primera
+    primera = bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_borrador.id, id_usuario=1).one()
+    contexto = bd.get(modelos.ContextoAsignacion, primera.id_contexto)
+    assert contexto.metadatos == {"materia": "A"} and primera.metadatos_asignacion is None
+    # Misma referencia sin metadatos: no hereda los de la primera fila
+    segunda = bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_borrador.id, id_usuario=2).one()
+    assert segunda.id_contexto != primera.id_contexto
+    assert bd.get(modelos.ContextoAsignacion, segunda.id_contexto).metadatos == {}
+    assert primera.estado == modelos.EstadoAsignacion.pendiente and primera.fecha_asignacion is not None
+
+    res = client.post(f"/admin/encuestas/{encuesta_borrador.id}/asignaciones/importar", json=filas[:2])
+    assert res.json()["filas_insertadas"] == 0
+    assert bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_borrador.id).count() == 2
+
+
+def test_contextos_distintos_para_la_misma_referencia(client, bd, admin_override, encuesta_borrador):
+    otra = modelos.Encuesta(
+        nombre="General 2025-2", fecha_inicio=datetime(2025, 7, 1), fecha_fin=datetime(2025, 12, 31),
+        prioridad=modelos.PrioridadEncuesta.opcional, estado=modelos.EstadoEncuesta.borrador,
+        activo=True, usuario_creacion=1
+    )
+    bd.add(otra)
+    bd.commit()
+    primer_semestre = [{"id_usuario": 1, "id_referencia_contexto": "X-1", "metadatos_asignacion": {"materia": "A", "semestre": "2025-1"}}]
+    segundo_semestre = [{"id_usuario": 1, "id_referencia_contexto": "X-1", "metadatos_asignacion": {"semestre": "2025-2", "materia": "B"}}]
+    for encuesta, filas in ((encuesta_borrador, primer_semestre), (otra, segundo_semestre)):
+        res = client.post(f"/admin/encuestas/{encuesta.id}/asignaciones/importar", json=filas)
+        assert res.json()["filas_insertadas"] == 1
+
+    primera = bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_borrador.id).one()
+    segunda = bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=otra.id).one()
+    assert bd.get(modelos.ContextoAsignacion, primera.id_contexto).metadatos == {"materia": "A", "semestre": "2025-1"}
+    assert bd.get(modelos.ContextoAsignacion, segunda.id_contexto).metadatos == {"materia": "B", "semestre": "2025-2"}
+
+    # Mismo contenido con otro orden de claves: reutiliza la entrada
+    res = client.post(f"/admin/encuestas/{otra.id}/asignaciones/importar", json=[
+        {"id_usuario": 2, "id_referencia_contexto": "X-1", "metadatos_asignacion": {"semestre": "2025-1", "materia": "A"}}
+    ])
+    assert res.json()["filas_insertadas"] == 1
+    tercera = bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=otra.id, id_usuario=2).one()
+    assert tercera.id_contexto == primera.id_contexto
+    assert bd.query(modelos.ContextoAsignacion).filter_by(id_referencia_contexto="X-1").count() == 2
+
+
+@pytest.fixture
+def encuesta_evaluacion(bd, sapientia_data):
+    encuesta = modelos.Encuesta(
+        nombre="Evaluación", fecha_inicio=datetime(2025, 1, 1), fecha_fin=datetime(2025, 12, 31),
+        prioridad=modelos.PrioridadEncuesta.evaluacion_docente, estado=modelos.EstadoEncuesta.borrador,
+        activo=True, usuario_creacion=1
+    )
+    encuesta.reglas.append(modelos.ReglaAsignacion(publico_objetivo=modelos.PublicoObjetivo.alumnos))
+    bd.add(encuesta)
+    bd.commit()
+    return encuesta
+
+
+def test_publicacion_segundo_plano_reanuda_desde_checkpoint(client, bd, admin_override, encuesta_evaluacion, monkeypatch):
+    from sqlalchemy.orm import Session
+    from app.servicios.encuesta_servicio import EncuestaServicio
+    from app.servicios.publicacion_segundo_plano import PublicacionSegundoPlano, publicacion_segundo_plano
+
+    monkeypatch.setattr(publicacion_segundo_plano, "lanzar", lambda id_trabajo: True)
+    res = client.post(f"/admin/encuestas/{encuesta_evaluacion.id}/publicar/segundo-plano")
+    assert res.status_code == 202, res.text
+    id_trabajo = res.json()["id"]
+    assert client.post(f"/admin/encuestas/{encuesta_evaluacion.id}/publicar/segundo-plano").status_code == 409
+
+    conexion = bd.connection()
+    ejecutor = PublicacionSegundoPlano(fabrica_sesiones=lambda: Session(bind=conexion, join_transaction_mode="create_savepoint"), tramo_alumnos=1)
+
+    # Falla en el segundo tramo (alumno 101): el primero queda confirmado
+    procesar_etapa = EncuestaServicio.procesar_etapa
+    def fallar_en_101(db, encuesta, etapa, batch_size=1000, rango_alumnos=None):
+        if rango_alumnos and rango_alumnos[1] == 101:
+            raise RuntimeError("caída simulada")
+        return procesar_etapa(db, encuesta, etapa, batch_size, rango_alumnos)
+    monkeypatch.setattr(EncuestaServicio, "procesar_etapa", staticmethod(fallar_en_101))
+    assert ejecutor.ejecutar(id_trabajo) == "error"
+
+    estado = client.get(f"/admin/publicaciones/{id_trabajo}").json()
+    assert estado["estado"] == "error"
+    assert (estado["procesados"], estado["insertadas"], estado["total_estimado"]) == (1, 2, 2)
+
+    monkeypatch.setattr(EncuestaServicio, "procesar_etapa", staticmethod(procesar_etapa))
+    assert client.post(f"/admin/publicaciones/{id_trabajo}/reanudar").json()["estado"] == "pendiente"
+    assert ejecutor.ejecutar(id_trabajo) == "completado"
+
+    bd.expire_all()
+    estado = client.get(f"/admin/publicaciones/{id_trabajo}").json()
+    assert (estado["estado"], estado["procesados"], estado["insertadas"]) == ("completado", 2, 3)
+    assert bd.get(modelos.Encuesta, encuesta_evaluacion.id).estado == modelos.EstadoEncuesta.en_curso
+    assert bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_evaluacion.id).count() == 3
+
+
+def test_publicacion_segundo_plano_no_repite_la_etapa_de_docentes(client, bd, admin_override, encuesta_borrador, sapientia_data, monkeypatch):
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from app.servicios.encuesta_servicio import EncuestaServicio
+    from app.servicios.publicacion_segundo_plano import PublicacionSegundoPlano, publicacion_segundo_plano
+
+    encuesta_borrador.reglas.append(modelos.ReglaAsignacion(publico_objetivo=modelos.PublicoObjetivo.docentes))
+    bd.commit()
+    monkeypatch.setattr(publicacion_segundo_plano, "lanzar", lambda id_trabajo: True)
+    id_trabajo = client.post(f"/admin/encuestas/{encuesta_borrador.id}/publicar/segundo-plano").json()["id"]
+
+    # Checkpoints confirmados con avance: el de docentes ya marca la etapa siguiente
+    checkpoints = []
+    conexion = bd.connection()
+    def fabrica():
+        sesion = Session(bind=conexion, join_transaction_mode="create_savepoint")
+        def registrar(s):
+            trabajo = s.identity_map.get(s.identity_key(modelos.TrabajoPublicacion, id_trabajo))
+            if trabajo is not None and trabajo.procesados and not checkpoints:
+                checkpoints.append((trabajo.etapa, trabajo.procesados))
+        event.listen(sesion, "before_commit", registrar)
+        return sesion
+    ejecutor = PublicacionSegundoPlano(fabrica_sesiones=fabrica)
+
+    marcar_publicada = EncuestaServicio.marcar_publicada
+    def fallar(*args, **kwargs):
+        raise RuntimeError("caída simulada")
+    monkeypatch.setattr(EncuestaServicio, "marcar_publicada", staticmethod(fallar))
+    assert ejecutor.ejecutar(id_trabajo) == "error"
+    assert checkpoints == [("finalizar", 2)]
+
+    monkeypatch.setattr(EncuestaServicio, "marcar_publicada", staticmethod(marcar_publicada))
+    client.post(f"/admin/publicaciones/{id_trabajo}/reanudar")
+    assert ejecutor.ejecutar(id_trabajo) == "completado"
+    bd.expire_all()
+    estado = client.get(f"/admin/publicaciones/{id_trabajo}").json()
+    assert (estado["procesados"], estado["insertadas"], estado["total_estimado"]) == (2, 2, 2)
+
+
+def test_publicacion_segundo_plano_cancelar(client, bd, admin_override, encuesta_evaluacion, monkeypatch):
+    from app.servicios.publicacion_segundo_plano import publicacion_segundo_plano
+
+    monkeypatch.setattr(publicacion_segundo_plano, "lanzar", lambda id_trabajo: True)
+    id_trabajo = client.post(f"/admin/encuestas/{encuesta_evaluacion.id}/publicar/segundo-plano").json()["id"]
+    res = client.post(f"/admin/publicaciones/{id_trabajo}/cancelar")
+    assert res.json()["estado"] == "cancelado"
+    assert client.post(f"/admin/publicaciones/{id_trabajo}/cancelar").status_code == 400
+    assert bd.get(modelos.Encuesta, encuesta_evaluacion.id).estado == modelos.EstadoEncuesta.borrador
+
+
+def test_particiones_cubren_todos_los_alumnos_una_vez(bd, encuesta_evaluacion):
+    from app.servicios.encuesta_servicio import EncuestaServicio, ETAPA_EVALUACION_DOCENTE
+    from app.servicios.publicacion_paralela import PublicacionParalela
+
+    sesiones = []
+    class SesionPrueba:
+        def __init__(self):
+            self.confirmada = False
+            sesiones.append(self)
+        def commit(self):
+            self.confirmada = True
+        def rollback(self):
+            pass
+        def close(self):
+            pass
+
+    # Las particiones corren en hilos; con SQLite se insertan desde la sesión del test
+    procesadas = []
+    def procesar(sesion, particion):
+        procesadas.append(particion)
+        return EncuestaServicio.procesar_etapa(bd, encuesta_evaluacion, ETAPA_EVALUACION_DOCENTE, particion=particion)
+
+    # Lo compartido se confirma en su propia sesión antes de repartir
+    def preparar(sesion):
+        assert not procesadas
+        procesadas.append("preparar")
+
+    insertadas = PublicacionParalela.ejecutar(procesar, workers=1, fabrica_sesiones=SesionPrueba, preparar=preparar)
+    assert procesadas[0] == "preparar"
+    assert sorted(procesadas[1:]) == [(i, 4) for i in range(4)]
+    assert len(sesiones) == 5 and all(s.confirmada for s in sesiones)
+    assert insertadas == 3
+    assert bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_evaluacion.id).count() == 3
+    assert not PublicacionParalela.disponible(bd, workers=4)
+
+
+def test_publicacion_sincronica_es_atomica(bd, encuesta_evaluacion, monkeypatch):
+    from fastapi import HTTPException
+    from sqlalchemy.orm import Session
+    from app.servicios.encuesta_servicio import EncuestaServicio
+    from app.servicios.publicacion_paralela import PublicacionParalela
+
+    # Aunque haya paralelismo disponible, el endpoint sincrónico no commitea por partición
+    monkeypatch.setattr(PublicacionParalela, "disponible", staticmethod(lambda db, workers=None: True))
+    monkeypatch.setattr(PublicacionParalela, "ejecutar", staticmethod(lambda *a, **k: pytest.fail("commit por partición")))
+    def fallar(*args, **kwargs):
+        raise RuntimeError("falla al marcar publicada")
+    monkeypatch.setattr(EncuestaServicio, "marcar_publicada", staticmethod(fallar))
+
+    sesion = Session(bind=bd.connection(), join_transaction_mode="create_savepoint")
+    with pytest.raises(HTTPException) as error:
+        EncuestaServicio.publicar_encuesta(sesion, encuesta_evaluacion.id, usuario_id=1)
+    assert error.value.status_code == 500
+    sesion.close()
+    bd.expire_all()
+    assert bd.get(modelos.Encuesta, encuesta_evaluacion.id).estado == modelos.EstadoEncuesta.borrador
+    assert bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_evaluacion.id).count() == 0
+
+
+def test_estimacion_publicacion_solo_cuenta(client, bd, admin_override, encuesta_evaluacion):
+    bd.add(modelos.AsignacionUsuario(
+        id_usuario=100, id_encuesta=encuesta_evaluacion.id, id_referencia_contexto="MAT-101-A-10",
+        estado=modelos.EstadoAsignacion.pendiente
+    ))
+    bd.commit()
+
+    res = client.get(f"/admin/encuestas/{encuesta_evaluacion.id}/publicar/estimacion")
+    assert res.status_code == 200, res.text
+    etapa = res.json()["etapas"][0]
+    assert etapa["etapa"] == "evaluacion_docente"
+    assert (etapa["usuarios"], etapa["contextos"], etapa["candidatas"], etapa["existentes"], etapa["nuevas"]) == (2, 2, 3, 1, 2)
+    assert bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_evaluacion.id).count() == 1
+
+    # La publicación queda en el historial y da ritmo a la próxima estimación
+    assert client.post(f"/admin/encuestas/{encuesta_evaluacion.id}/publicar").status_code == 200
+    res = client.get(f"/admin/encuestas/{encuesta_evaluacion.id}/publicar/estimacion").json()
+    assert res["nuevas"] == 0
+    assert res["filas_por_segundo"] > 0
+    assert res["duracion_estimada_segundos"] == 0
+
+
+def test_republicacion_incremental_solo_procesa_alumnos_con_cambios(client, bd, admin_override, encuesta_evaluacion, monkeypatch):
+    from sqlalchemy import text
+    from app.services import sapientia_service
+    from app.servicios.republicacion_incremental import RepublicacionIncremental
+
+    # La publicación siembra la marca: la primera corrida no recorre nada
+    assert client.post(f"/admin/encuestas/{encuesta_evaluacion.id}/publicar").status_code == 200
+    assert bd.get(modelos.MarcaRepublicacion, encuesta_evaluacion.id) is not None
+    url = f"/admin/encuestas/{encuesta_evaluacion.id}/republicar-incremental"
+    res = client.post(url).json()
+    assert (res["completa"], res["alumnos_afectados"], res["insertadas"]) == (False, 0, 0)
+
+    # Solo se consultan los alumnos con cambios, nunca todas las inscripciones
+    filtros = []
+    filtro_alumnos = sapientia_service.filtro_alumnos
+    def registrar(*args):
+        filtros.append(args)
+        return filtro_alumnos(*args)
+    monkeypatch.setattr(sapientia_service, "filtro_alumnos", registrar)
+
+    bd.execute(text("INSERT INTO sapientia.inscripciones (id_alumno, cod_asignatura, seccion) VALUES (102, 'PROG-101', 'B')"))
+    bd.commit()
+    res = client.post(url).json()
+    assert (res["completa"], res["alumnos_afectados"], res["insertadas"]) == (False, 1, 1)
+    assert filtros == [(None, None, [102])]
+    assert bd.query(modelos.AsignacionUsuario).filter_by(
+        id_encuesta=encuesta_evaluacion.id, id_usuario=102, id_referencia_contexto="PROG-101-B-11"
+    ).count() == 1
+
+    # Un cambio de oferta afecta a los inscritos en la sección
+    bd.execute(text("UPDATE sapientia.oferta_academica SET id_docente = 12 WHERE cod_asignatura = 'MAT-101'"))
+    bd.commit()
+    res = RepublicacionIncremental.republicar_en_curso(bd)
+    assert res["insertadas"] == 2
+    assert res["encuestas"][0]["alumnos_afectados"] == 2
+    assert RepublicacionIncremental.republicar(bd, encuesta_evaluacion)["insertadas"] == 0
+
+
+def test_republicacion_incremental_recorre_todo_si_cambian_las_reglas(client, bd, admin_override, encuesta_evaluacion):
+    from app.servicios.republicacion_incremental import RepublicacionIncremental
+
+    encuesta_evaluacion.reglas[0].filtros_json = [{"campo": "carrera", "valor": "informatica"}]
+    bd.commit()
+    assert client.post(f"/admin/encuestas/{encuesta_evaluacion.id}/publicar").status_code == 200
+    assert bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_evaluacion.id).count() == 1
+
+    # Sin cambios en inscripciones, pero la regla ya no filtra: recorre todo
+    encuesta_evaluacion.reglas[0].filtros_json = None
+    bd.commit()
+    res = RepublicacionIncremental.republicar(bd, encuesta_evaluacion)
+    assert (res["completa"], res["insertadas"]) == (True, 2)
+    assert RepublicacionIncremental.republicar(bd, encuesta_evaluacion)["completa"] is False
+
+
+def test_compilador_reglas_combina_todas_las_reglas(bd, encuesta_evaluacion):
+    from app.servicios.compilador_reglas import CompiladorReglas
+    from app.servicios.encuesta_servicio import EncuestaServicio, ETAPA_EVALUACION_DOCENTE
+
+    encuesta_evaluacion.reglas[0].filtros_json = [{"campo": "carrera", "valor": "informatica"}]
+    encuesta_evaluacion.reglas.append(modelos.ReglaAsignacion(
+        publico_objetivo=modelos.PublicoObjetivo.alumnos,
+        filtros_json=[{"campo": "campus", "valores": ["sede-inexistente"]}]
+    ))
+    bd.commit()
+
+    compiladas = CompiladorReglas.compilar(bd, encuesta_evaluacion)
+    where, params = compiladas.predicado
+    # Valor conocido: comparación exacta; desconocido: LOWER() de respaldo; OR entre reglas
+    assert "o.departamento IN" in where and "LOWER(o.campus) IN" in where and " OR " in where
+    assert "Informatica" in params.values()
+    assert CompiladorReglas.compilar(bd, encuesta_evaluacion) is compiladas
+
+    creadas = EncuestaServicio.procesar_etapa(bd, encuesta_evaluacion, ETAPA_EVALUACION_DOCENTE)
+    assert creadas == 1
+    asignacion = bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_evaluacion.id).one()
+    assert (asignacion.id_usuario, asignacion.id_referencia_contexto) == (100, "PROG-101-B-11")
+
+
+def test_asignacion_alumnos_una_por_alumno(bd, encuesta_borrador, sapientia_data):
+    from app.servicios.encuesta_servicio import EncuestaServicio, ETAPA_ALUMNOS
+
+    encuesta_borrador.reglas.append(modelos.ReglaAsignacion(publico_objetivo=modelos.PublicoObjetivo.alumnos))
+    bd.commit()
+    # El alumno 100 cursa en dos departamentos: una sola asignación GEN-ALU
+    assert EncuestaServicio.procesar_etapa(bd, encuesta_borrador, ETAPA_ALUMNOS) == 2
+    assert EncuestaServicio.procesar_etapa(bd, encuesta_borrador, ETAPA_ALUMNOS) == 0
+    contextos = sorted(a.id_referencia_contexto for a in bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta_borrador.id))
+    assert contextos == ["GEN-ALU-100", "GEN-ALU-101"]
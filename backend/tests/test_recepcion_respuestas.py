@@ -0,0 +1,443 @@
+from datetime import datetime
+from sqlalchemy import text
+from app import modelos
+from app.modelos import UsuarioAdmin, RolAdmin
+import pytest
+
+
+@pytest.fixture
+def auth_override(client):
+    from main import app
+    from app.routers.auth import obtener_usuario_actual
+    app.dependency_overrides[obtener_usuario_actual] = lambda: UsuarioAdmin(id_admin=1, nombre_usuario="admin", rol=RolAdmin.ADMINISTRADOR)
+    yield
+
+
+@pytest.fixture
+def encuesta_publicada(bd):
+    encuesta = modelos.Encuesta(
+        nombre="Evaluación", fecha_inicio=datetime(2025, 1, 1), fecha_fin=datetime(2025, 12, 31),
+        prioridad=modelos.PrioridadEncuesta.evaluacion_docente, estado=modelos.EstadoEncuesta.en_curso,
+        activo=True, usuario_creacion=1
+    )
+    bd.add(encuesta)
+    bd.flush()
+    p1 = modelos.Pregunta(id_encuesta=encuesta.id, texto_pregunta="P1", orden=1, tipo=modelos.TipoPregunta.opcion_unica)
+    p2 = modelos.Pregunta(id_encuesta=encuesta.id, texto_pregunta="P2", orden=2, tipo=modelos.TipoPregunta.texto_libre)
+    bd.add_all([p1, p2])
+    bd.flush()
+    o1 = modelos.OpcionRespuesta(id_pregunta=p1.id, texto_opcion="Si", orden=1)
+    bd.add(o1)
+    bd.add(modelos.AsignacionUsuario(
+        id_usuario=800, id_encuesta=encuesta.id, id_referencia_contexto="MAT-101-A-10",
+        metadatos_asignacion={"docente": "Profesor X", "materia": "Matematicas I", "seccion": "A"},
+        estado=modelos.EstadoAsignacion.pendiente
+    ))
+    bd.commit()
+    return {"encuesta": encuesta, "p1": p1, "p2": p2, "o1": o1}
+
+
+def test_recibir_respuestas_persiste_todo(client, bd, auth_override, encuesta_publicada):
+    e = encuesta_publicada
+    envio = {
+        "id_usuario": 800,
+        "id_encuesta": e["encuesta"].id,
+        "id_referencia_contexto": "MAT-101-A-10",
+        "metadatos_contexto": {"campus": "Central"},
+        "respuestas": [
+            {"id_pregunta": e["p1"].id, "valor_respuesta": "Si", "id_opcion": e["o1"].id},
+            {"id_pregunta": e["p2"].id, "valor_respuesta": "Muy bien"}
+        ]
+    }
+    res = client.post("/sapientia/recepcionar-respuestas", json=envio)
+    assert res.status_code == 200, res.text
+
+    trans = bd.query(modelos.TransaccionEncuesta).filter_by(id_encuesta=e["encuesta"].id).one()
+    assert trans.metadatos_contexto["profesor"] == "Profesor X"
+    assert trans.metadatos_contexto["asignatura"] == "Matematicas I"
+    assert trans.metadatos_contexto["campus"] == "Central"
+    assert len(trans.respuestas) == 2
+
+    estado = bd.execute(text(
+        "SELECT estado, fecha_realizacion FROM encuestas_oltp.asignacion_usuario WHERE id_usuario = 800"
+    )).first()
+    assert estado[0] == "realizada"
+    assert estado[1] is not None
+
+
+def test_recibir_respuestas_rechaza_pregunta_ajena(client, bd, auth_override, encuesta_publicada):
+    envio = {
+        "id_usuario": 800,
+        "id_encuesta": encuesta_publicada["encuesta"].id,
+        "id_referencia_contexto": "X",
+        "metadatos_contexto": {},
+        "respuestas": [{"id_pregunta": 987654, "valor_respuesta": "x"}]
+    }
+    res = client.post("/sapientia/recepcionar-respuestas", json=envio)
+    assert res.status_code == 400
+    assert bd.query(modelos.TransaccionEncuesta).count() == 0
+
+
+def test_ingesta_asincrona_encola_y_drena(client, bd, auth_override, encuesta_publicada, monkeypatch):
+    from app.servicios import ingesta_respuestas
+    from app.servicios.ingesta_respuestas import IngestaRespuestas
+    monkeypatch.setattr(ingesta_respuestas, "INGESTA_ASINCRONA_HABILITADA", True)
+
+    e = encuesta_publicada
+    valido = {
+        "id_usuario": 800, "id_encuesta": e["encuesta"].id, "id_referencia_contexto": "MAT-101-A-10",
+        "metadatos_contexto": {},
+        "respuestas": [{"id_pregunta": e["p2"].id, "valor_respuesta": "Bien"}]
+    }
+    invalido = {**valido, "respuestas": [{"id_pregunta": 987654, "valor_respuesta": "x"}]}
+
+    r_ok = client.post("/sapientia/recepcionar-respuestas/async", json=valido)
+    r_mal = client.post("/sapientia/recepcionar-respuestas/async", json=invalido)
+    assert r_ok.status_code == 202
+    recibo_ok = r_ok.json()["id_recibo"]
+    recibo_mal = r_mal.json()["id_recibo"]
+    assert client.get(f"/sapientia/recepcionar-respuestas/recibos/{recibo_ok}").json()["estado"] == "pendiente"
+
+    resultado = IngestaRespuestas.procesar_lote(bd)
+    assert resultado == {"leidos": 2, "procesados": 1, "errores": 1}
+
+    assert client.get(f"/sapientia/recepcionar-respuestas/recibos/{recibo_ok}").json()["estado"] == "procesado"
+    estado_mal = client.get(f"/sapientia/recepcionar-respuestas/recibos/{recibo_mal}").json()
+    assert estado_mal["estado"] == "error"
+    assert "no pertenecen" in estado_mal["error"]
+    assert bd.query(modelos.TransaccionEncuesta).count() == 1
+
+
+def test_validador_compilado_reglas_por_tipo(bd, encuesta_publicada):
+    from fastapi import HTTPException
+    from app import schemas
+    from app.servicios.validador_respuestas import ValidadorEncuesta
+
+    e = encuesta_publicada
+    validador = ValidadorEncuesta.compilar(bd, e["encuesta"].id)
+
+    def envio(respuestas):
+        return schemas.EnvioRespuestasAlumno(
+            id_usuario=1, id_encuesta=e["encuesta"].id, id_referencia_contexto="X",
+            metadatos_contexto={}, respuestas=respuestas
+        )
+
+    validador.validar(envio([{"id_pregunta": e["p1"].id, "id_opcion": e["o1"].id}]))
+
+    casos_invalidos = [
+        [{"id_pregunta": e["p1"].id, "id_opcion": 987654}],                    # opción ajena
+        [{"id_pregunta": e["p2"].id, "id_opcion": e["o1"].id}],                 # texto libre con opción
+        [{"id_pregunta": e["p1"].id, "id_opcion": e["o1"].id},
+         {"id_pregunta": e["p1"].id, "valor_respuesta": "otra"}],               # opción única repetida
+    ]
+    for respuestas in casos_invalidos:
+        with pytest.raises(HTTPException) as exc:
+            validador.validar(envio(respuestas))
+        assert exc.value.status_code == 400
+
+
+def test_idempotency_key_evita_transacciones_duplicadas(client, bd, auth_override, encuesta_publicada):
+    e = encuesta_publicada
+    envio = {
+        "id_usuario": 800, "id_encuesta": e["encuesta"].id, "id_referencia_contexto": "MAT-101-A-10",
+        "metadatos_contexto": {},
+        "respuestas": [{"id_pregunta": e["p2"].id, "valor_respuesta": "Bien"}]
+    }
+    cabeceras = {"Idempotency-Key": "envio-800-abc"}
+
+    r1 = client.post("/sapientia/recepcionar-respuestas", json=envio, headers=cabeceras)
+    r2 = client.post("/sapientia/recepcionar-respuestas", json=envio, headers=cabeceras)
+    assert r1.status_code == r2.status_code == 200
+    assert r1.json() == r2.json()
+    assert bd.query(modelos.TransaccionEncuesta).count() == 1
+
+    # La misma clave con otro contenido se rechaza
+    otro = {**envio, "respuestas": [{"id_pregunta": e["p2"].id, "valor_respuesta": "Mal"}]}
+    assert client.post("/sapientia/recepcionar-respuestas", json=otro, headers=cabeceras).status_code == 422
+
+    # El reintento desde otro proceso (memoria vacía) también se atiende desde la tabla
+    from app.servicios.idempotencia import almacen_idempotencia
+    almacen_idempotencia._memoria.clear()
+    r3 = client.post("/sapientia/recepcionar-respuestas", json=envio, headers=cabeceras)
+    assert r3.json() == r1.json()
+    assert bd.query(modelos.TransaccionEncuesta).count() == 1
+
+
+def test_commit_grupal_agrupa_y_aisla_errores(bd, encuesta_publicada):
+    import threading
+    from fastapi import HTTPException
+    from sqlalchemy.orm import Session
+    from app import schemas
+    from app.servicios.commit_grupal import CommitGrupal
+    from app.servicios.respuestas_servicio import RespuestasServicio
+
+    e = encuesta_publicada
+    conexion = bd.connection()
+    grupal = CommitGrupal(lambda: Session(bind=conexion), ventana_ms=200, max_lote=10)
+    grupal.iniciar()
+
+    def operacion(id_pregunta):
+        envio = schemas.EnvioRespuestasAlumno(
+            id_usuario=810, id_encuesta=e["encuesta"].id, id_referencia_contexto="X",
+            metadatos_contexto={}, respuestas=[{"id_pregunta": id_pregunta, "valor_respuesta": "ok"}]
+        )
+        def escribir(db):
+            RespuestasServicio.validar_preguntas(db, envio)
+            return RespuestasServicio.persistir_envio(db, envio)
+        return escribir
+
+    resultados = {}
+    def enviar(nombre, id_pregunta):
+        try:
+            resultados[nombre] = grupal.ejecutar(operacion(id_pregunta))
+        except HTTPException as exc:
+            resultados[nombre] = exc.status_code
+
+    hilos = [
+        threading.Thread(target=enviar, args=("a", e["p2"].id)),
+        threading.Thread(target=enviar, args=("b", e["p2"].id)),
+        threading.Thread(target=enviar, args=("mal", 987654)),
+    ]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    grupal.detener()
+
+    assert resultados["mal"] == 400
+    assert isinstance(resultados["a"], int) and isinstance(resultados["b"], int)
+    metricas = grupal.metricas()
+    assert metricas["operaciones"] == 3
+    assert metricas["lotes"] < 3
+
+
+def test_borrador_delta_fusiona_por_pregunta(client, bd, auth_override, encuesta_publicada):
+    e = encuesta_publicada
+    id_asignacion = bd.query(modelos.AsignacionUsuario.id).filter_by(id_usuario=800).scalar()
+    res = client.post("/sapientia/guardar-borrador", json={
+        "id_asignacion": id_asignacion,
+        "respuestas": [
+            {"id_pregunta": e["p1"].id, "valor_respuesta": "Si", "id_opcion": e["o1"].id},
+            {"id_pregunta": e["p2"].id, "valor_respuesta": "Borrador"}
+        ]
+    })
+    assert res.status_code == 200, res.text
+
+    res = client.patch(f"/sapientia/borrador/{id_asignacion}", json={
+        "respuestas": [{"id_pregunta": e["p2"].id, "valor_respuesta": "Editado"}]
+    })
+    assert res.status_code == 200, res.text
+    borrador = client.get(f"/sapientia/borrador/{id_asignacion}").json()
+    valores = {r["id_pregunta"]: r["valor_respuesta"] for r in borrador["respuestas"]}
+    assert valores == {e["p1"].id: "Si", e["p2"].id: "Editado"}
+
+    res = client.patch(f"/sapientia/borrador/{id_asignacion}", json={"preguntas_eliminadas": [e["p1"].id]})
+    assert res.status_code == 200
+    borrador = client.get(f"/sapientia/borrador/{id_asignacion}").json()
+    assert [r["id_pregunta"] for r in borrador["respuestas"]] == [e["p2"].id]
+
+    assert client.patch("/sapientia/borrador/999999", json={"respuestas": []}).status_code == 404
+
+
+def test_buffer_borradores_write_behind(client, bd, auth_override, encuesta_publicada, monkeypatch):
+    from sqlalchemy.orm import Session
+    from app.servicios.buffer_borradores import buffer_borradores
+
+    e = encuesta_publicada
+    conexion = bd.connection()
+    monkeypatch.setattr(buffer_borradores, "habilitado", True)
+    monkeypatch.setattr(buffer_borradores, "_fabrica_sesiones", lambda: Session(bind=conexion))
+    id_asignacion = bd.query(modelos.AsignacionUsuario.id).filter_by(id_usuario=800).scalar()
+
+    for valor in ("a", "ab", "abc"):
+        res = client.post("/sapientia/guardar-borrador", json={
+            "id_asignacion": id_asignacion,
+            "respuestas": [{"id_pregunta": e["p2"].id, "valor_respuesta": valor}]
+        })
+        assert res.status_code == 200, res.text
+    client.patch(f"/sapientia/borrador/{id_asignacion}", json={
+        "respuestas": [{"id_pregunta": e["p1"].id, "valor_respuesta": "Si", "id_opcion": e["o1"].id}]
+    })
+
+    # Nada escrito todavía: la lectura sale del buffer
+    assert bd.query(modelos.RespuestaBorrador).count() == 0
+    borrador = client.get(f"/sapientia/borrador/{id_asignacion}").json()
+    assert {r["valor_respuesta"] for r in borrador["respuestas"]} == {"abc", "Si"}
+
+    assert buffer_borradores.vaciar() == 1
+    assert buffer_borradores.vaciar() == 0
+    fila = bd.query(modelos.RespuestaBorrador).filter_by(id_asignacion=id_asignacion).one()
+    assert len(fila.respuestas_json) == 2
+
+    # Al finalizar la asignación el borrador sale del buffer
+    client.post("/sapientia/guardar-borrador", json={"id_asignacion": id_asignacion, "respuestas": []})
+    envio = {
+        "id_usuario": 800, "id_encuesta": e["encuesta"].id, "id_referencia_contexto": "MAT-101-A-10",
+        "metadatos_contexto": {}, "respuestas": [{"id_pregunta": e["p2"].id, "valor_respuesta": "Final"}]
+    }
+    assert client.post("/sapientia/recepcionar-respuestas", json=envio).status_code == 200
+    assert not buffer_borradores.contiene(id_asignacion)
+    bd.expire_all()
+    assert bd.query(modelos.RespuestaBorrador).filter_by(id_asignacion=id_asignacion).one().respuestas_json == []
+
+
+def test_buffer_borradores_fila_fallida_y_finalizar_revertido(bd, encuesta_publicada, monkeypatch):
+    from sqlalchemy.orm import Session
+    from app.servicios import buffer_borradores as modulo
+
+    conexion = bd.connection()
+    buffer = modulo.BufferBorradores(fabrica_sesiones=lambda: Session(bind=conexion), habilitado=True)
+    id_asignacion = bd.query(modelos.AsignacionUsuario.id).filter_by(id_usuario=800).scalar()
+    upsert = modulo.upsert_borradores
+
+    def upsert_con_fila_invalida(db, filas):
+        if any(f["id_asignacion"] == 999999 for f in filas):
+            raise RuntimeError("violación de FK")
+        upsert(db, filas)
+    monkeypatch.setattr(modulo, "upsert_borradores", upsert_con_fila_invalida)
+
+    # Una fila inválida no traba el vaciado de las demás: se reintenta fila por fila
+    buffer.guardar(bd, id_asignacion, [{"id_pregunta": 1, "valor_respuesta": "a"}])
+    buffer.guardar(bd, 999999, [])
+    assert buffer.vaciar() == 1
+    assert not buffer.contiene(999999) and buffer.metricas()["descartadas"] == 1
+    assert bd.query(modelos.RespuestaBorrador).filter_by(id_asignacion=id_asignacion).count() == 1
+    assert buffer.vaciar() == 0
+
+    # Finalizar dentro de un SAVEPOINT revertido conserva la entrada
+    buffer.guardar(bd, id_asignacion, [{"id_pregunta": 1, "valor_respuesta": "ab"}])
+    savepoint = bd.begin_nested()
+    buffer.finalizar(bd, id_asignacion)
+    savepoint.rollback()
+    bd.commit()
+    assert buffer.obtener(id_asignacion)[0] == [{"id_pregunta": 1, "valor_respuesta": "ab"}]
+
+    buffer.finalizar(bd, id_asignacion)
+    assert buffer.contiene(id_asignacion)
+    bd.commit()
+    assert not buffer.contiene(id_asignacion)
+    bd.expire_all()
+    assert bd.query(modelos.RespuestaBorrador).filter_by(id_asignacion=id_asignacion).one().respuestas_json[0]["valor_respuesta"] == "ab"
+
+
+def test_retencion_borradores_por_lotes(bd, encuesta_publicada):
+    from app.servicios.retencion_borradores import RetencionBorradores
+
+    e = encuesta_publicada
+    vigente = bd.query(modelos.AsignacionUsuario).filter_by(id_usuario=800).one()
+    realizada = modelos.AsignacionUsuario(
+        id_usuario=801, id_encuesta=e["encuesta"].id, estado=modelos.EstadoAsignacion.realizada
+    )
+    antigua = modelos.AsignacionUsuario(
+        id_usuario=802, id_encuesta=e["encuesta"].id, estado=modelos.EstadoAsignacion.pendiente
+    )
+    bd.add_all([realizada, antigua])
+    bd.flush()
+    bd.add_all([
+        modelos.RespuestaBorrador(id_asignacion=vigente.id, respuestas_json=[]),
+        modelos.RespuestaBorrador(id_asignacion=realizada.id, respuestas_json=[]),
+        modelos.RespuestaBorrador(id_asignacion=antigua.id, respuestas_json=[], fecha_actualizacion=datetime(2020, 1, 1)),
+    ])
+    bd.commit()
+
+    simulacion = RetencionBorradores.ejecutar(bd, dry_run=True, retencion_dias=30)
+    assert simulacion["candidatos"] == 2
+    assert bd.query(modelos.RespuestaBorrador).count() == 3
+
+    resultado = RetencionBorradores.ejecutar(bd, retencion_dias=30, tamano_lote=1)
+    assert resultado["borrados"] == 2
+    assert resultado["lotes"] == 2
+    assert [b.id_asignacion for b in bd.query(modelos.RespuestaBorrador).all()] == [vigente.id]
+
+
+def test_contexto_compartido_entre_asignaciones_y_transacciones(client, bd, auth_override, sapientia_data):
+    from app.servicios.encuesta_servicio import EncuestaServicio, ETAPA_EVALUACION_DOCENTE
+
+    encuesta = modelos.Encuesta(
+        nombre="Evaluación", fecha_inicio=datetime(2025, 1, 1), fecha_fin=datetime(2025, 12, 31),
+        prioridad=modelos.PrioridadEncuesta.evaluacion_docente, estado=modelos.EstadoEncuesta.en_curso,
+        activo=True, usuario_creacion=1
+    )
+    encuesta.reglas.append(modelos.ReglaAsignacion(publico_objetivo=modelos.PublicoObjetivo.alumnos))
+    bd.add(encuesta)
+    bd.flush()
+    pregunta = modelos.Pregunta(id_encuesta=encuesta.id, texto_pregunta="P", orden=1, tipo=modelos.TipoPregunta.texto_libre)
+    bd.add(pregunta)
+    bd.commit()
+
+    # 3 asignaciones, 2 contextos (MAT-101-A-10 lo comparten los alumnos 100 y 101)
+    assert EncuestaServicio.procesar_etapa(bd, encuesta, ETAPA_EVALUACION_DOCENTE) == 3
+    bd.commit()
+    asignaciones = bd.query(modelos.AsignacionUsuario).filter_by(id_encuesta=encuesta.id).all()
+    assert all(a.id_contexto and a.metadatos_asignacion is None for a in asignaciones)
+    assert len({a.id_contexto for a in asignaciones}) == 2
+    asignacion = next(a for a in asignaciones if a.id_usuario == 101)
+    contexto = bd.get(modelos.ContextoAsignacion, asignacion.id_contexto)
+    assert contexto.id_referencia_contexto == "MAT-101-A-10"
+    assert contexto.metadatos["docente"] == "Profesor X" and "alumno" not in contexto.metadatos
+
+    envio = {
+        "id_usuario": 101, "id_encuesta": encuesta.id, "id_referencia_contexto": "MAT-101-A-10",
+        "metadatos_contexto": {"campus": "Central"},
+        "respuestas": [{"id_pregunta": pregunta.id, "valor_respuesta": "Bien"}]
+    }
+    res = client.post("/sapientia/recepcionar-respuestas", json=envio)
+    assert res.status_code == 200, res.text
+    trans = bd.query(modelos.TransaccionEncuesta).filter_by(id_encuesta=encuesta.id).one()
+    assert trans.id_contexto == asignacion.id_contexto
+    assert trans.metadatos_contexto["campus"] == "Central" and "profesor" not in trans.metadatos_contexto
+
+
+def test_commit_grupal_idempotencia_reintento_y_clave_repetida(bd, encuesta_publicada, monkeypatch):
+    import threading
+    from sqlalchemy.orm import Session
+    from app import schemas
+    from app.routers import sapientia
+    from app.servicios.commit_grupal import CommitGrupal
+    from app.servicios.idempotencia import almacen_idempotencia
+
+    e = encuesta_publicada
+    conexion = bd.connection()
+    fallas = {"commit": 1}
+
+    class SesionQueFallaUnaVez(Session):
+        def commit(self):
+            if fallas["commit"]:
+                fallas["commit"] -= 1
+                raise RuntimeError("commit del lote caído")
+            super().commit()
+
+    def enviar(clave, resultados):
+        envio = schemas.EnvioRespuestasAlumno(
+            id_usuario=800, id_encuesta=e["encuesta"].id, id_referencia_contexto="MAT-101-A-10",
+            metadatos_contexto={}, respuestas=[{"id_pregunta": e["p2"].id, "valor_respuesta": "ok"}]
+        )
+        resultados.append(sapientia._recibir_respuestas_commit_grupal(
+            envio, bd, "recepcionar-respuestas", envio.model_dump(mode="json"), clave
+        ))
+
+    # 1. El commit del lote falla y la operación se reintenta sola: las huellas no se duplican
+    grupal = CommitGrupal(lambda: SesionQueFallaUnaVez(bind=conexion, join_transaction_mode="create_savepoint"), ventana_ms=10)
+    monkeypatch.setattr(sapientia, "commit_grupal", grupal)
+    grupal.iniciar()
+    resultados = []
+    enviar("clave-reintento", resultados)
+    grupal.detener()
+    assert resultados == [{"mensaje": "Respuestas recibidas correctamente"}]
+    assert grupal.metricas()["fallbacks"] == 1
+
+    # 2. Misma clave dos veces en el mismo lote: se escribe una vez y ambas reciben el resultado
+    almacen_idempotencia._memoria.clear()
+    grupal = CommitGrupal(lambda: Session(bind=conexion, join_transaction_mode="create_savepoint"), ventana_ms=300, max_lote=10)
+    monkeypatch.setattr(sapientia, "commit_grupal", grupal)
+    grupal.iniciar()
+    resultados = []
+    hilos = [threading.Thread(target=enviar, args=("clave-repetida", resultados)) for _ in range(2)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    grupal.detener()
+    assert grupal.metricas()["lotes"] == 1
+    assert resultados == [{"mensaje": "Respuestas recibidas correctamente"}] * 2
+    assert bd.query(modelos.TransaccionEncuesta).filter_by(id_encuesta=e["encuesta"].id).count() == 2
@@ -0,0 +1,27 @@
+-- update_schema_3.sql
+-- Diccionario de contextos de asignación (contexto_asignacion) e id_contexto en
+-- asignacion_usuario y transaccion_encuesta. create_all crea la tabla nueva pero
+-- no agrega columnas a tablas existentes.
+-- Uso: python apply_schema_update.py update_schema_3.sql
+
+CREATE TABLE IF NOT EXISTS encuestas_oltp.contexto_asignacion (
+    id SERIAL PRIMARY KEY,
+    id_referencia_contexto VARCHAR(255) NOT NULL,
+    metadatos JSONB NOT NULL,
+    huella_metadatos VARCHAR(32),
+    fecha_creacion TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- Instalaciones que crearon la tabla única por referencia: pasa a (referencia, huella)
+ALTER TABLE encuestas_oltp.contexto_asignacion ADD COLUMN IF NOT EXISTS huella_metadatos VARCHAR(32);
+UPDATE encuestas_oltp.contexto_asignacion SET huella_metadatos = md5(metadatos::text) WHERE huella_metadatos IS NULL;
+ALTER TABLE encuestas_oltp.contexto_asignacion ALTER COLUMN huella_metadatos SET NOT NULL;
+ALTER TABLE encuestas_oltp.contexto_asignacion DROP CONSTRAINT IF EXISTS contexto_asignacion_id_referencia_contexto_key;
+ALTER TABLE encuestas_oltp.contexto_asignacion DROP CONSTRAINT IF EXISTS uq_contexto_referencia_huella;
+ALTER TABLE encuestas_oltp.contexto_asignacion ADD CONSTRAINT uq_contexto_referencia_huella UNIQUE (id_referencia_contexto, huella_metadatos);
+
+ALTER TABLE encuestas_oltp.asignacion_usuario ADD COLUMN IF NOT EXISTS id_contexto INTEGER REFERENCES encuestas_oltp.contexto_asignacion(id);
+ALTER TABLE encuestas_oltp.transaccion_encuesta ADD COLUMN IF NOT EXISTS id_contexto INTEGER REFERENCES encuestas_oltp.contexto_asignacion(id);
+
+CREATE INDEX IF NOT EXISTS ix_encuestas_oltp_asignacion_usuario_id_contexto ON encuestas_oltp.asignacion_usuario(id_contexto);
+CREATE INDEX IF NOT EXISTS ix_encuestas_oltp_transaccion_encuesta_id_contexto ON encuestas_oltp.transaccion_encuesta(id_contexto);
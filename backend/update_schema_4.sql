@@ -0,0 +1,72 @@
+-- update_schema_4.sql
+-- Republicación incremental: registro de cambios de inscripciones y marca por encuesta.
+-- Uso: python apply_schema_update.py update_schema_4.sql
+--
+-- sapientia.inscripciones no tiene id creciente ni fecha de carga. Los triggers
+-- registran cada alta o modificación de inscripciones y de oferta_academica en
+-- cambio_inscripcion con el id de la transacción que la escribió, que es la
+-- marca de agua de cada encuesta (marca_republicacion).
+-- Si las tablas de sapientia llegan por replicación lógica, los triggers deben
+-- habilitarse con ALTER TABLE ... ENABLE ALWAYS TRIGGER.
+
+CREATE TABLE IF NOT EXISTS encuestas_oltp.cambio_inscripcion (
+    id SERIAL PRIMARY KEY,
+    id_transaccion BIGINT NOT NULL,
+    id_alumno INTEGER,
+    cod_asignatura VARCHAR(100),
+    seccion VARCHAR(100),
+    fecha TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS ix_encuestas_oltp_cambio_inscripcion_id_transaccion ON encuestas_oltp.cambio_inscripcion(id_transaccion);
+
+CREATE TABLE IF NOT EXISTS encuestas_oltp.marca_republicacion (
+    id_encuesta INTEGER PRIMARY KEY REFERENCES encuestas_oltp.encuesta(id) ON DELETE CASCADE,
+    id_transaccion_desde BIGINT NOT NULL,
+    huella_reglas VARCHAR(16),
+    fecha_actualizacion TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- Reemplazada por marca_republicacion (firmas por bucket de id_alumno)
+DROP TABLE IF EXISTS encuestas_oltp.firma_inscripciones;
+
+CREATE OR REPLACE FUNCTION encuestas_oltp.registrar_cambio_inscripcion() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO encuestas_oltp.cambio_inscripcion (id_transaccion, id_alumno, cod_asignatura, seccion)
+    SELECT DISTINCT pg_current_xact_id()::text::bigint, n.id_alumno, n.cod_asignatura, n.seccion
+    FROM nuevas n;
+    RETURN NULL;
+END
+$$;
+
+-- Un cambio de oferta afecta a toda la sección: id_alumno NULL
+CREATE OR REPLACE FUNCTION encuestas_oltp.registrar_cambio_oferta() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO encuestas_oltp.cambio_inscripcion (id_transaccion, id_alumno, cod_asignatura, seccion)
+    SELECT DISTINCT pg_current_xact_id()::text::bigint, NULL::integer, n.cod_asignatura, n.seccion
+    FROM nuevas n;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS tr_cambio_inscripcion_insert ON sapientia.inscripciones;
+CREATE TRIGGER tr_cambio_inscripcion_insert AFTER INSERT ON sapientia.inscripciones
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT
+    EXECUTE FUNCTION encuestas_oltp.registrar_cambio_inscripcion();
+DROP TRIGGER IF EXISTS tr_cambio_inscripcion_update ON sapientia.inscripciones;
+CREATE TRIGGER tr_cambio_inscripcion_update AFTER UPDATE ON sapientia.inscripciones
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT
+    EXECUTE FUNCTION encuestas_oltp.registrar_cambio_inscripcion();
+DROP TRIGGER IF EXISTS tr_cambio_oferta_insert ON sapientia.oferta_academica;
+CREATE TRIGGER tr_cambio_oferta_insert AFTER INSERT ON sapientia.oferta_academica
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT
+    EXECUTE FUNCTION encuestas_oltp.registrar_cambio_oferta();
+DROP TRIGGER IF EXISTS tr_cambio_oferta_update ON sapientia.oferta_academica;
+CREATE TRIGGER tr_cambio_oferta_update AFTER UPDATE ON sapientia.oferta_academica
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT
+    EXECUTE FUNCTION encuestas_oltp.registrar_cambio_oferta();
+
+-- La republicación filtra inscripciones por id_alumno IN (...) y por sección
+CREATE INDEX IF NOT EXISTS ix_inscripciones_id_alumno ON sapientia.inscripciones(id_alumno);
+CREATE INDEX IF NOT EXISTS ix_inscripciones_seccion ON sapientia.inscripciones(cod_asignatura, seccion);
@@ -0,0 +1,13 @@
+-- update_schema_5.sql
+-- Proyección bloqueo_pendiente (CU11 /sapientia/verificar-estado).
+-- Uso: python apply_schema_update.py update_schema_5.sql
+-- Luego reconstruirla con POST /admin/tecnico/proyeccion-bloqueo/reconstruir
+-- antes de habilitar USAR_PROYECCION_BLOQUEO.
+
+CREATE TABLE IF NOT EXISTS encuestas_oltp.bloqueo_pendiente (
+    id_usuario INTEGER PRIMARY KEY,
+    id_encuesta INTEGER NOT NULL REFERENCES encuestas_oltp.encuesta(id) ON DELETE CASCADE,
+    nombre_encuesta VARCHAR(100) NOT NULL,
+    fecha_actualizacion TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS ix_encuestas_oltp_bloqueo_pendiente_id_encuesta ON encuestas_oltp.bloqueo_pendiente(id_encuesta);
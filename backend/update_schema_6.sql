@@ -0,0 +1,17 @@
+-- update_schema_6.sql
+-- Cola durable de la ingesta asíncrona de respuestas (INGESTA_ASINCRONA_HABILITADA).
+-- Uso: python apply_schema_update.py update_schema_6.sql
+
+CREATE TABLE IF NOT EXISTS encuestas_oltp.envio_respuestas_cola (
+    id SERIAL PRIMARY KEY,
+    id_recibo VARCHAR(36) NOT NULL,
+    payload JSONB NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    id_transaccion INTEGER,
+    fecha_recepcion TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    fecha_procesado TIMESTAMP WITH TIME ZONE
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_encuestas_oltp_envio_respuestas_cola_id_recibo ON encuestas_oltp.envio_respuestas_cola(id_recibo);
+CREATE INDEX IF NOT EXISTS ix_encuestas_oltp_envio_respuestas_cola_estado ON encuestas_oltp.envio_respuestas_cola(estado);
@@ -0,0 +1,13 @@
+-- update_schema_7.sql
+-- Resultados de operaciones con cabecera Idempotency-Key.
+-- Uso: python apply_schema_update.py update_schema_7.sql
+
+CREATE TABLE IF NOT EXISTS encuestas_oltp.clave_idempotencia (
+    huella VARCHAR(64) PRIMARY KEY,
+    operacion VARCHAR(50) NOT NULL,
+    huella_payload VARCHAR(64) NOT NULL,
+    resultado JSONB NOT NULL,
+    fecha_creacion TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+-- Purga por antigüedad (IDEMPOTENCIA_TTL_SEGUNDOS)
+CREATE INDEX IF NOT EXISTS ix_encuestas_oltp_clave_idempotencia_fecha_creacion ON encuestas_oltp.clave_idempotencia(fecha_creacion);
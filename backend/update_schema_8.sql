@@ -0,0 +1,24 @@
+-- update_schema_8.sql
+-- Trabajos de publicación en segundo plano (POST /admin/encuestas/{id}/publicar/segundo-plano).
+-- Uso: python apply_schema_update.py update_schema_8.sql
+
+CREATE TABLE IF NOT EXISTS encuestas_oltp.trabajo_publicacion (
+    id SERIAL PRIMARY KEY,
+    id_encuesta INTEGER NOT NULL REFERENCES encuestas_oltp.encuesta(id) ON DELETE CASCADE,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    etapa VARCHAR(30),
+    ultimo_id_alumno INTEGER,
+    total_estimado INTEGER,
+    procesados INTEGER NOT NULL DEFAULT 0,
+    insertadas INTEGER NOT NULL DEFAULT 0,
+    cancelacion_solicitada BOOLEAN NOT NULL DEFAULT FALSE,
+    propietario VARCHAR(64),
+    error TEXT,
+    id_usuario INTEGER NOT NULL,
+    fecha_creacion TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    fecha_inicio TIMESTAMP WITH TIME ZONE,
+    fecha_actualizacion TIMESTAMP WITH TIME ZONE,
+    fecha_fin TIMESTAMP WITH TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_encuestas_oltp_trabajo_publicacion_id_encuesta ON encuestas_oltp.trabajo_publicacion(id_encuesta);
+CREATE INDEX IF NOT EXISTS ix_encuestas_oltp_trabajo_publicacion_estado ON encuestas_oltp.trabajo_publicacion(estado);
@@ -84,6 +84,16 @@ CREATE TABLE encuestas_oltp.opcion_respuesta (
     orden INT NOT NULL
 );
 
+-- Tabla: Diccionario de contextos de asignación (un JSON por referencia y contenido)
+CREATE TABLE encuestas_oltp.contexto_asignacion (
+    id SERIAL PRIMARY KEY,
+    id_referencia_contexto VARCHAR(255) NOT NULL,
+    metadatos JSONB NOT NULL,
+    huella_metadatos VARCHAR(32) NOT NULL, -- md5(metadatos::text)
+    fecha_creacion TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT uq_contexto_referencia_huella UNIQUE (id_referencia_contexto, huella_metadatos)
+);
+
 -- Tabla: Asignaciones de Usuario
 CREATE TABLE encuestas_oltp.asignacion_usuario (
     id SERIAL PRIMARY KEY,
@@ -92,6 +102,7 @@ CREATE TABLE encuestas_oltp.asignacion_usuario (
     estado encuestas_oltp.estado_asignacion DEFAULT 'pendiente',
     fecha_asignacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     fecha_realizacion TIMESTAMP,
+    id_contexto INT REFERENCES encuestas_oltp.contexto_asignacion(id),
     UNIQUE(id_usuario, id_encuesta)
 );
 
@@ -109,7 +120,8 @@ CREATE TABLE encuestas_oltp.transaccion_encuesta (
     id_encuesta INT NOT NULL REFERENCES encuestas_oltp.encuesta(id),
     fecha_finalizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     metadatos_contexto JSONB NOT NULL,
-    procesado_etl BOOLEAN DEFAULT FALSE
+    procesado_etl BOOLEAN DEFAULT FALSE,
+    id_contexto INT REFERENCES encuestas_oltp.contexto_asignacion(id)
 );
 
 -- Tabla: Respuestas Detalladas (Anónimo)
@@ -121,9 +133,87 @@ CREATE TABLE encuestas_oltp.respuesta (
     id_opcion INT REFERENCES encuestas_oltp.opcion_respuesta(id)
 );
 
+-- Tabla: Proyección de bloqueo (CU11): una fila por alumno con una encuesta obligatoria pendiente
+CREATE TABLE encuestas_oltp.bloqueo_pendiente (
+    id_usuario INT PRIMARY KEY, -- ID externo (Alumno)
+    id_encuesta INT NOT NULL REFERENCES encuestas_oltp.encuesta(id) ON DELETE CASCADE,
+    nombre_encuesta VARCHAR(100) NOT NULL,
+    fecha_actualizacion TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- Tabla: Cola de envíos de respuestas recibidos en modo asíncrono
+CREATE TABLE encuestas_oltp.envio_respuestas_cola (
+    id SERIAL PRIMARY KEY,
+    id_recibo VARCHAR(36) NOT NULL,
+    payload JSONB NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente', -- pendiente | procesado | error
+    intentos INT NOT NULL DEFAULT 0,
+    error TEXT,
+    id_transaccion INT,
+    fecha_recepcion TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    fecha_procesado TIMESTAMP WITH TIME ZONE
+);
+
+-- Tabla: Resultados de operaciones con Idempotency-Key
+CREATE TABLE encuestas_oltp.clave_idempotencia (
+    huella VARCHAR(64) PRIMARY KEY, -- sha256(operacion + clave)
+    operacion VARCHAR(50) NOT NULL,
+    huella_payload VARCHAR(64) NOT NULL,
+    resultado JSONB NOT NULL,
+    fecha_creacion TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- Tabla: Publicaciones en segundo plano (checkpoint por tramo de alumnos)
+CREATE TABLE encuestas_oltp.trabajo_publicacion (
+    id SERIAL PRIMARY KEY,
+    id_encuesta INT NOT NULL REFERENCES encuestas_oltp.encuesta(id) ON DELETE CASCADE,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente', -- pendiente | en_curso | completado | error | cancelado
+    etapa VARCHAR(30),
+    ultimo_id_alumno INT, -- checkpoint dentro de la etapa
+    total_estimado INT,
+    procesados INT NOT NULL DEFAULT 0,
+    insertadas INT NOT NULL DEFAULT 0,
+    cancelacion_solicitada BOOLEAN NOT NULL DEFAULT FALSE,
+    propietario VARCHAR(64),
+    error TEXT,
+    id_usuario INT NOT NULL,
+    fecha_creacion TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    fecha_inicio TIMESTAMP WITH TIME ZONE,
+    fecha_actualizacion TIMESTAMP WITH TIME ZONE, -- latido por tramo
+    fecha_fin TIMESTAMP WITH TIME ZONE
+);
+
+-- Tabla: Cambios de inscripciones y oferta (republicación incremental).
+-- La llenan triggers sobre el esquema sapientia: ver backend/update_schema_4.sql
+CREATE TABLE encuestas_oltp.cambio_inscripcion (
+    id SERIAL PRIMARY KEY,
+    id_transaccion BIGINT NOT NULL, -- pg_current_xact_id() de quien escribió
+    id_alumno INT, -- NULL: cambio de oferta, afecta a toda la sección
+    cod_asignatura VARCHAR(100),
+    seccion VARCHAR(100),
+    fecha TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- Tabla: Marca de republicación incremental por encuesta
+CREATE TABLE encuestas_oltp.marca_republicacion (
+    id_encuesta INT PRIMARY KEY REFERENCES encuestas_oltp.encuesta(id) ON DELETE CASCADE,
+    id_transaccion_desde BIGINT NOT NULL,
+    huella_reglas VARCHAR(16),
+    fecha_actualizacion TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
 -- Índices
 CREATE INDEX idx_asignacion_usuario_estado ON encuestas_oltp.asignacion_usuario(id_usuario, estado);
 CREATE INDEX idx_encuesta_disparador ON encuestas_oltp.encuesta(accion_disparadora);
+CREATE INDEX ix_encuestas_oltp_asignacion_usuario_id_contexto ON encuestas_oltp.asignacion_usuario(id_contexto);
+CREATE INDEX ix_encuestas_oltp_transaccion_encuesta_id_contexto ON encuestas_oltp.transaccion_encuesta(id_contexto);
+CREATE INDEX ix_encuestas_oltp_bloqueo_pendiente_id_encuesta ON encuestas_oltp.bloqueo_pendiente(id_encuesta);
+CREATE UNIQUE INDEX ix_encuestas_oltp_envio_respuestas_cola_id_recibo ON encuestas_oltp.envio_respuestas_cola(id_recibo);
+CREATE INDEX ix_encuestas_oltp_envio_respuestas_cola_estado ON encuestas_oltp.envio_respuestas_cola(estado);
+CREATE INDEX ix_encuestas_oltp_clave_idempotencia_fecha_creacion ON encuestas_oltp.clave_idempotencia(fecha_creacion);
+CREATE INDEX ix_encuestas_oltp_trabajo_publicacion_id_encuesta ON encuestas_oltp.trabajo_publicacion(id_encuesta);
+CREATE INDEX ix_encuestas_oltp_trabajo_publicacion_estado ON encuestas_oltp.trabajo_publicacion(estado);
+CREATE INDEX ix_encuestas_oltp_cambio_inscripcion_id_transaccion ON encuestas_oltp.cambio_inscripcion(id_transaccion);
 
 -- =============================================================================
 -- ESQUEMA OLAP (Analítico)